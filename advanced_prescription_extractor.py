@@ -7,8 +7,12 @@ Combines LangChain, Structured Output, and Enhanced Pattern Matching
 import json
 import re
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple, Iterator
 from dataclasses import dataclass
 from enum import Enum
 
@@ -17,7 +21,7 @@ try:
     from langchain_community.llms import OpenAI
     from langchain.prompts import PromptTemplate
     from langchain.output_parsers import PydanticOutputParser
-    from pydantic import BaseModel, Field
+    from pydantic import Field, create_model
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     try:
@@ -25,7 +29,7 @@ except ImportError:
         from langchain.llms import OpenAI
         from langchain.prompts import PromptTemplate
         from langchain.output_parsers import PydanticOutputParser
-        from pydantic import BaseModel, Field
+        from pydantic import Field, create_model
         LANGCHAIN_AVAILABLE = True
     except ImportError:
         LANGCHAIN_AVAILABLE = False
@@ -38,37 +42,174 @@ except ImportError:
     SPACY_AVAILABLE = False
     print("SpaCy not available. Install with: pip install spacy")
 
-from mistralai import Mistral
+from markdown_segmenter import segment_markdown
+from medication_lexicon import get_default_lexicon, prescribed_beside
+from mistral_client import create_mistral_client
+from pattern_stats import find_all
+from prescription_schema import FIELD_SCHEMA, empty_value, pydantic_field_definitions
+from resilience import ResilientCaller
+from result_cache import LLMResponseCache
+from streaming_json import StreamingFieldParser
 
-class PrescriptionData(BaseModel):
-    """Pydantic model for structured prescription data validation"""
-    patient_name: Optional[str] = Field(description="Full name of the patient")
-    patient_address: Optional[str] = Field(description="Address of the patient")
-    patient_dob: Optional[str] = Field(description="Date of birth (DD/MM/YYYY or similar)")
-    patient_age: Optional[int] = Field(description="Age of the patient in years")
-    patient_sex: Optional[str] = Field(description="Gender: Male, Female, M, F")
-    prescription_date: Optional[str] = Field(description="Date when prescription was written")
-    doctor_name: Optional[str] = Field(description="Name of the prescribing doctor")
-    doctor_title: Optional[str] = Field(description="Medical title or specialty of doctor")
-    clinic_address: Optional[str] = Field(description="Address of the clinic or hospital")
-    clinic_phone: Optional[str] = Field(description="Phone number of the clinic")
-    medicine_name: Optional[str] = Field(description="Name(s) of prescribed medication(s)")
-    medicine_dose: Optional[str] = Field(description="Dosage and concentration")
-    medicine_frequency: Optional[str] = Field(description="How often to take (e.g., 2x daily)")
-    medicine_duration: Optional[str] = Field(description="How long to take the medication")
-    instructions: Optional[str] = Field(description="Special instructions from doctor")
-    immunization: Optional[str] = Field(description="Name of vaccine if given")
-    immunization_date: Optional[str] = Field(description="Date vaccine was administered")
-    is_allergic: Optional[bool] = Field(description="Whether patient has allergies")
-    weight: Optional[str] = Field(description="Patient weight with unit")
-    is_pregnant: Optional[bool] = Field(description="Whether patient is pregnant")
+# Per-method time limits in extract_all_fields (seconds); LLM round trips get the most
+DEFAULT_METHOD_TIMEOUT = float(os.getenv("ADVANCED_METHOD_TIMEOUT", "60"))
+METHOD_TIMEOUTS = {
+    "_mistral_structured_extraction": DEFAULT_METHOD_TIMEOUT,
+    "_langchain_extraction": DEFAULT_METHOD_TIMEOUT,
+    "_nlp_extraction": 15.0,
+    "_enhanced_regex_extraction": 10.0,
+}
+
+# Label of the enhanced regex patterns in pattern statistics (pattern_stats.py)
+STATS_SOURCE = "enhanced_regex"
+
+MISTRAL_CHAT_MODEL = "mistral-large-latest"
+MISTRAL_TEMPERATURE = 0.1
+
+# Cascade mode: these run first, and the LLM is only asked for required fields they left empty
+CHEAP_METHODS = ("_enhanced_regex_extraction", "_nlp_extraction")
+PROMPT_INDENT = " " * 12
+MISSING_VALUES_RULE = ('If a field is not found, use empty string "" for text fields, null for boolean fields, '
+                       'and null for numbers.')
+
+# Batched prompts: documents share one request while its estimated prompt stays within the budget
+BATCH_TOKEN_BUDGET = int(os.getenv("ADVANCED_BATCH_TOKEN_BUDGET", "8000"))
+BATCH_MAX_DOCUMENTS = 16
+# max_tokens per document of a batched request (a single-document request allows 1000)
+BATCH_COMPLETION_TOKENS = 400
+# Rough cost of the "### Document docN" header and blank line around each document
+DOCUMENT_HEADER_TOKENS = 8
+
+
+def field_lines(fields: Optional[List[str]], schema: Dict[str, Dict[str, Any]]) -> List[str]:
+    return [f"- {name}: {schema[name]['prompt']}" for name in (fields or schema)]
+
+
+def build_extraction_prompt(ocr_text: str, fields: Optional[List[str]] = None,
+                            schema: Dict[str, Dict[str, Any]] = FIELD_SCHEMA) -> str:
+    """The structured extraction prompt, listing every schema field or only `fields`"""
+    lines = ["Extract prescription information from the following OCR text and return it as a JSON object "
+             "with these exact fields:",
+             "",
+             "Required fields to extract:"]
+    lines += field_lines(fields, schema)
+    lines += ["",
+              "OCR Text:",
+              ocr_text,
+              "",
+              "Return only valid JSON. " + MISSING_VALUES_RULE,
+              ""]
+    return "\n" + "\n".join(PROMPT_INDENT + line for line in lines)
+
+
+def document_id(index: int) -> str:
+    return f"doc{index + 1}"
+
+
+def build_batch_prompt(documents: List[Tuple[str, str]], fields: Optional[List[str]] = None,
+                       schema: Dict[str, Dict[str, Any]] = FIELD_SCHEMA) -> str:
+    """One prompt for several (document id, OCR text) pairs; the instructions and field list appear once"""
+    lines = ["Extract prescription information from each of the following OCR documents and return a JSON array "
+             'with one object per document. Each object must have a "document_id" key holding the id of its '
+             "document and these exact fields:",
+             "",
+             "Required fields to extract:"]
+    lines += field_lines(fields, schema)
+    for doc_id, ocr_text in documents:
+        lines += ["", f"### Document {doc_id}", ocr_text]
+    lines += ["",
+              "Return only a valid JSON array with one object per document, in document order. "
+              + MISSING_VALUES_RULE,
+              ""]
+    return "\n" + "\n".join(PROMPT_INDENT + line for line in lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token) for responses that carry no usage block"""
+    return max(1, len(text) // 4)
+
+
+def pack_documents(texts: List[str], token_budget: int = BATCH_TOKEN_BUDGET,
+                   max_documents: int = BATCH_MAX_DOCUMENTS, overhead_tokens: int = 0) -> List[List[int]]:
+    """
+    Indices of `texts` split, in order, into groups whose estimated prompt (`overhead_tokens`
+    of instructions plus each document) fits `token_budget`; a document too large for the
+    budget on its own gets a group of its own
+    """
+    groups: List[List[int]] = []
+    group: List[int] = []
+    used = overhead_tokens
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text) + DOCUMENT_HEADER_TOKENS
+        if group and (used + cost > token_budget or len(group) >= max_documents):
+            groups.append(group)
+            group, used = [], overhead_tokens
+        group.append(i)
+        used += cost
+    if group:
+        groups.append(group)
+    return groups
+
+
+def parse_batch_response(response_text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    document_id -> fields from a batched answer. If the array as a whole is not valid JSON,
+    each flat object is parsed on its own, so one broken entry only loses its own document.
+    """
+    items: List[Any] = []
+    match = re.search(r'[\[{].*[\]}]', response_text or "", re.DOTALL)
+    if match:
+        try:
+            parsed = json.loads(match.group())
+            if isinstance(parsed, dict):
+                # {"doc1": {...}, ...} instead of the requested array
+                items = [dict(value, document_id=key) if isinstance(value, dict) and "document_id" not in value
+                         else value for key, value in parsed.items()]
+            elif isinstance(parsed, list):
+                items = parsed
+        except json.JSONDecodeError:
+            for candidate in re.finditer(r'\{[^{}]*\}', match.group()):
+                try:
+                    items.append(json.loads(candidate.group()))
+                except json.JSONDecodeError:
+                    continue
+    return {str(item["document_id"]): item for item in items if isinstance(item, dict) and "document_id" in item}
+
+if LANGCHAIN_AVAILABLE:
+    # Pydantic model for structured prescription data validation, built from the shared schema
+    PrescriptionData = create_model("PrescriptionData", **pydantic_field_definitions(Field))
 
 class AdvancedPrescriptionExtractor:
     """Advanced prescription field extractor using multiple AI techniques"""
     
-    def __init__(self, mistral_api_key: str, openai_api_key: Optional[str] = None):
-        self.mistral_client = Mistral(api_key=mistral_api_key)
+    def __init__(self, mistral_api_key: str, openai_api_key: Optional[str] = None,
+                 resilience: Optional[ResilientCaller] = None, mistral_client: Optional[Any] = None,
+                 method_timeouts: Optional[Dict[str, float]] = None, cascade: bool = False,
+                 response_cache: Optional[LLMResponseCache] = None, batch_token_budget: int = BATCH_TOKEN_BUDGET,
+                 streaming: bool = False):
+        self.mistral_client = mistral_client or create_mistral_client(mistral_api_key)
+        # Seconds each extraction method may take, by method name
+        self.method_timeouts = {**METHOD_TIMEOUTS, **(method_timeouts or {})}
         self.openai_api_key = openai_api_key
+        # Regex/NLP first, then a reduced LLM prompt only for the required fields they missed
+        self.cascade = cascade
+        # Earlier Mistral/OpenAI responses to identical prompts (result_cache.create_llm_cache())
+        self.response_cache = response_cache
+        # Estimated prompt tokens per request in extract_batch()
+        self.batch_token_budget = batch_token_budget
+        # Stream the Mistral response and hang up once every requested field has arrived
+        self.streaming = streaming
+        # LLM calls, skips, tokens, seconds, response cache and batched prompt use since the extractor was created
+        self.stats = {"documents": 0, "llm_calls": 0, "llm_skipped": 0, "prompt_tokens": 0,
+                      "completion_tokens": 0, "llm_seconds": 0.0, "cache_hits": 0, "cache_misses": 0,
+                      "cache_saved_seconds": 0.0, "batch_calls": 0, "batch_documents": 0, "batch_fallbacks": 0}
+        self._stats_lock = threading.Lock()
+        # Per-document report of the extraction running on this thread (see _run_method)
+        self._local = threading.local()
+        # Retries with backoff, adaptive concurrency and a circuit breaker for chat calls
+        self.resilience = resilience or ResilientCaller()
+        # Drug-name lexicon (Aho-Corasick) used by the regex fallback
+        self.lexicon = get_default_lexicon()
         
         # Initialize extraction methods
         self.extraction_methods = []
@@ -91,77 +232,38 @@ class AdvancedPrescriptionExtractor:
         # Always include enhanced regex as fallback
         self.extraction_methods.append(self._enhanced_regex_extraction)
         
-        self.schema = {
-            "patient_name": {"type": "string", "required": True},
-            "patient_address": {"type": "string", "required": False},
-            "patient_dob": {"type": "date", "required": True},
-            "patient_age": {"type": "integer", "required": True},
-            "patient_sex": {"type": "string", "required": True},
-            "prescription_date": {"type": "date", "required": True},
-            "doctor_name": {"type": "string", "required": True},
-            "doctor_title": {"type": "string", "required": True},
-            "clinic_address": {"type": "string", "required": False},
-            "clinic_phone": {"type": "string", "required": True},
-            "medicine_name": {"type": "string", "required": True},
-            "medicine_dose": {"type": "string", "required": True},
-            "medicine_frequency": {"type": "string", "required": False},
-            "medicine_duration": {"type": "string", "required": True},
-            "instructions": {"type": "text", "required": True},
-            "immunization": {"type": "string", "required": False},
-            "immunization_date": {"type": "date", "required": False},
-            "is_allergic": {"type": "boolean", "required": False},
-            "weight": {"type": "string", "required": False},
-            "is_pregnant": {"type": "boolean", "required": False}
-        }
+        self.schema = FIELD_SCHEMA
     
-    def _mistral_structured_extraction(self, ocr_text: str) -> Dict[str, Any]:
-        """Use Mistral with structured prompting for field extraction"""
+    def _mistral_structured_extraction(self, ocr_text: str, fields: Optional[List[str]] = None,
+                                       on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        Use Mistral with structured prompting for field extraction; `fields` narrows the prompt.
+        When streaming, on_field(name, value) is called as each field arrives.
+        """
+        if self.streaming:
+            extracted = {}
+            try:
+                for name, value in self.stream_fields(ocr_text, fields):
+                    extracted[name] = value
+                    if on_field is not None:
+                        on_field(name, value)
+            except Exception as e:
+                # Fields that arrived before the failure were already shown through on_field; keep them
+                print(f"Mistral streaming extraction error after {len(extracted)} fields: {e}")
+            return {name: extracted.get(name) for name in fields} if fields else extracted
+        
         try:
-            prompt = f"""
-            Extract prescription information from the following OCR text and return it as a JSON object with these exact fields:
-            
-            Required fields to extract:
-            - patient_name: Full name of the patient
-            - patient_address: Patient's address (if mentioned)
-            - patient_dob: Date of birth in DD/MM/YYYY format
-            - patient_age: Age in years (number only)
-            - patient_sex: Gender (Male/Female/M/F)
-            - prescription_date: Date prescription was written
-            - doctor_name: Doctor's full name
-            - doctor_title: Doctor's title/degree (MD, DR, etc.)
-            - clinic_address: Clinic or hospital address
-            - clinic_phone: Clinic phone number
-            - medicine_name: Name of prescribed medicines
-            - medicine_dose: Dosage amounts and units
-            - medicine_frequency: How often to take (daily, twice daily, etc.)
-            - medicine_duration: How long to take the medicine
-            - instructions: Special instructions or directions
-            - immunization: Vaccine name (if any)
-            - immunization_date: Vaccine date (if any)
-            - is_allergic: true/false if allergies mentioned
-            - weight: Patient weight with unit
-            - is_pregnant: true/false if pregnancy mentioned
-            
-            OCR Text:
-            {ocr_text}
-            
-            Return only valid JSON. If a field is not found, use empty string "" for text fields, null for boolean fields, and null for numbers.
-            """
+            prompt = build_extraction_prompt(ocr_text, fields, self.schema)
             
             # Use Mistral's chat completion for structured extraction
-            response = self.mistral_client.chat.complete(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=1000
-            )
-            
-            response_text = response.choices[0].message.content
+            response_text = self._mistral_chat(prompt, max_tokens=1000)
             
             # Try to extract JSON from response
             json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
-                return json.loads(json_match.group())
+                extracted = json.loads(json_match.group())
+                # Keep the answer to a reduced prompt from overriding fields that were not asked for
+                return {name: extracted.get(name) for name in fields} if fields else extracted
             else:
                 return {}
                 
@@ -169,6 +271,145 @@ class AdvancedPrescriptionExtractor:
             print(f"Mistral structured extraction error: {e}")
             return {}
     
+    def stream_fields(self, ocr_text: str, fields: Optional[List[str]] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming Mistral extraction: (field, value) pairs are yielded as soon as each JSON value
+        closes, and the stream is closed once every requested field has arrived, so output the
+        prompt did not ask for is never waited for. Complete answers go to the response cache.
+        """
+        wanted = set(fields or self.schema)
+        prompt = build_extraction_prompt(ocr_text, fields, self.schema)
+        cache = self.response_cache
+        if cache is not None:
+            entry = cache.get_response(MISTRAL_CHAT_MODEL, MISTRAL_TEMPERATURE, prompt)
+            if entry is not None:
+                self._record_cache_lookup(entry["seconds"])
+                for name, value in StreamingFieldParser().feed(entry["text"]):
+                    if name in wanted:
+                        yield name, value
+                return
+            self._record_cache_lookup(None)
+        
+        report = getattr(self._local, "report", None)
+        started = time.perf_counter()
+        deadline = started + self.method_timeout(self._mistral_structured_extraction)
+        events, stop, opened = self._pump_stream(prompt)
+        parser = StreamingFieldParser()
+        received: List[str] = []
+        values: Dict[str, Any] = {}
+        usage = None
+        try:
+            while True:
+                # The reader runs on its own thread, so a stalled connection can't block past the deadline
+                try:
+                    kind, event = events.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    raise FutureTimeoutError(f"stream stalled after {len(values)} fields")
+                if kind == "error":
+                    raise event
+                if kind == "end":
+                    break
+                chunk = event.data
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content or ""
+                received.append(content)
+                for name, value in parser.feed(content):
+                    if name in wanted and name not in values:
+                        values[name] = value
+                        if report is not None and report["first_field_seconds"] is None:
+                            report["first_field_seconds"] = time.perf_counter() - started
+                        yield name, value
+                if parser.done or len(values) == len(wanted):
+                    break
+        finally:
+            cut_off = not parser.done and len(values) == len(wanted)
+            stop.set()
+            close = getattr(opened[0], "close", None) if opened else None
+            if close is not None:
+                # Closing here cuts a stalled or no-longer-needed connection short; a stream that
+                # refuses to close mid-read is closed by the reader once its current read returns
+                try:
+                    close()
+                except Exception:
+                    pass
+            elapsed = time.perf_counter() - started
+            self._record_llm_call(prompt, "".join(received), usage, elapsed)
+            if report is not None:
+                report["stream_cut_off"] = cut_off
+            if cache is not None and (parser.done or cut_off):
+                # A cut-off stream is not valid JSON on its own; the fields it delivered are
+                cache.put_response(MISTRAL_CHAT_MODEL, MISTRAL_TEMPERATURE, prompt,
+                                   json.dumps(values, ensure_ascii=False), elapsed)
+    
+    def _pump_stream(self, prompt: str) -> Tuple["queue.Queue", threading.Event, List[Any]]:
+        """
+        Open the Mistral stream on a daemon thread and forward its events through a queue as
+        ("event", event), then ("end", None) or ("error", exception). Setting the returned event
+        stops the forwarding; the opened stream is appended to the returned list for closing.
+        """
+        events: "queue.Queue" = queue.Queue()
+        stop = threading.Event()
+        opened: List[Any] = []
+        
+        def pump():
+            try:
+                stream = self.resilience.call(
+                    self.mistral_client.chat.stream,
+                    model=MISTRAL_CHAT_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=MISTRAL_TEMPERATURE,
+                    max_tokens=1000
+                )
+                opened.append(stream)
+                for event in stream:
+                    if stop.is_set():
+                        break
+                    events.put(("event", event))
+                else:
+                    events.put(("end", None))
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                close = getattr(opened[0], "close", None) if opened else None
+                if close is not None and stop.is_set():
+                    try:
+                        close()
+                    except Exception:
+                        pass
+        
+        threading.Thread(target=pump, name="mistral-stream", daemon=True).start()
+        return events, stop, opened
+    
+    def _mistral_batch_extraction(self, documents: List[Tuple[str, str]],
+                                  fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """One Mistral request for several (document id, OCR text) pairs; returns the documents it parsed"""
+        try:
+            prompt = build_batch_prompt(documents, fields, self.schema)
+            response_text = self._mistral_chat(prompt, max_tokens=BATCH_COMPLETION_TOKENS * len(documents))
+        except Exception as e:
+            print(f"Mistral batch extraction error: {e}")
+            return {}
+        
+        parsed = parse_batch_response(response_text)
+        return {doc_id: {name: parsed[doc_id].get(name) for name in (fields or self.schema)}
+                for doc_id, _ in documents if doc_id in parsed}
+    
+    def _mistral_chat(self, prompt: str, max_tokens: int) -> str:
+        """Mistral chat completion text for `prompt`, through the response cache and the resilient caller"""
+        def complete():
+            response = self.resilience.call(
+                self.mistral_client.chat.complete,
+                model=MISTRAL_CHAT_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=MISTRAL_TEMPERATURE,
+                max_tokens=max_tokens
+            )
+            return response.choices[0].message.content, getattr(response, "usage", None)
+        
+        return self._complete(MISTRAL_CHAT_MODEL, MISTRAL_TEMPERATURE, prompt, complete)
+    
     def _langchain_extraction(self, ocr_text: str) -> Dict[str, Any]:
         """Use LangChain with structured output parsing"""
         if not LANGCHAIN_AVAILABLE or not self.openai_api_key:
@@ -193,8 +434,8 @@ class AdvancedPrescriptionExtractor:
             llm = OpenAI(temperature=0, openai_api_key=self.openai_api_key)
             
             # Create the chain
-            _input = prompt.format_prompt(text=ocr_text)
-            output = llm(_input.to_string())
+            _input = prompt.format_prompt(text=ocr_text).to_string()
+            output = self._complete(getattr(llm, "model_name", "openai"), 0, _input, lambda: (llm(_input), None))
             
             # Parse the output
             parsed_output = parser.parse(output)
@@ -254,6 +495,8 @@ class AdvancedPrescriptionExtractor:
         """Enhanced regex extraction with better patterns"""
         extracted = {}
         text = ocr_text.strip()
+        # Each field is searched in its markdown region first (header, patient, Rx body, signature)
+        document = segment_markdown(text)
         
         # Enhanced patient name patterns
         name_patterns = [
@@ -262,12 +505,10 @@ class AdvancedPrescriptionExtractor:
             r'Patient\s*Name[:\-\s]*([A-Z][a-z]+(?:\s+[A-Z]\.?\s*)*[A-Z][a-z]+)'
         ]
         
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                name = re.sub(r',\s*(?:HM\d+|USN|USNR|MD|DR\.?).*?$', '', match.group(1), flags=re.IGNORECASE)
-                extracted["patient_name"] = name.strip()
-                break
+        match = document.first_match(name_patterns, ("patient",), source=STATS_SOURCE, group="patient_name")
+        if match:
+            name = re.sub(r',\s*(?:HM\d+|USN|USNR|MD|DR\.?).*?$', '', match.group(1), flags=re.IGNORECASE)
+            extracted["patient_name"] = name.strip()
         
         # Enhanced date patterns
         date_patterns = [
@@ -276,11 +517,9 @@ class AdvancedPrescriptionExtractor:
             r'(\d{1,2}\s+(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)\s+\d{2,4})'
         ]
         
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted["prescription_date"] = match.group(1).strip()
-                break
+        match = document.first_match(date_patterns, ("header", "rx"), source=STATS_SOURCE, group="prescription_date")
+        if match:
+            extracted["prescription_date"] = match.group(1).strip()
         
         # Enhanced doctor extraction
         doctor_patterns = [
@@ -288,13 +527,11 @@ class AdvancedPrescriptionExtractor:
             r'SIGNATURE[:\-\s]*([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)\s*([\w\s\.]*(?:MD|DR|LODR)[\w\s\.]*)'
         ]
         
-        for pattern in doctor_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted["doctor_name"] = match.group(1).strip()
-                if len(match.groups()) > 1 and match.group(2):
-                    extracted["doctor_title"] = match.group(2).strip()
-                break
+        match = document.first_match(doctor_patterns, ("signature", "header"), source=STATS_SOURCE, group="doctor")
+        if match:
+            extracted["doctor_name"] = match.group(1).strip()
+            if len(match.groups()) > 1 and match.group(2):
+                extracted["doctor_title"] = match.group(2).strip()
         
         # Enhanced medicine extraction
         medicine_patterns = [
@@ -306,14 +543,25 @@ class AdvancedPrescriptionExtractor:
         medicines = []
         doses = []
         
-        for pattern in medicine_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                if len(match.groups()) >= 2:
-                    med_name = match.group(1).strip()
-                    if med_name.lower() not in ['and', 'or', 'with', 'the', 'a', 'an']:
-                        medicines.append(med_name)
-                        doses.append(match.group(2).strip())
+        # Known medications from the lexicon, plus explicit "Tr/Rx <name> <dose>" lines beside them;
+        # the generic patterns only run when none is found
+        for scope in document.scopes(("rx",)):
+            hits = self.lexicon.find(scope)
+            if hits:
+                hits = prescribed_beside(scope, hits)
+                medicines = list(dict.fromkeys(hit.name for hit in hits))
+                doses = [hit.dose for hit in hits if hit.dose]
+            else:
+                for pattern in medicine_patterns:
+                    matches = find_all(STATS_SOURCE, "medicine", pattern, scope)
+                    for match in matches:
+                        if len(match.groups()) >= 2:
+                            med_name = match.group(1).strip()
+                            if med_name.lower() not in ['and', 'or', 'with', 'the', 'a', 'an']:
+                                medicines.append(med_name)
+                                doses.append(match.group(2).strip())
+            if medicines:
+                break
         
         if medicines:
             extracted["medicine_name"] = ", ".join(medicines)
@@ -326,14 +574,12 @@ class AdvancedPrescriptionExtractor:
             r'Seg[:\-\s]*([^|\n]+)'
         ]
         
-        for pattern in instruction_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                instructions = match.group(1).strip()
-                # Clean up common OCR artifacts
-                instructions = re.sub(r'\s+', ' ', instructions)
-                extracted["instructions"] = instructions
-                break
+        match = document.first_match(instruction_patterns, ("rx",), source=STATS_SOURCE, group="instructions")
+        if match:
+            instructions = match.group(1).strip()
+            # Clean up common OCR artifacts
+            instructions = re.sub(r'\s+', ' ', instructions)
+            extracted["instructions"] = instructions
         
         # Age extraction with better patterns
         age_patterns = [
@@ -342,13 +588,11 @@ class AdvancedPrescriptionExtractor:
             r'(?:under|age)\s*(\d{1,3})'
         ]
         
-        for pattern in age_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                age = int(match.group(1))
-                if 0 < age < 120:  # Reasonable age range
-                    extracted["patient_age"] = age
-                break
+        match = document.first_match(age_patterns, ("patient",), source=STATS_SOURCE, group="patient_age")
+        if match:
+            age = int(match.group(1))
+            if 0 < age < 120:  # Reasonable age range
+                extracted["patient_age"] = age
         
         # Gender extraction
         gender_patterns = [
@@ -357,15 +601,13 @@ class AdvancedPrescriptionExtractor:
             r'\b([MF])\b(?:\s|$)'
         ]
         
-        for pattern in gender_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                gender = match.group(1).upper()
-                if gender in ['M', 'MALE']:
-                    extracted["patient_sex"] = "Male"
-                elif gender in ['F', 'FEMALE']:
-                    extracted["patient_sex"] = "Female"
-                break
+        match = document.first_match(gender_patterns, ("patient",), source=STATS_SOURCE, group="patient_sex")
+        if match:
+            gender = match.group(1).upper()
+            if gender in ['M', 'MALE']:
+                extracted["patient_sex"] = "Male"
+            elif gender in ['F', 'FEMALE']:
+                extracted["patient_sex"] = "Female"
         
         # Clinic/facility extraction
         facility_patterns = [
@@ -374,11 +616,9 @@ class AdvancedPrescriptionExtractor:
             r'U\.S\.S\.?\s*([^|\n]+)'
         ]
         
-        for pattern in facility_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted["clinic_address"] = match.group(1).strip()
-                break
+        match = document.first_match(facility_patterns, ("header",), source=STATS_SOURCE, group="clinic_address")
+        if match:
+            extracted["clinic_address"] = match.group(1).strip()
         
         return extracted
     
@@ -400,42 +640,340 @@ class AdvancedPrescriptionExtractor:
                 merged[field] = field_values[0]
             else:
                 # Set default values
-                if self.schema[field]["type"] == "boolean":
-                    merged[field] = None
-                elif self.schema[field]["type"] == "integer":
-                    merged[field] = None
-                else:
-                    merged[field] = ""
+                merged[field] = empty_value(self.schema[field]["type"])
         
         return merged
     
-    def extract_all_fields(self, ocr_text: str) -> Dict[str, Any]:
-        """Extract fields using all available methods and merge results"""
-        print(f"Using {len(self.extraction_methods)} extraction methods...")
-        
+    def method_timeout(self, method) -> float:
+        return self.method_timeouts.get(method.__name__, DEFAULT_METHOD_TIMEOUT)
+    
+    def _complete(self, model: str, temperature: float, prompt: str,
+                  call: Callable[[], Tuple[str, Any]]) -> str:
+        """
+        Response text for `prompt`, from the response cache when an identical call was made
+        before; otherwise `call()` -> (text, usage) runs and its usage is recorded
+        """
+        cache = self.response_cache
+        if cache is not None:
+            entry = cache.get_response(model, temperature, prompt)
+            if entry is not None:
+                self._record_cache_lookup(entry["seconds"])
+                return entry["text"]
+            self._record_cache_lookup(None)
+        
+        started = time.perf_counter()
+        text, usage = call()
+        elapsed = time.perf_counter() - started
+        self._record_llm_call(prompt, text, usage, elapsed)
+        if cache is not None and text:
+            cache.put_response(model, temperature, prompt, text, elapsed)
+        return text
+    
+    def _record_cache_lookup(self, saved_seconds: Optional[float]):
+        """Count a response cache hit (with the latency it saved) or miss"""
+        hit = saved_seconds is not None
+        with self._stats_lock:
+            self.stats["cache_hits" if hit else "cache_misses"] += 1
+            self.stats["cache_saved_seconds"] += saved_seconds or 0.0
+        report = getattr(self._local, "report", None)
+        if report is not None and hit:
+            report["cache_hits"] += 1
+            report["cache_saved_seconds"] += saved_seconds
+    
+    def _record_llm_call(self, prompt: str, text: str, usage: Any, elapsed: float):
+        """Add one LLM call's tokens and latency to the totals and to the running document's report"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or estimate_tokens(prompt)
+        completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(text or "")
+        with self._stats_lock:
+            self.stats["llm_calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["llm_seconds"] += elapsed
+        report = getattr(self._local, "report", None)
+        if report is not None:
+            report["llm_calls"] += 1
+            report["prompt_tokens"] += prompt_tokens
+            report["completion_tokens"] += completion_tokens
+            report["llm_seconds"] += elapsed
+    
+    def _run_method(self, method, ocr_text: str, report: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """Run one method with `report` as this thread's document report, so LLM usage lands in it"""
+        self._local.report = report
+        try:
+            return method(ocr_text, **kwargs)
+        finally:
+            self._local.report = None
+    
+    def _run_parallel(self, methods: List[Any], ocr_text: str, report: Dict[str, Any],
+                      on_field: Optional[Callable[[str, Any], None]] = None) -> List[Dict[str, Any]]:
+        """Run `methods` at once and return their non-empty results in method order"""
         results = []
         
-        # Run all extraction methods
-        for i, method in enumerate(self.extraction_methods):
-            try:
-                print(f"Running extraction method {i+1}/{len(self.extraction_methods)}...")
-                result = method(ocr_text)
-                if result:
-                    results.append(result)
-                    print(f"Method {i+1} extracted {len([v for v in result.values() if v])} fields")
-            except Exception as e:
-                print(f"Extraction method {i+1} failed: {e}")
-        
-        # Merge results
-        merged_result = self.merge_extraction_results(results)
-        
-        print(f"Final merged result has {len([v for v in merged_result.values() if v])} populated fields")
-        
-        return merged_result
+        # With on_field, the Mistral method runs on this thread so the callback can update a UI
+        # (Streamlit only renders from the script thread); the others still run in the pool
+        inline = None
+        if on_field is not None:
+            inline = next((method for method in methods if method.__name__ == "_mistral_structured_extraction"), None)
+        pooled = [method for method in methods if method != inline]
+        
+        # All methods run at once, so wall time is the slowest method rather than the sum. Results
+        # are collected in method order, which keeps the merge priority independent of finish order.
+        # A method still running at its timeout is abandoned (its thread finishes in the background).
+        pool = ThreadPoolExecutor(max_workers=max(1, len(pooled)), thread_name_prefix="extraction")
+        started = time.monotonic()
+        try:
+            futures = {method: pool.submit(self._run_method, method, ocr_text, report) for method in pooled}
+            inline_result = None
+            if inline is not None:
+                try:
+                    inline_result = self._run_method(inline, ocr_text, report, on_field=on_field)
+                except Exception as e:
+                    print(f"Extraction method {self.extraction_methods.index(inline)+1} ({inline.__name__}) failed: {e}")
+            for method in methods:
+                i = self.extraction_methods.index(method)
+                try:
+                    if method == inline:
+                        result = inline_result
+                    else:
+                        remaining = started + self.method_timeout(method) - time.monotonic()
+                        result = futures[method].result(timeout=max(0.0, remaining))
+                    if result:
+                        results.append(result)
+                        print(f"Method {i+1} ({method.__name__}) extracted {len([v for v in result.values() if v])} fields")
+                except FutureTimeoutError:
+                    print(f"Extraction method {i+1} ({method.__name__}) timed out after {self.method_timeout(method):g}s")
+                except Exception as e:
+                    print(f"Extraction method {i+1} ({method.__name__}) failed: {e}")
+        finally:
+            pool.shutdown(wait=False)
+        return results
+    
+    def missing_required_fields(self, fields: Dict[str, Any]) -> List[str]:
+        """Required fields of self.schema that are still empty"""
+        return [name for name, spec in self.schema.items() if spec["required"] and not fields.get(name)]
+    
+    def _cascade_extraction(self, ocr_text: str, report: Dict[str, Any],
+                            on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """Regex and NLP first; the LLM only sees the required fields they left empty, if any"""
+        cheap = [method for method in self.extraction_methods if method.__name__ in CHEAP_METHODS]
+        merged = self.merge_extraction_results(self._run_parallel(cheap, ocr_text, report))
+        
+        missing = self.missing_required_fields(merged)
+        report["llm_fields"] = missing
+        if not missing:
+            print("All required fields found without the LLM; skipping the Mistral call")
+            report["llm_skipped"] = True
+            with self._stats_lock:
+                self.stats["llm_skipped"] += 1
+            return merged
+        
+        print(f"Asking Mistral for {len(missing)} missing required fields: {', '.join(missing)}")
+        if on_field is not None:
+            llm_result = self._run_method(self._mistral_structured_extraction, ocr_text, report,
+                                          fields=missing, on_field=on_field)
+            return self.merge_extraction_results([merged, llm_result])
+        llm_result = self._call_with_timeout(
+            self.method_timeout(self._mistral_structured_extraction), "Mistral structured extraction", {},
+            self._run_method, self._mistral_structured_extraction, ocr_text, report, fields=missing)
+        # Regex/NLP values keep priority; the LLM only fills what they missed
+        return self.merge_extraction_results([merged, llm_result])
+    
+    def _call_with_timeout(self, timeout: float, label: str, default: Any, function, *args, **kwargs) -> Any:
+        """function(*args, **kwargs) on a worker thread; `default` if it is still running after `timeout` seconds"""
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extraction")
+        try:
+            return pool.submit(function, *args, **kwargs).result(timeout=timeout)
+        except FutureTimeoutError:
+            print(f"{label} timed out after {timeout:g}s")
+            return default
+        finally:
+            pool.shutdown(wait=False)
+    
+    def _new_report(self, mode: str) -> Dict[str, Any]:
+        return {"mode": mode, "llm_calls": 0, "llm_skipped": False,
+                "llm_fields": list(self.schema) if not self.cascade else [], "prompt_tokens": 0,
+                "completion_tokens": 0, "llm_seconds": 0.0, "cache_hits": 0, "cache_saved_seconds": 0.0,
+                "batch_size": 1, "first_field_seconds": None, "stream_cut_off": False, "seconds": 0.0}
+    
+    def extract_with_report(self, ocr_text: str, on_field: Optional[Callable[[str, Any], None]] = None):
+        """
+        (merged fields, report) for one document. The report gives the mode, LLM calls,
+        prompt/completion tokens, LLM and total seconds, response cache hits and the LLM
+        seconds they saved, in cascade mode the fields sent to the LLM and whether the
+        call was skipped, and when streaming the seconds to the first field and whether
+        the stream was cut off. on_field(name, value) is called on this thread for each
+        streamed Mistral field as it arrives.
+        """
+        report = self._new_report("cascade" if self.cascade else "parallel")
+        started = time.perf_counter()
+        
+        if self.cascade:
+            print("Cascade extraction: regex/NLP first, LLM only for missing required fields...")
+            merged_result = self._cascade_extraction(ocr_text, report, on_field)
+        else:
+            print(f"Using {len(self.extraction_methods)} extraction methods...")
+            merged_result = self.merge_extraction_results(
+                self._run_parallel(self.extraction_methods, ocr_text, report, on_field))
+        
+        report["seconds"] = time.perf_counter() - started
+        with self._stats_lock:
+            self.stats["documents"] += 1
+        
+        print(f"Final merged result has {len([v for v in merged_result.values() if v])} populated fields "
+              f"({report['prompt_tokens']} prompt tokens, {report['seconds']:.2f}s)")
+        
+        return merged_result, report
+    
+    def extract_all_fields(self, ocr_text: str) -> Dict[str, Any]:
+        """Extract fields using all available methods (or the cascade) and merge results"""
+        return self.extract_with_report(ocr_text)[0]
+    
+    def extract_batch_with_reports(self, ocr_texts: List[str],
+                                   token_budget: Optional[int] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        extract_with_report() for many documents, with the Mistral step packed into shared
+        requests: as many documents per request as fit `token_budget` (estimated prompt tokens),
+        answered as one JSON array keyed by document id. Documents the batched answer does not
+        cover, or covers with unparseable JSON, are retried with a single-document request.
+        Each request runs under the Mistral method timeout, times the group size when batched;
+        a batched request that times out is not retried per document.
+        The other methods, and the cascade's skip/reduce decision, run per document as usual;
+        each batched document's report carries an equal share of its request's tokens and time.
+        """
+        budget = token_budget or self.batch_token_budget
+        mode = "cascade_batch" if self.cascade else "batch"
+        print(f"Batched extraction of {len(ocr_texts)} documents within {budget} prompt tokens per request...")
+        
+        # Everything but Mistral runs per document first (only regex/NLP in cascade mode)
+        other_methods = [method for method in self.extraction_methods
+                         if method.__name__ != "_mistral_structured_extraction" and
+                         (not self.cascade or method.__name__ in CHEAP_METHODS)]
+        reports = [self._new_report(mode) for _ in ocr_texts]
+        other_results = []
+        for text, report in zip(ocr_texts, reports):
+            started = time.perf_counter()
+            other_results.append(self._run_parallel(other_methods, text, report))
+            report["seconds"] = time.perf_counter() - started
+        
+        # Fields to ask Mistral for, per document (None = the full schema)
+        requested: Dict[int, Optional[List[str]]] = {}
+        for i, results in enumerate(other_results):
+            if not self.cascade:
+                requested[i] = None
+                continue
+            missing = self.missing_required_fields(self.merge_extraction_results(results))
+            reports[i]["llm_fields"] = missing
+            if missing:
+                requested[i] = missing
+            else:
+                reports[i]["llm_skipped"] = True
+                with self._stats_lock:
+                    self.stats["llm_skipped"] += 1
+        
+        llm_results: Dict[int, Dict[str, Any]] = {}
+        pending = list(requested)
+        union = [name for name in self.schema if any(name in (requested[i] or self.schema) for i in pending)]
+        overhead = estimate_tokens(build_batch_prompt([], union, self.schema))
+        for group in pack_documents([ocr_texts[i] for i in pending], budget, BATCH_MAX_DOCUMENTS, overhead):
+            indices = [pending[position] for position in group]
+            if len(indices) > 1:
+                # Cascade groups ask for every field missing in any of their documents
+                fields = None if not self.cascade else \
+                    [name for name in self.schema if any(name in requested[i] for i in indices)]
+                group_report = self._new_report(mode)
+                started = time.perf_counter()
+                # The batched request gets the single-document Mistral timeout once per document it carries
+                parsed = self._call_with_timeout(
+                    self.method_timeout(self._mistral_structured_extraction) * len(indices),
+                    f"Batched Mistral request for {len(indices)} documents", None,
+                    self._run_batch_request, [(document_id(i), ocr_texts[i]) for i in indices], fields, group_report)
+                elapsed = time.perf_counter() - started
+                with self._stats_lock:
+                    self.stats["batch_calls"] += 1
+                    self.stats["batch_documents"] += len(indices)
+                for i in indices:
+                    report = reports[i]
+                    report["batch_size"] = len(indices)
+                    report["llm_calls"] += group_report["llm_calls"]
+                    report["cache_hits"] += group_report["cache_hits"]
+                    for key in ("prompt_tokens", "completion_tokens"):
+                        report[key] += group_report[key] // len(indices)
+                    for key in ("llm_seconds", "cache_saved_seconds"):
+                        report[key] += group_report[key] / len(indices)
+                    report["seconds"] += elapsed / len(indices)
+                    if parsed is None:
+                        # A stalled API would stall the per-document retries too; no LLM fields for this group
+                        llm_results[i] = {}
+                    elif document_id(i) in parsed:
+                        llm_results[i] = {name: value for name, value in parsed[document_id(i)].items()
+                                          if requested[i] is None or name in requested[i]}
+            
+            for i in indices:
+                if i in llm_results:
+                    continue
+                if len(indices) > 1:
+                    print(f"Document {document_id(i)} missing from the batched answer; retrying it on its own")
+                    with self._stats_lock:
+                        self.stats["batch_fallbacks"] += 1
+                started = time.perf_counter()
+                llm_results[i] = self._call_with_timeout(
+                    self.method_timeout(self._mistral_structured_extraction), "Mistral structured extraction", {},
+                    self._run_method, self._mistral_structured_extraction, ocr_texts[i], reports[i],
+                    fields=requested[i])
+                reports[i]["seconds"] += time.perf_counter() - started
+        
+        outputs = []
+        for i, results in enumerate(other_results):
+            llm_result = llm_results.get(i, {})
+            if self.cascade:
+                # Regex/NLP values keep priority; the LLM only fills what they missed
+                merged = self.merge_extraction_results(results + [llm_result])
+            else:
+                # Mistral comes first, as in extract_all_fields()
+                merged = self.merge_extraction_results([llm_result] + results)
+            outputs.append((merged, reports[i]))
+        
+        with self._stats_lock:
+            self.stats["documents"] += len(ocr_texts)
+        print(f"Batched extraction done: {sum(report['prompt_tokens'] for report in reports)} prompt tokens "
+              f"for {len(ocr_texts)} documents")
+        return outputs
+    
+    def _run_batch_request(self, documents: List[Tuple[str, str]], fields: Optional[List[str]],
+                           report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """_mistral_batch_extraction() with `report` as this thread's report, like _run_method()"""
+        self._local.report = report
+        try:
+            return self._mistral_batch_extraction(documents, fields)
+        finally:
+            self._local.report = None
+    
+    def extract_batch(self, ocr_texts: List[str], token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Merged fields of each document, using batched Mistral prompts (see extract_batch_with_reports)"""
+        return [merged for merged, _ in self.extract_batch_with_reports(ocr_texts, token_budget)]
+    
+    def stats_snapshot(self) -> Dict[str, Any]:
+        """Totals since creation plus per-document averages and the response cache hit rate"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        documents = stats["documents"] or 1
+        stats["prompt_tokens_per_document"] = stats["prompt_tokens"] / documents
+        stats["llm_seconds_per_document"] = stats["llm_seconds"] / documents
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        stats["cache_hit_rate"] = stats["cache_hits"] / lookups if lookups else 0.0
+        return stats
 
-def create_advanced_extractor(mistral_api_key: str, openai_api_key: Optional[str] = None) -> AdvancedPrescriptionExtractor:
+def create_advanced_extractor(mistral_api_key: str, openai_api_key: Optional[str] = None,
+                              resilience: Optional[ResilientCaller] = None,
+                              method_timeouts: Optional[Dict[str, float]] = None,
+                              cascade: bool = False,
+                              response_cache: Optional[LLMResponseCache] = None,
+                              batch_token_budget: int = BATCH_TOKEN_BUDGET,
+                              streaming: bool = False) -> AdvancedPrescriptionExtractor:
     """Factory function to create advanced extractor"""
-    return AdvancedPrescriptionExtractor(mistral_api_key, openai_api_key)
+    return AdvancedPrescriptionExtractor(mistral_api_key, openai_api_key, resilience, method_timeouts=method_timeouts,
+                                         cascade=cascade, response_cache=response_cache,
+                                         batch_token_budget=batch_token_budget, streaming=streaming)
 
 # Test function
 def test_advanced_extraction():
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Resumable Batch OCR
+Fans OCR + prescription field extraction out over a worker pool and records
+every finished file in a JSONL checkpoint manifest so interrupted runs resume
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from batch_completion import BatchCompletion
+from ocr_executor import collect_page_results, create_ocr_executor, encode_image_document, encode_pdf_document, join_pages
+from pattern_stats import enable_pattern_stats
+from pdf_splitter import iter_pdf_pages
+from prescription_field_extractor import DEFAULT_SCANNER, process_prescription_image
+from result_cache import create_ocr_cache, sha256_bytes
+
+SUPPORTED_EXTENSIONS = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".pdf": "application/pdf"}
+
+
+def collect_inputs(inputs: Iterable[str]) -> List[str]:
+    """Expand directories and glob patterns into a sorted, de-duplicated list of supported files"""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item, recursive=True)
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.path.splitext(candidate)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.add(os.path.normpath(candidate))
+    return sorted(paths)
+
+
+def load_manifest(manifest_path: str, include_failed: bool = False) -> Set[str]:
+    """Return the paths already recorded in a manifest (successful ones only unless include_failed)"""
+    done = set()
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if record.get("status") == "ok" or include_failed:
+                done.add(record["path"])
+    return done
+
+
+def build_document(path: str, file_bytes: bytes) -> Dict[str, str]:
+    mime_type = SUPPORTED_EXTENSIONS[os.path.splitext(path)[1].lower()]
+    if mime_type == "application/pdf":
+        return encode_pdf_document(file_bytes)
+    return encode_image_document(file_bytes, mime_type)
+
+
+def process_file(path: str, executor, on_page: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    OCR one file and extract its prescription fields; never raises.
+    `on_page` receives a {"path", "page", "markdown"} record for every page as soon as it is available.
+    """
+    record = {"path": path, "timestamp": datetime.now().isoformat()}
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+        record["sha256"] = sha256_bytes(file_bytes)
+
+        if path.lower().endswith(".pdf"):
+            # Page-range chunks run in parallel on the OCR executor; pages are handed on as chunks finish
+            page_results = []
+            for page in iter_pdf_pages(executor, file_bytes, ordered=False):
+                if page.error is not None:
+                    raise RuntimeError(page.error)
+                page_results.append(page)
+                if on_page:
+                    on_page({"path": path, "page": page.page_number, "markdown": page.markdown})
+            pages = collect_page_results(page_results).get(0, {"pages": []})["pages"]
+        else:
+            pages = executor.process(build_document(path, file_bytes), file_bytes)
+            if on_page:
+                for page_number, markdown in enumerate(pages):
+                    on_page({"path": path, "page": page_number, "markdown": markdown})
+        raw_text = join_pages(pages, "No text found.")
+        structured_result = process_prescription_image(raw_text)
+
+        record.update({
+            "status": "ok",
+            "raw_text": raw_text,
+            "prescription_data": structured_result["prescription_data"],
+            "dates": structured_result["dates"],
+            "tables": structured_result["tables"],
+            "completion_percentage": structured_result["completion_status"]["completion_percentage"],
+            "required_completion_percentage": structured_result["completion_status"]["required_completion_percentage"]
+        })
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)})
+    record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+class ManifestWriter:
+    """Appends one JSON line per record and flushes it straight away (fsync'd unless disabled)"""
+
+    def __init__(self, manifest_path: str, fsync: bool = True):
+        self.fsync = fsync
+        directory = os.path.dirname(manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(manifest_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_batch(paths: List[str], executor, manifest_path: str, workers: int = 4,
+              retry_failed: bool = True, pages_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Process every path not yet checkpointed in the manifest; returns run counters.
+    With `pages_path`, every OCR page is also streamed to that JSONL file as soon as it arrives.
+    """
+    done = load_manifest(manifest_path, include_failed=not retry_failed)
+    pending = [path for path in paths if path not in done]
+    counts = {"total": len(paths), "skipped": len(paths) - len(pending), "ok": 0, "error": 0}
+
+    print(f"📁 {counts['total']} files, {counts['skipped']} already in manifest, {len(pending)} to process")
+
+    writer = ManifestWriter(manifest_path)
+    page_writer = ManifestWriter(pages_path, fsync=False) if pages_path else None
+    on_page = page_writer.write if page_writer else None
+    # Keep a bounded window of submitted files so huge corpora don't queue everything up front
+    max_pending = max(1, workers) * 4
+    coverage = BatchCompletion()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            queue = iter(pending)
+            in_flight = set()
+            while True:
+                for path in queue:
+                    in_flight.add(pool.submit(process_file, path, executor, on_page))
+                    if len(in_flight) >= max_pending:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    writer.write(record)
+                    counts[record["status"]] += 1
+                    if record["status"] == "ok":
+                        coverage.append(record["prescription_data"])
+                    processed = counts["ok"] + counts["error"]
+                    icon = "✅" if record["status"] == "ok" else "❌"
+                    print(f"{icon} [{processed}/{len(pending)}] {record['path']}")
+    finally:
+        writer.close()
+        if page_writer:
+            page_writer.close()
+
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["error"]
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed in {elapsed:.1f}s ({rate:.2f} docs/sec)")
+    if len(coverage):
+        summary = coverage.summary()
+        weakest = sorted(summary["field_hit_rates"].items(), key=lambda item: item[1])[:3]
+        print(f"Fields: {summary['mean_completion_percentage']:.1f}% complete, "
+              f"{summary['mean_required_completion_percentage']:.1f}% of required; least found: "
+              + ", ".join(f"{name} {rate:.0%}" for name, rate in weakest))
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Batch OCR + prescription field extraction with resumable checkpoints")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns (e.g. data/ or 'data/*.jpg')")
+    parser.add_argument("--manifest", default="batch_manifest.jsonl", help="JSONL checkpoint/output manifest")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent files in flight")
+    parser.add_argument("--rps", type=float, default=None, help="OCR requests per second (default: MISTRAL_OCR_RPS or 1)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the OCR result cache")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry files recorded as failed")
+    parser.add_argument("--pages-file", default=None, help="Also stream every OCR page to this JSONL file as it arrives")
+    parser.add_argument("--pattern-stats", default=None,
+                        help="Record per-pattern regex statistics and write them here (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        print("Error: set MISTRAL_API_KEY to run batch OCR")
+        return 1
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        print("No supported files found (jpg, jpeg, png, pdf).")
+        return 1
+
+    from mistral_client import create_mistral_client
+
+    stats = enable_pattern_stats() if args.pattern_stats else None
+    cache = None if args.no_cache else create_ocr_cache()
+    executor = create_ocr_executor(create_mistral_client(api_key), max_workers=args.workers,
+                                   requests_per_second=args.rps, cache=cache)
+    try:
+        counts = run_batch(paths, executor, args.manifest, workers=args.workers, retry_failed=not args.skip_failed,
+                           pages_path=args.pages_file)
+    finally:
+        executor.shutdown()
+    if cache is not None:
+        print(f"OCR cache: {cache.stats()}")
+    if DEFAULT_SCANNER.guard is not None:
+        print(f"Regex guard: {DEFAULT_SCANNER.guard.snapshot()}")
+    if stats is not None:
+        stats.dump(args.pattern_stats)
+        print(f"Pattern statistics ({len(stats.dead_patterns())} patterns never matched) saved to: {args.pattern_stats}")
+    return 0 if counts["error"] == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+End-to-End Pipeline Benchmarks
+Pushes the data/ corpus through OCR (against the local mock server), the field
+extractors and the advanced extractor; reports docs/sec, p50/p95/p99 latency
+per stage and peak RSS, and stores results as JSON for comparison across commits
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import Future, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from extract_prescription_fields import extract_prescription_fields
+from mock_mistral_server import MockConfig, MockMistralClient, start_mock_server
+from ocr_executor import create_ocr_executor, encode_image_document, join_pages
+from prescription_field_extractor import process_prescription_image
+
+DEFAULT_RESULTS_DIR = "benchmark_results"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of `values` (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def summarize_stage(latencies: List[float], wall_seconds: float, errors: int = 0) -> Dict[str, Any]:
+    count = len(latencies)
+    return {
+        "documents": count,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 4),
+        "docs_per_sec": round(count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3) if count else 0.0
+        },
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def time_sequential(function: Callable[[str], Any], texts: List[str]) -> Dict[str, Any]:
+    """Run `function` over every text in turn, timing each call"""
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for text in texts:
+        call_started = time.perf_counter()
+        try:
+            function(text)
+        except Exception as e:
+            errors += 1
+            print(f"Benchmark call failed: {e}")
+        latencies.append(time.perf_counter() - call_started)
+    return summarize_stage(latencies, time.perf_counter() - started, errors)
+
+
+def bench_ocr(image_paths: List[str], client, workers: int, rps: float):
+    """OCR every image concurrently; latency is submit-to-result per document"""
+    executor = create_ocr_executor(client, max_workers=workers, requests_per_second=rps)
+    latencies = [0.0] * len(image_paths)
+    texts = [""] * len(image_paths)
+    errors = 0
+    started = time.perf_counter()
+    try:
+        futures: Dict[Future, int] = {}
+        submitted: List[float] = []
+        for index, path in enumerate(image_paths):
+            with open(path, "rb") as f:
+                image_bytes = f.read()
+            mime_type = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+            submitted.append(time.perf_counter())
+            futures[executor.submit(encode_image_document(image_bytes, mime_type))] = index
+        # Read in completion order, so each latency is taken when its document finishes rather
+        # than when the documents submitted before it have been collected
+        for future in as_completed(futures):
+            index = futures[future]
+            latencies[index] = time.perf_counter() - submitted[index]
+            try:
+                texts[index] = join_pages(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"OCR failed for {image_paths[index]}: {e}")
+    finally:
+        executor.shutdown()
+    stage = summarize_stage(latencies, time.perf_counter() - started, errors)
+    if executor.resilience is not None:
+        stage["resilience"] = executor.resilience.snapshot()
+    return stage, texts
+
+
+def bench_advanced(texts: List[str], client, cascade: bool = False, batched: bool = False,
+                   streaming: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    AdvancedPrescriptionExtractor with every available method, in cascade mode, with batched
+    Mistral prompts over the whole corpus, or streaming; None when its dependencies are missing.
+    "llm" holds the extractor's call, skip and token totals. Batched per-document latencies are
+    the documents' shares of their requests, so compare the batched stage on docs/sec.
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from advanced_prescription_extractor import AdvancedPrescriptionExtractor
+            extractor = AdvancedPrescriptionExtractor("mock", mistral_client=client, cascade=cascade,
+                                                      streaming=streaming)
+    except Exception as e:
+        print(f"Skipping advanced extractor stage: {e}")
+        return None
+
+    reports = []
+
+    def run(text: str):
+        with contextlib.redirect_stdout(io.StringIO()):
+            fields, document_report = extractor.extract_with_report(text)
+        reports.append(document_report)
+        return fields
+
+    if batched:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            outputs = extractor.extract_batch_with_reports(texts)
+        stage = summarize_stage([report["seconds"] for _, report in outputs], time.perf_counter() - started)
+    else:
+        stage = time_sequential(run, texts)
+    stage["methods"] = [method.__name__ for method in extractor.extraction_methods]
+    stage["llm"] = extractor.stats_snapshot()
+    first_fields = [report["first_field_seconds"] for report in reports if report["first_field_seconds"] is not None]
+    if first_fields:
+        stage["first_field_ms"] = {"p50": round(percentile(first_fields, 50) * 1000, 3),
+                                   "p95": round(percentile(first_fields, 95) * 1000, 3)}
+    return stage
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run_benchmarks(data_dir: str = "data", limit: Optional[int] = None, repeat: int = 1,
+                   workers: int = 8, rps: float = 50.0, server_url: Optional[str] = None,
+                   mock_config: Optional[MockConfig] = None, skip_advanced: bool = False) -> Dict[str, Any]:
+    """Run every stage and return the JSON-serialisable report"""
+    image_paths = sorted(glob.glob(os.path.join(data_dir, "*.jpg")) + glob.glob(os.path.join(data_dir, "*.png")))
+    if limit:
+        image_paths = image_paths[:limit]
+    if not image_paths:
+        raise ValueError(f"No images found in {data_dir}")
+
+    server = None
+    if not server_url:
+        server, server_url = start_mock_server(mock_config or MockConfig())
+    client = MockMistralClient(server_url)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"data_dir": data_dir, "documents": len(image_paths), "repeat": repeat, "workers": workers,
+                   "rps": rps, "server_url": server_url,
+                   "mock": vars(mock_config) if mock_config and server else None},
+        "stages": {}
+    }
+    if report["config"]["mock"]:
+        report["config"]["mock"] = {key: value for key, value in report["config"]["mock"].items() if key != "sample_text"}
+
+    try:
+        print(f"OCR: {len(image_paths)} images via {server_url}")
+        report["stages"]["ocr"], texts = bench_ocr(image_paths, client, workers, rps)
+        texts = [text for text in texts if text] * repeat
+
+        print(f"PrescriptionFieldExtractor: {len(texts)} documents")
+        report["stages"]["field_extractor"] = time_sequential(process_prescription_image, texts)
+
+        print(f"extract_prescription_fields: {len(texts)} documents")
+        report["stages"]["extract_prescription_fields"] = time_sequential(extract_prescription_fields, texts)
+
+        if not skip_advanced:
+            print(f"AdvancedPrescriptionExtractor: {len(texts)} documents")
+            advanced = bench_advanced(texts, client)
+            if advanced is not None:
+                report["stages"]["advanced_extractor"] = advanced
+
+            print(f"AdvancedPrescriptionExtractor (cascade): {len(texts)} documents")
+            cascade = bench_advanced(texts, client, cascade=True)
+            if cascade is not None:
+                report["stages"]["advanced_cascade"] = cascade
+
+            print(f"AdvancedPrescriptionExtractor (batched prompts): {len(texts)} documents")
+            batched = bench_advanced(texts, client, batched=True)
+            if batched is not None:
+                report["stages"]["advanced_batched"] = batched
+
+            print(f"AdvancedPrescriptionExtractor (cascade, streaming): {len(texts)} documents")
+            streamed = bench_advanced(texts, client, cascade=True, streaming=True)
+            if streamed is not None:
+                report["stages"]["advanced_cascade_streaming"] = streamed
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Human-readable per-stage deltas between two reports"""
+    lines = [f"Comparing {baseline.get('commit')} -> {current.get('commit')}"]
+    for name, stage in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            lines.append(f"  {name}: new stage")
+            continue
+        for metric, after_value, before_value in (
+                ("docs/sec", stage["docs_per_sec"], before["docs_per_sec"]),
+                ("p95 ms", stage["latency_ms"]["p95"], before["latency_ms"]["p95"])):
+            change = (after_value - before_value) / before_value * 100 if before_value else 0.0
+            lines.append(f"  {name:<28} {metric:<9} {before_value:>10} -> {after_value:>10} ({change:+.1f}%)")
+    return lines
+
+
+def print_report(report: Dict[str, Any]):
+    print("=" * 80)
+    print(f"BENCHMARK RESULTS ({report['commit']})")
+    print("=" * 80)
+    print(f"{'stage':<28} {'docs':>6} {'docs/sec':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stage in report["stages"].items():
+        latency = stage["latency_ms"]
+        print(f"{name:<28} {stage['documents']:>6} {stage['docs_per_sec']:>10} "
+              f"{latency['p50']:>10} {latency['p95']:>10} {latency['p99']:>10}")
+    for name, stage in report["stages"].items():
+        llm = stage.get("llm")
+        if llm:
+            print(f"{name}: {llm['llm_calls']} LLM calls ({llm['batch_calls']} batched), {llm['llm_skipped']} skipped, "
+                  f"{llm['prompt_tokens_per_document']:.0f} prompt tokens/doc, "
+                  f"{llm['llm_seconds_per_document'] * 1000:.0f} ms LLM/doc, "
+                  f"{llm['completion_tokens'] / max(1, llm['documents']):.0f} completion tokens/doc"
+                  + (f", first field p50 {stage['first_field_ms']['p50']} ms" if "first_field_ms" in stage else ""))
+    print(f"Peak RSS: {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the OCR and extraction pipeline over data/")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--limit", type=int, help="Only use the first N images")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the extraction stages over the corpus N times")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=50.0)
+    parser.add_argument("--server-url", default=os.getenv("MISTRAL_SERVER_URL"),
+                        help="Use an already running mock server instead of starting one")
+    parser.add_argument("--per-page-latency", type=float, default=0.2)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--skip-advanced", action="store_true")
+    parser.add_argument("--output", help=f"Result file (default: {DEFAULT_RESULTS_DIR}/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    config = MockConfig(per_page_latency=args.per_page_latency, chat_latency=args.chat_latency,
+                        error_rate=args.error_rate)
+    results = run_benchmarks(args.data_dir, args.limit, args.repeat, args.workers, args.rps,
+                             args.server_url, config, args.skip_advanced)
+    print_report(results)
+
+    output_path = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"{results['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare_reports(json.load(f), results):
+                print(line)
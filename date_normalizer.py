@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Prescription Date Normalizer
+Turns the date formats the extractors capture ("23 JAN 99", "23/01/1999", "1999-01-23")
+into ISO-8601, memoized with a bounded LRU because batches repeat the same strings
+"""
+
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from prescription_schema import SCHEMA
+
+DATE_FIELDS = tuple(spec.name for spec in SCHEMA if spec.type == "date")
+DATE_CACHE_SIZE = 4096
+# Two-digit years up to this one are 20xx, later ones 19xx ("99" -> 1999, "05" -> 2005)
+CENTURY_PIVOT = date.today().year % 100
+
+MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10,
+          "nov": 11, "dec": 12}
+# Tried in order; the numeric day/month order is settled in normalize_date()
+ISO_DATE = re.compile(r"(?<!\d)(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?!\d)")
+NUMERIC_DATE = re.compile(r"(?<!\d)(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})(?!\d)")
+MONTH_WORD = r"((?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*)"
+DAY_MONTH_NAME = re.compile(r"(?<!\d)(\d{1,2})(?:st|nd|rd|th)?[\s\-/.]*" + MONTH_WORD + r"\.?[\s\-/.,]*(\d{4}|\d{2})(?!\d)",
+                            re.IGNORECASE)
+MONTH_NAME_DAY = re.compile(r"\b" + MONTH_WORD + r"\.?\s*(\d{1,2})(?:st|nd|rd|th)?,?\s*(\d{4}|\d{2})(?!\d)", re.IGNORECASE)
+
+
+def expand_year(year: str) -> int:
+    value = int(year)
+    if len(year) == 2:
+        return 2000 + value if value <= CENTURY_PIVOT else 1900 + value
+    return value
+
+
+def month_number(name: str) -> Optional[int]:
+    """JAN, Jan., January and Sept all map to their month; other words do not"""
+    name = name.lower()
+    month = MONTHS.get(name[:3])
+    if month and (len(name) == 3 or name == "sept" or
+                  any(full.startswith(name) for full in ("january", "february", "march", "april", "june", "july",
+                                                         "august", "september", "october", "november", "december"))):
+        return month
+    return None
+
+
+def iso_date(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def normalize_date(raw: str, day_first: bool = True) -> Optional[str]:
+    """
+    ISO-8601 date for a raw date string, or None if it is not one. Numeric dates are read
+    day-first (DD/MM/YYYY, as the extraction prompt asks) unless only month-first is valid.
+    """
+    if not raw:
+        return None
+    match = ISO_DATE.search(raw)
+    if match:
+        return iso_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    match = NUMERIC_DATE.search(raw)
+    if match:
+        first, second, year = int(match.group(1)), int(match.group(2)), expand_year(match.group(3))
+        day, month = (first, second) if day_first else (second, first)
+        return iso_date(year, month, day) or iso_date(year, day, month)
+    for match in DAY_MONTH_NAME.finditer(raw):
+        month = month_number(match.group(2))
+        if month:
+            return iso_date(expand_year(match.group(3)), month, int(match.group(1)))
+    for match in MONTH_NAME_DAY.finditer(raw):
+        month = month_number(match.group(1))
+        if month:
+            return iso_date(expand_year(match.group(3)), month, int(match.group(2)))
+    return None
+
+
+def normalize_dates(fields: Dict[str, Any]) -> Dict[str, Dict[str, Optional[str]]]:
+    """{"raw", "iso"} for every date field of one record; iso is None when the raw value is not a date"""
+    return {name: {"raw": fields.get(name) or "", "iso": normalize_date(str(fields.get(name) or "").strip())}
+            for name in DATE_FIELDS}
+
+
+def normalize_records(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Dict[str, Optional[str]]]]:
+    """normalize_dates() for a batch; repeated date strings are answered from the LRU"""
+    return [normalize_dates(record) for record in records]
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="Benchmark bulk date normalization with and without the LRU")
+    parser.add_argument("--values", type=int, default=100_000, help="Date strings to normalize")
+    parser.add_argument("--distinct", type=int, default=2_000, help="Distinct dates they are drawn from")
+    args = parser.parse_args()
+
+    for sample in ("23 JAN 99", "23 January 1999", "23/01/99", "01/23/1999", "1999-01-23", "Jan. 23, 1999",
+                   "5th Mar 2021", "31/02/2020", "DATE 23 JAN 99", "n/a"):
+        print(f"{sample!r:<20} -> {normalize_date(sample)}")
+
+    randomizer = random.Random(0)
+    month_names = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+    styles = [lambda d: f"{d.day} {month_names[d.month - 1]} {d.year % 100:02d}",
+              lambda d: f"{d.day:02d}/{d.month:02d}/{d.year}",
+              lambda d: f"{d.day} {d.strftime('%B')} {d.year}",
+              lambda d: d.isoformat()]
+    distinct = [randomizer.choice(styles)(date.fromordinal(randomizer.randint(date(1940, 1, 1).toordinal(),
+                                                                              date(2024, 12, 31).toordinal())))
+                for _ in range(args.distinct)]
+    values = [randomizer.choice(distinct) for _ in range(args.values)]
+    records = [dict(zip(DATE_FIELDS, values[i:i + len(DATE_FIELDS)])) for i in range(0, len(values), len(DATE_FIELDS))]
+
+    def strptime_formats(raw: str) -> Optional[str]:
+        """The usual alternative: try datetime.strptime with each format in turn"""
+        for pattern in ("%d %b %y", "%d/%m/%Y", "%d %B %Y", "%Y-%m-%d", "%d/%m/%y", "%d %b %Y"):
+            try:
+                return datetime.strptime(raw, pattern).date().isoformat()
+            except ValueError:
+                continue
+        return None
+
+    def timed(function):
+        started = time.perf_counter()
+        result = function()
+        return time.perf_counter() - started, result
+
+    uncached = normalize_date.__wrapped__
+    strptime_time, baseline = timed(lambda: [strptime_formats(value) for value in values])
+    uncached_time, parsed = timed(lambda: [uncached(value) for value in values])
+    normalize_date.cache_clear()
+    cached_time, memoized = timed(lambda: [normalize_date(value) for value in values])
+    records_time, _ = timed(lambda: normalize_records(records))
+    info = normalize_date.cache_info()
+
+    print(f"\n{args.values:,} values ({args.distinct:,} distinct)")
+    print(f"strptime format list: {strptime_time * 1000:.0f} ms")
+    print(f"regex, uncached:      {uncached_time * 1000:.0f} ms")
+    print(f"regex, LRU:           {cached_time * 1000:.0f} ms ({strptime_time / cached_time:.1f}x vs strptime), "
+          f"hits {info.hits:,} misses {info.misses:,}")
+    print(f"normalize_records over {len(records):,} records: {records_time * 1000:.0f} ms")
+    # strptime reads two-digit years 69-99 as 19xx and 00-68 as 20xx; every other value must agree
+    four_digit = [i for i, value in enumerate(values) if not re.search(r"\D\d{2}$", value)]
+    print(f"disagreements: cached vs uncached {sum(a != b for a, b in zip(parsed, memoized))}, "
+          f"vs strptime on four-digit years {sum(baseline[i] != memoized[i] for i in four_digit)}")
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
-import base64
 import os
-from mistralai import Mistral
+from mistral_client import create_mistral_client
+from ocr_executor import OCRExecutor, encode_image_document, join_pages
+from image_preprocess import create_image_preprocessor
 
-def extract_text_from_image(image_path, api_key):
+def extract_text_from_image(image_path, api_key, executor=None, preprocessor=None, optimize=True):
     """
     Extract text from an image using Mistral OCR API
+    
+    Pass a shared OCRExecutor to run many calls concurrently under one rate limit.
+    With optimize=True the image is downscaled/grayscaled/recompressed before upload.
     """
     if not os.path.exists(image_path):
         print(f"Error: Image file not found at {image_path}")
@@ -15,34 +19,33 @@ def extract_text_from_image(image_path, api_key):
     try:
         with open(image_path, "rb") as image_file:
             image_bytes = image_file.read()
-            encoded_image = base64.b64encode(image_bytes).decode("utf-8")
         
         # Determine MIME type based on file extension
         file_ext = os.path.splitext(image_path)[1].lower()
         mime_type = "image/png" if file_ext == ".png" else "image/jpeg"
         
+        # Shrink the upload before base64 encoding it
+        if optimize:
+            preprocessor = preprocessor or create_image_preprocessor()
+            image_bytes, mime_type, stats = preprocessor.process(image_bytes, mime_type)
+            if stats["bytes_saved"] > 0:
+                print(f"Optimized image: {stats['original_bytes']:,} -> {stats['optimized_bytes']:,} bytes")
+        
         # Create Mistral client
-        client = Mistral(api_key=api_key)
+        if executor is None:
+            executor = OCRExecutor(create_mistral_client(api_key), max_workers=1)
         
         # Prepare document for OCR
-        document = {
-            "type": "image_url", 
-            "image_url": f"data:{mime_type};base64,{encoded_image}"
-        }
+        document = encode_image_document(image_bytes, mime_type)
         
         print(f"Processing image: {os.path.basename(image_path)}")
         print("Extracting text using Mistral OCR...")
         
         # Process OCR
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest", 
-            document=document, 
-            include_image_base64=True
-        )
+        pages = executor.process(document)
         
         # Extract text from response
-        pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-        result_text = "\n\n".join(page.markdown for page in pages) or "No text found."
+        result_text = join_pages(pages, "No text found.")
         
         return result_text
         
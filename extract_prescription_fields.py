@@ -1,38 +1,22 @@
 #!/usr/bin/env python3
-import base64
 import os
 import json
-import re
 from datetime import datetime
-from mistralai import Mistral
+from mistral_client import create_mistral_client
+from ocr_executor import OCRExecutor, encode_image_document, join_pages
+from pattern_stats import find_all, first_match
+from prescription_schema import blank_record
+from result_cache import create_ocr_cache
+
+# Label of this module's patterns in pattern statistics (pattern_stats.py)
+STATS_SOURCE = "extract_prescription_fields"
 
 def extract_prescription_fields(ocr_text):
     """
     Extract structured prescription fields from OCR text according to the schema
     """
     # Initialize the prescription data structure
-    prescription_data = {
-        "patient_name": "",
-        "patient_address": "",
-        "patient_dob": "",
-        "patient_age": "",
-        "patient_sex": "",
-        "prescription_date": "",
-        "doctor_name": "",
-        "doctor_title": "",
-        "clinic_address": "",
-        "clinic_phone": "",
-        "medicine_name": "",
-        "medicine_dose": "",
-        "medicine_frequency": "",
-        "medicine_duration": "",
-        "instructions": "",
-        "immunization": "",
-        "immunization_date": "",
-        "is_allergic": None,
-        "weight": "",
-        "is_pregnant": None
-    }
+    prescription_data = blank_record()
     
     # Clean the OCR text
     text = ocr_text.strip()
@@ -44,11 +28,9 @@ def extract_prescription_fields(ocr_text):
         r"Name.*?:?\s*([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)"
     ]
     
-    for pattern in name_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            prescription_data["patient_name"] = match.group(1).strip()
-            break
+    match = first_match(STATS_SOURCE, "patient_name", name_patterns, text)
+    if match:
+        prescription_data["patient_name"] = match.group(1).strip()
     
     # Extract Prescription Date
     date_patterns = [
@@ -58,11 +40,9 @@ def extract_prescription_fields(ocr_text):
         r"(\d{4}-\d{2}-\d{2})"  # 1999-01-23
     ]
     
-    for pattern in date_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            prescription_data["prescription_date"] = match.group(1).strip()
-            break
+    match = first_match(STATS_SOURCE, "prescription_date", date_patterns, text)
+    if match:
+        prescription_data["prescription_date"] = match.group(1).strip()
     
     # Extract Doctor Name and Title
     doctor_patterns = [
@@ -71,13 +51,11 @@ def extract_prescription_fields(ocr_text):
         r"SIGNATURE.*?([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)\s+(.*?MD.*?)"
     ]
     
-    for pattern in doctor_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            prescription_data["doctor_name"] = match.group(1).strip()
-            if len(match.groups()) > 1:
-                prescription_data["doctor_title"] = match.group(2).strip()
-            break
+    match = first_match(STATS_SOURCE, "doctor", doctor_patterns, text)
+    if match:
+        prescription_data["doctor_name"] = match.group(1).strip()
+        if len(match.groups()) > 1:
+            prescription_data["doctor_title"] = match.group(2).strip()
     
     # Extract Medical Facility/Clinic
     facility_patterns = [
@@ -85,11 +63,9 @@ def extract_prescription_fields(ocr_text):
         r"U\.S\.S\.\s+(.*?)\s+\(DD\s+\d+\)"
     ]
     
-    for pattern in facility_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            prescription_data["clinic_address"] = match.group(1).strip()
-            break
+    match = first_match(STATS_SOURCE, "clinic_address", facility_patterns, text)
+    if match:
+        prescription_data["clinic_address"] = match.group(1).strip()
     
     # Extract Medicine Information
     medicine_patterns = [
@@ -101,7 +77,7 @@ def extract_prescription_fields(ocr_text):
     doses = []
     
     for pattern in medicine_patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
+        matches = find_all(STATS_SOURCE, "medicine", pattern, text)
         for match in matches:
             if len(match.groups()) >= 2:
                 medicines.append(match.group(1))
@@ -117,15 +93,13 @@ def extract_prescription_fields(ocr_text):
         r"Signa.*?Seg:\s*(.*?)(?=\n|$)"
     ]
     
-    for pattern in instruction_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            prescription_data["instructions"] = match.group(1).strip()
-            break
+    match = first_match(STATS_SOURCE, "instructions", instruction_patterns, text)
+    if match:
+        prescription_data["instructions"] = match.group(1).strip()
     
     # Extract Lot Number and Expiration (additional info)
-    lot_match = re.search(r"LOT NO:\s*(\w+)", text, re.IGNORECASE)
-    exp_match = re.search(r"EXP DATE:\s*(\d{2}/\d{2})", text, re.IGNORECASE)
+    lot_match = first_match(STATS_SOURCE, "lot_number", [r"LOT NO:\s*(\w+)"], text)
+    exp_match = first_match(STATS_SOURCE, "expiry_date", [r"EXP DATE:\s*(\d{2}/\d{2})"], text)
     
     additional_info = []
     if lot_match:
@@ -141,9 +115,11 @@ def extract_prescription_fields(ocr_text):
     
     return prescription_data
 
-def extract_text_and_fields_from_image(image_path, api_key):
+def extract_text_and_fields_from_image(image_path, api_key, cache=None, use_cache=True):
     """
     Extract text from image and parse prescription fields
+    
+    OCR results are looked up in the on-disk OCR cache before calling Mistral.
     """
     if not os.path.exists(image_path):
         print(f"Error: Image file not found at {image_path}")
@@ -153,34 +129,27 @@ def extract_text_and_fields_from_image(image_path, api_key):
     try:
         with open(image_path, "rb") as image_file:
             image_bytes = image_file.read()
-            encoded_image = base64.b64encode(image_bytes).decode("utf-8")
         
         # Determine MIME type
         file_ext = os.path.splitext(image_path)[1].lower()
         mime_type = "image/png" if file_ext == ".png" else "image/jpeg"
         
         # Create Mistral client
-        client = Mistral(api_key=api_key)
+        if use_cache and cache is None:
+            cache = create_ocr_cache()
+        executor = OCRExecutor(create_mistral_client(api_key), max_workers=1, cache=cache if use_cache else None)
         
         # Prepare document for OCR
-        document = {
-            "type": "image_url", 
-            "image_url": f"data:{mime_type};base64,{encoded_image}"
-        }
+        document = encode_image_document(image_bytes, mime_type)
         
         print(f"Processing image: {os.path.basename(image_path)}")
         print("Extracting text using Mistral OCR...")
         
-        # Process OCR
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest", 
-            document=document, 
-            include_image_base64=True
-        )
+        # Process OCR (served from the cache when this exact image was seen before)
+        pages = executor.process(document, image_bytes)
         
         # Extract text from response
-        pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-        raw_text = "\n\n".join(page.markdown for page in pages) or "No text found."
+        raw_text = join_pages(pages, "No text found.")
         
         # Extract structured fields
         prescription_fields = extract_prescription_fields(raw_text)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Compiled Multi-Field Scanner
+Precompiled, priority-ordered field rules evaluated after one trigger pass over
+the text, with linear-time evaluation of `K.*?R` chains on cleaned OCR text
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Match, Optional, Pattern, Sequence, Tuple
+
+from pattern_stats import active_pattern_stats
+
+LAZY_GAP = ".*?"
+WORD_LEAD = r"(\w+)"
+_FIND_TRIGGERS = object()
+
+
+@dataclass
+class ScanRule:
+    """
+    One field pattern. The rule can only match when at least one of `triggers`
+    (lowercase literals) occurs in the text; an empty tuple means always evaluate.
+
+    With `linear=True` the pattern is split on its top-level `.*?` gaps into segments.
+    On single-line text the segments are searched left to right (first segment hit,
+    then the next segment after it, ...), which returns the same match as the full
+    pattern in linear instead of quadratic time. Every segment but the last must be
+    group-free and match at most one way at a given position (literals, literal alternations).
+
+    `word_led=True` (patterns starting with `(\w+)`) makes finditer linear on long tokens:
+    a match starting inside a word implies one starting at the word's first character,
+    so apart from the resume position only word starts are tried.
+
+    `superlinear` marks rules the regex_guard.py harness flags as super-linear on adversarial input.
+    """
+    pattern: str
+    triggers: Tuple[str, ...] = ()
+    linear: bool = False
+    word_led: bool = False
+    superlinear: bool = False
+    flags: int = re.IGNORECASE
+    regex: Pattern = field(init=False, repr=False)
+    segments: Optional[List[Pattern]] = field(init=False, repr=False, default=None)
+    word_start_regex: Optional[Pattern] = field(init=False, repr=False, default=None)
+
+    def __post_init__(self):
+        self.regex = re.compile(self.pattern, self.flags)
+        if self.linear:
+            segments = [re.compile(part, self.flags) for part in self.pattern.split(LAZY_GAP)]
+            if len(segments) < 2 or any(segment.groups for segment in segments[:-1]) \
+                    or segments[-1].groups != self.regex.groups:
+                raise ValueError(f"Pattern cannot be evaluated as a linear chain: {self.pattern}")
+            self.segments = segments
+        if self.word_led:
+            if not self.pattern.startswith(WORD_LEAD):
+                raise ValueError(f"Word-led pattern must start with {WORD_LEAD}: {self.pattern}")
+            self.word_start_regex = re.compile(r"(?<!\w)(?:" + self.pattern + ")", self.flags)
+
+    def search(self, text: str, single_line: bool, search: Optional[Callable] = None) -> Optional[Match]:
+        """
+        Leftmost match; for linear rules the returned match carries the last segment's groups.
+        `search(compiled, text, position)` replaces compiled.search (used by the regex guard).
+        """
+        search = search or _plain_search
+        if self.segments is None or not single_line:
+            return search(self.regex, text, 0)
+        position = 0
+        match = None
+        for segment in self.segments:
+            match = search(segment, text, position)
+            if match is None:
+                return None
+            position = match.end()
+        return match
+
+    def finditer(self, text: str, search: Optional[Callable] = None, match: Optional[Callable] = None) -> List[Match]:
+        """All non-overlapping matches, as re.finditer (rules read this way must not match empty strings)"""
+        if search is None and match is None and not self.word_led:
+            return list(self.regex.finditer(text))
+        search = search or _plain_search
+        match = match or _plain_match
+        matches = []
+        position = 0
+        while position <= len(text):
+            if self.word_led:
+                found = match(self.regex, text, position) or search(self.word_start_regex, text, position)
+            else:
+                found = search(self.regex, text, position)
+            if found is None:
+                break
+            matches.append(found)
+            position = found.end() if found.end() > found.start() else found.end() + 1
+        return matches
+
+
+def _plain_search(compiled: Pattern, text: str, position: int) -> Optional[Match]:
+    return compiled.search(text, position)
+
+
+def _plain_match(compiled: Pattern, text: str, position: int) -> Optional[Match]:
+    return compiled.match(text, position)
+
+
+class ScanResult:
+    """Lazily evaluated rule groups over one text; each group is evaluated at most once"""
+
+    def __init__(self, scanner: "FieldScanner", text: str, budget=None, present=_FIND_TRIGGERS):
+        self.scanner = scanner
+        self.budget = budget or (scanner.guard.start_document() if scanner.guard else None)
+        if scanner.guard:
+            text = scanner.guard.prepare_text(text)
+        self.text = text
+        self.single_line = scanner.linearize and "\n" not in text
+        self.present = scanner.find_triggers(text) if present is _FIND_TRIGGERS else present
+        # Per-pattern counters (pattern_stats.py), None unless instrumentation is enabled
+        self.stats = active_pattern_stats()
+        self._first: Dict[str, Optional[Match]] = {}
+        self._all: Dict[str, List[Match]] = {}
+
+    @property
+    def budget_exhausted(self) -> bool:
+        return bool(self.budget and self.budget.exhausted)
+
+    def is_active(self, rule: ScanRule) -> bool:
+        return self.present is None or not rule.triggers or any(trigger in self.present for trigger in rule.triggers)
+
+    def first(self, group: str) -> Optional[Match]:
+        """Match of the highest-priority rule in `group` that matches anywhere (re.search semantics)"""
+        if group not in self._first:
+            result = None
+            stats = self.stats
+            for rule in self.scanner.rules[group]:
+                if self.is_active(rule):
+                    started = time.perf_counter() if stats else 0.0
+                    if self.budget:
+                        result = self.budget.search(rule, self.text, self.single_line)
+                    else:
+                        result = rule.search(self.text, self.single_line)
+                    if stats:
+                        stats.record(self.scanner.name, group, rule.pattern, 1 if result else 0,
+                                     time.perf_counter() - started)
+                    if result:
+                        if stats:
+                            stats.record_win(self.scanner.name, group, rule.pattern)
+                        break
+                elif stats:
+                    stats.record_skip(self.scanner.name, group, rule.pattern)
+            self._first[group] = result
+        return self._first[group]
+
+    def all(self, group: str) -> List[Match]:
+        """Every match of every rule in `group`, in rule order then text order (re.finditer semantics)"""
+        if group not in self._all:
+            matches = []
+            stats = self.stats
+            for rule in self.scanner.rules[group]:
+                if self.is_active(rule):
+                    started = time.perf_counter() if stats else 0.0
+                    found = self.budget.finditer(rule, self.text) if self.budget else rule.finditer(self.text)
+                    if stats:
+                        stats.record(self.scanner.name, group, rule.pattern, len(found), time.perf_counter() - started)
+                    matches.extend(found)
+                elif stats:
+                    stats.record_skip(self.scanner.name, group, rule.pattern)
+            self._all[group] = matches
+        return self._all[group]
+
+    def texts(self, group: str) -> List[str]:
+        """Texts a non-regex matcher should try for `group`, in order"""
+        return [self.text]
+
+
+class RoutedScan:
+    """
+    Scan over a segmented document (markdown_segmenter.py). A routed group is resolved
+    on its regions' text first and falls back to the remaining regions only when those
+    have no match, so no character is scanned twice for a group; unrouted groups use the
+    whole text. Every sub-scan shares one budget, and trigger literals are found once
+    per region (a match spanning two regions is not looked for).
+    """
+
+    def __init__(self, scanner: "FieldScanner", text: str, regions: Dict[str, str]):
+        self.scanner = scanner
+        self.text = text
+        self.regions = regions
+        self.budget = scanner.guard.start_document() if scanner.guard else None
+        self.present = {kind: scanner.find_triggers(region) for kind, region in regions.items()}
+        self._scans: Dict[Tuple[str, ...], ScanResult] = {}
+
+    @property
+    def budget_exhausted(self) -> bool:
+        return bool(self.budget and self.budget.exhausted)
+
+    def _scan(self, kinds: Tuple[str, ...]) -> ScanResult:
+        if kinds not in self._scans:
+            text = self.text if not kinds else " ".join(self.regions[kind] for kind in kinds if self.regions.get(kind))
+            present = [self.present[kind] for kind in (kinds or self.regions) if kind in self.present]
+            # None (filtering disabled) in any region disables it for the combined text too
+            union = None if any(found is None for found in present) else set().union(*present)
+            self._scans[kinds] = ScanResult(self.scanner, text, self.budget, union)
+        return self._scans[kinds]
+
+    def scopes(self, group: str) -> List[ScanResult]:
+        kinds = tuple(self.scanner.routes.get(group, ()))
+        if kinds and any(self.regions.get(kind) for kind in kinds):
+            rest = tuple(kind for kind in self.regions if kind not in kinds)
+            return [self._scan(kinds), self._scan(rest)] if rest else [self._scan(kinds)]
+        return [self._scan(())]
+
+    def first(self, group: str) -> Optional[Match]:
+        for scope in self.scopes(group):
+            match = scope.first(group)
+            if match:
+                return match
+        return None
+
+    def all(self, group: str) -> List[Match]:
+        for scope in self.scopes(group):
+            matches = scope.all(group)
+            if matches:
+                return matches
+        return []
+
+    def texts(self, group: str) -> List[str]:
+        return [scope.text for scope in self.scopes(group)]
+
+
+class FieldScanner:
+    """
+    Priority-ordered rule groups compiled once and shared across documents.
+    `scan(text)` makes a single trigger pass, after which groups are resolved on demand.
+    An optional RegexGuard (regex_guard.py) puts every rule evaluation under time budgets.
+    `routes` maps a group to the document regions it is searched in first (see RoutedScan).
+    `name` labels the scanner's rules in pattern statistics (pattern_stats.py).
+    """
+
+    def __init__(self, rules: Dict[str, List[ScanRule]], use_triggers: bool = True, linearize: bool = True,
+                 guard=None, routes: Optional[Dict[str, Sequence[str]]] = None, name: str = "field_scanner"):
+        self.rules = rules
+        self.name = name
+        self.use_triggers = use_triggers
+        self.linearize = linearize
+        self.guard = guard
+        self.routes = routes or {}
+        self.triggers = sorted({trigger for group in rules.values() for rule in group for trigger in rule.triggers})
+
+    def find_triggers(self, text: str) -> Optional[set]:
+        """Trigger literals present in the text; None disables trigger filtering"""
+        # Lowercasing only mirrors re.IGNORECASE exactly for ASCII text
+        if not self.use_triggers or not text.isascii():
+            return None
+        lowered = text.lower()
+        return {trigger for trigger in self.triggers if trigger in lowered}
+
+    def scan(self, text: str, regions: Optional[Dict[str, str]] = None):
+        """ScanResult over `text`, or a RoutedScan when region texts are given and groups are routed"""
+        if regions and self.routes:
+            return RoutedScan(self, text, regions)
+        return ScanResult(self, text)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from prescription_field_extractor import DEFAULT_SCANNER, FIELD_RULES, PrescriptionFieldExtractor
+
+    parser = argparse.ArgumentParser(description="Benchmark the compiled scanner against plain per-pattern searches")
+    parser.add_argument("--input", default="ocr_result.txt", help="OCR text to scale up")
+    parser.add_argument("--sizes", default="1,10,100", help="Comma-separated repeat counts of the input text")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        sample_text = f.read()
+
+    plain = PrescriptionFieldExtractor(FieldScanner(FIELD_RULES, use_triggers=False, linearize=False))
+    compiled = PrescriptionFieldExtractor(FieldScanner(FIELD_RULES, guard=DEFAULT_SCANNER.guard))
+    routed = PrescriptionFieldExtractor()
+
+    def best_time(extractor, text):
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            result = extractor.extract_all_fields(text)
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
+
+    print(f"{'chars':>10} {'plain ms':>12} {'scanner ms':>12} {'speedup':>9} {'routed ms':>12}  same")
+    for repeat in (int(size) for size in args.sizes.split(",")):
+        # Blank-line separated copies keep the markdown blocks the segmenter routes on
+        text = "\n\n".join([sample_text] * repeat)
+        plain_time, plain_result = best_time(plain, text)
+        compiled_time, compiled_result = best_time(compiled, text)
+        routed_time, _ = best_time(routed, text)
+        # medicine_name is built from a set, so compare it order-insensitively
+        same = all(sorted(str(plain_result[key]).split(", ")) == sorted(str(compiled_result[key]).split(", "))
+                   for key in plain_result)
+        print(f"{len(text):>10} {plain_time * 1000:>12.2f} {compiled_time * 1000:>12.2f} "
+              f"{plain_time / compiled_time:>8.1f}x {routed_time * 1000:>12.2f}  {same}")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Fuzzy Drug-Name Index
+SymSpell-style delete dictionary over the medication lexicon that corrects
+OCR-garbled drug names ("Belledenna" -> "Belladonna") within a bounded edit distance
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from medication_lexicon import DOSE_PATTERN, MedicationHit, MedicationLexicon, get_default_lexicon
+
+# Only alphabetic words this long are correction candidates; shorter ones are too ambiguous
+MIN_TOKEN_LENGTH = 5
+TOKEN_PATTERN = re.compile(r"[A-Za-z]{%d,}" % MIN_TOKEN_LENGTH)
+
+
+@dataclass(frozen=True)
+class FuzzyMatch:
+    name: str
+    distance: int
+
+
+def match_masks(pattern: str) -> Dict[str, int]:
+    """Per-character bitmasks of `pattern` for levenshtein()"""
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def levenshtein(pattern: str, text: str, masks: Optional[Dict[str, int]] = None) -> int:
+    """Levenshtein distance with Myers' bit-parallel algorithm: one pass over `text`, O(1) big-int ops per char"""
+    if not pattern:
+        return len(text)
+    masks = masks if masks is not None else match_masks(pattern)
+    full = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    positive, negative, score = full, 0, len(pattern)
+    for ch in text:
+        equal = masks.get(ch, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & full
+        negative = horizontal_positive & vertical
+    return score
+
+
+def allowed_distance(token: str, max_distance: int) -> int:
+    """One edit for 5-7 letter words, up to max_distance for longer ones"""
+    return min(max_distance, 1 if len(token) < 8 else 2)
+
+
+class FuzzyDrugIndex:
+    """
+    Every single-word lexicon name is stored under each string obtained by deleting up
+    to `max_distance` characters from its first `prefix_length` characters. A lookup
+    generates the same deletes for the token, so candidates come from a handful of
+    dict probes instead of a scan of the vocabulary; each is then verified with
+    bit-parallel Levenshtein. Ties go to the shorter length difference, then alphabetical.
+    OCR tokens repeat across documents, so up to `cache_size` answers are memoized.
+    """
+
+    def __init__(self, lexicon: MedicationLexicon, max_distance: int = 2, prefix_length: int = 7,
+                 cache_size: int = 10_000):
+        self.lexicon = lexicon
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[str, int], Optional[FuzzyMatch]] = {}
+        self.terms = [key for key in lexicon.keys if " " not in key and len(key) >= MIN_TOKEN_LENGTH]
+        self.deletes: Dict[str, List[str]] = {}
+        for term in self.terms:
+            for variant in self._variants(term[:prefix_length], max_distance):
+                self.deletes.setdefault(variant, []).append(term)
+
+    @staticmethod
+    def _variants(word: str, distance: int) -> Set[str]:
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+            variants |= frontier
+        return variants
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, token: str, max_distance: Optional[int] = None) -> Optional[FuzzyMatch]:
+        """Closest lexicon name within the allowed distance of `token`, or None"""
+        key = token.lower()
+        limit = allowed_distance(key, self.max_distance) if max_distance is None else max_distance
+        if key in self.lexicon.canonical:
+            return FuzzyMatch(self.lexicon.canonical[key], 0)
+        if (key, limit) in self._cache:
+            return self._cache[key, limit]
+        best = None
+        seen = set()
+        masks = match_masks(key)
+        for variant in self._variants(key[:self.prefix_length], limit):
+            for term in self.deletes.get(variant, ()):
+                if term in seen or abs(len(term) - len(key)) > limit:
+                    continue
+                seen.add(term)
+                distance = levenshtein(key, term, masks)
+                if distance <= limit:
+                    rank = (distance, abs(len(term) - len(key)), term)
+                    if best is None or rank < best:
+                        best = rank
+        result = FuzzyMatch(self.lexicon.canonical[best[2]], best[0]) if best else None
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key, limit] = result
+        return result
+
+    def brute_force_lookup(self, token: str, max_distance: Optional[int] = None) -> Optional[FuzzyMatch]:
+        """Same answer as lookup() by comparing against every term (reference and benchmark baseline)"""
+        key = token.lower()
+        limit = allowed_distance(key, self.max_distance) if max_distance is None else max_distance
+        masks = match_masks(key)
+        ranked = [(levenshtein(key, term, masks), abs(len(term) - len(key)), term) for term in self.terms]
+        best = min((rank for rank in ranked if rank[0] <= limit), default=None)
+        return FuzzyMatch(self.lexicon.canonical[best[2]], best[0]) if best else None
+
+    def correct_hits(self, text: str, hits: Iterable[MedicationHit]) -> List[MedicationHit]:
+        """
+        Add corrected names for words the exact lexicon pass missed. Only words followed
+        by a dose are candidates, so ordinary prose is never rewritten into drug names.
+        """
+        hits = list(hits)
+        taken = [(hit.start, hit.end) for hit in hits]
+        for token in TOKEN_PATTERN.finditer(text):
+            if (token.start() and text[token.start() - 1].isalnum()) or \
+                    (token.end() < len(text) and text[token.end()].isalnum()):
+                continue
+            if any(start < token.end() and token.start() < end for start, end in taken):
+                continue
+            dose = DOSE_PATTERN.match(text, token.end())
+            if not dose:
+                continue
+            match = self.lookup(token.group(0))
+            if match:
+                hits.append(MedicationHit(match.name, token.group(0), token.start(), token.end(),
+                                          " ".join(dose.group(1).split())))
+        return sorted(hits, key=lambda hit: hit.start)
+
+
+def create_fuzzy_drug_index(lexicon: Optional[MedicationLexicon] = None, max_distance: int = 2) -> FuzzyDrugIndex:
+    """Factory function; defaults to the shared medication lexicon"""
+    return FuzzyDrugIndex(lexicon or get_default_lexicon(), max_distance)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    from medication_lexicon import DEFAULT_LEXICON_PATH, load_lexicon
+
+    parser = argparse.ArgumentParser(description="Benchmark SymSpell lookups against brute-force Levenshtein")
+    parser.add_argument("--sizes", default="332,5000,20000", help="Comma-separated vocabulary sizes")
+    parser.add_argument("--tokens", type=int, default=500, help="Garbled tokens to look up per size")
+    args = parser.parse_args()
+
+    randomizer = random.Random(0)
+    bundled = load_lexicon(DEFAULT_LEXICON_PATH)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    syllables = ["ab", "ce", "di", "fo", "ga", "lo", "mi", "ne", "pra", "ro", "sta", "tin", "vo", "xa", "zol"]
+
+    def garble(word: str) -> str:
+        for _ in range(randomizer.randint(1, 2)):
+            position = randomizer.randrange(len(word))
+            operation = randomizer.choice(["substitute", "delete", "insert"])
+            if operation == "substitute":
+                word = word[:position] + randomizer.choice(letters) + word[position + 1:]
+            elif operation == "delete" and len(word) > MIN_TOKEN_LENGTH:
+                word = word[:position] + word[position + 1:]
+            else:
+                word = word[:position] + randomizer.choice(letters) + word[position:]
+        return word
+
+    sample = FuzzyDrugIndex(MedicationLexicon(bundled))
+    for token in ("Belledenna", "Amphogell", "Amoxicilin", "Paracetamoll", "Sertralin"):
+        print(f"{token:<14} -> {sample.lookup(token)}")
+    print()
+
+    print(f"{'names':>8} {'build ms':>10} {'symspell us':>12} {'cached us':>10} {'brute us':>10} {'speedup':>9} "
+          f"{'agree':>7}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        names = set(bundled)
+        while len(names) < size:
+            names.add("".join(randomizer.choice(syllables) for _ in range(randomizer.randint(3, 5))).capitalize())
+        lexicon = MedicationLexicon(names)
+        started = time.perf_counter()
+        index = FuzzyDrugIndex(lexicon)
+        build_time = time.perf_counter() - started
+        tokens = [garble(randomizer.choice(index.terms)) for _ in range(args.tokens)]
+
+        started = time.perf_counter()
+        fast = [index.lookup(token) for token in tokens]
+        fast_time = (time.perf_counter() - started) / len(tokens)
+        started = time.perf_counter()
+        for token in tokens:
+            index.lookup(token)
+        cached_time = (time.perf_counter() - started) / len(tokens)
+        brute_tokens = tokens[:max(20, args.tokens // max(1, size // 1000))]
+        started = time.perf_counter()
+        brute = [index.brute_force_lookup(token) for token in brute_tokens]
+        brute_time = (time.perf_counter() - started) / len(brute_tokens)
+        agree = sum(a == b for a, b in zip(fast, brute)) / len(brute_tokens)
+        print(f"{size:>8} {build_time * 1000:>10.1f} {fast_time * 1e6:>12.1f} {cached_time * 1e6:>10.2f} "
+              f"{brute_time * 1e6:>10.1f} "
+              f"{brute_time / fast_time:>8.0f}x {agree:>7.0%}")
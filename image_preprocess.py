@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Image Pre-Upload Optimization
+Caps resolution, converts to grayscale and re-encodes scans before they are
+base64'd and sent to Mistral OCR
+"""
+
+import argparse
+import difflib
+import io
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Check if optional dependencies are available
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("Pillow not available. Install with: pip install pillow")
+
+
+class ImagePreprocessor:
+    """Downscale / grayscale / recompress images, never returning something bigger than the input"""
+
+    def __init__(self, max_side: int = 2000, grayscale: bool = True, quality: int = 80):
+        self.max_side = max_side
+        self.grayscale = grayscale
+        self.quality = quality
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.images = 0
+
+    def process(self, image_bytes: bytes, mime_type: str = "image/jpeg") -> Tuple[bytes, str, Dict[str, Any]]:
+        """Return (optimized bytes, mime type, stats) for one image"""
+        stats = {"original_bytes": len(image_bytes), "optimized_bytes": len(image_bytes), "bytes_saved": 0, "optimized": False}
+        optimized, optimized_mime = image_bytes, mime_type
+
+        if PIL_AVAILABLE:
+            try:
+                with Image.open(io.BytesIO(image_bytes)) as image:
+                    image = ImageOps.exif_transpose(image)
+                    stats["original_size"] = image.size
+                    if self.max_side and max(image.size) > self.max_side:
+                        image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+                    image = image.convert("L" if self.grayscale else "RGB")
+                    stats["optimized_size"] = image.size
+
+                    buffer = io.BytesIO()
+                    image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+                    candidate = buffer.getvalue()
+
+                # Small or already well-compressed scans can come out larger; keep the original then
+                if len(candidate) < len(image_bytes):
+                    optimized, optimized_mime = candidate, "image/jpeg"
+                    stats["optimized"] = True
+            except Exception as e:
+                print(f"Image preprocessing error: {e}")
+
+        stats["optimized_bytes"] = len(optimized)
+        stats["bytes_saved"] = len(image_bytes) - len(optimized)
+        self.images += 1
+        self.bytes_in += len(image_bytes)
+        self.bytes_out += len(optimized)
+        return optimized, optimized_mime, stats
+
+    def summary(self) -> Dict[str, Any]:
+        saved = self.bytes_in - self.bytes_out
+        return {
+            "images": self.images,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": saved,
+            "percent_saved": (saved / self.bytes_in) * 100 if self.bytes_in else 0.0
+        }
+
+
+def create_image_preprocessor(max_side: Optional[int] = None, grayscale: Optional[bool] = None,
+                              quality: Optional[int] = None) -> ImagePreprocessor:
+    """Factory function reading defaults from OCR_IMAGE_MAX_SIDE / OCR_IMAGE_GRAYSCALE / OCR_IMAGE_QUALITY"""
+    if max_side is None:
+        max_side = int(os.getenv("OCR_IMAGE_MAX_SIDE", "2000"))
+    if grayscale is None:
+        grayscale = os.getenv("OCR_IMAGE_GRAYSCALE", "1") not in ("0", "false", "False")
+    if quality is None:
+        quality = int(os.getenv("OCR_IMAGE_QUALITY", "80"))
+    return ImagePreprocessor(max_side=max_side, grayscale=grayscale, quality=quality)
+
+
+def text_similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def benchmark_corpus(directory: str, preprocessor: ImagePreprocessor, executor=None) -> Dict[str, Any]:
+    """
+    Report bytes saved over a directory of scans. With an OCR executor, also OCR the
+    original and optimized versions and report how similar the extracted text stays.
+    """
+    from batch_ocr import collect_inputs
+    from ocr_executor import encode_image_document, join_pages
+
+    paths = [path for path in collect_inputs([directory]) if not path.lower().endswith(".pdf")]
+    per_image: List[Dict[str, Any]] = []
+    similarities = []
+    started = time.perf_counter()
+
+    for path in paths:
+        with open(path, "rb") as f:
+            original = f.read()
+        mime_type = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+        optimized, optimized_mime, stats = preprocessor.process(original, mime_type)
+        stats["path"] = path
+
+        if executor is not None:
+            before = executor.submit(encode_image_document(original, mime_type))
+            after = executor.submit(encode_image_document(optimized, optimized_mime))
+            stats["text_similarity"] = text_similarity(join_pages(before.result()), join_pages(after.result()))
+            similarities.append(stats["text_similarity"])
+
+        per_image.append(stats)
+
+    report = preprocessor.summary()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["largest_savings"] = sorted(per_image, key=lambda s: s["bytes_saved"], reverse=True)[:5]
+    if similarities:
+        report["text_similarity_mean"] = statistics.mean(similarities)
+        report["text_similarity_min"] = min(similarities)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure bytes saved (and OCR text stability) from image preprocessing")
+    parser.add_argument("directory", nargs="?", default="data")
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--quality", type=int, default=None)
+    parser.add_argument("--color", action="store_true", help="Keep colour instead of converting to grayscale")
+    parser.add_argument("--ocr", action="store_true", help="Also OCR original vs optimized images (needs MISTRAL_API_KEY)")
+    args = parser.parse_args()
+
+    preprocessor = create_image_preprocessor(args.max_side, False if args.color else None, args.quality)
+    executor = None
+    if args.ocr:
+        from mistral_client import create_mistral_client
+        from ocr_executor import create_ocr_executor
+        executor = create_ocr_executor(create_mistral_client(os.getenv("MISTRAL_API_KEY")))
+
+    report = benchmark_corpus(args.directory, preprocessor, executor)
+    print("=" * 80)
+    print("IMAGE PREPROCESSING BENCHMARK")
+    print("=" * 80)
+    print(f"Images: {report['images']}  in: {report['bytes_in']:,} B  out: {report['bytes_out']:,} B  "
+          f"saved: {report['bytes_saved']:,} B ({report['percent_saved']:.1f}%)  in {report['seconds']}s")
+    if "text_similarity_mean" in report:
+        print(f"OCR text similarity: mean {report['text_similarity_mean']:.3f}, min {report['text_similarity_min']:.3f}")
+    for stats in report["largest_savings"]:
+        print(f"  {stats['path']}: {stats['original_bytes']:,} -> {stats['optimized_bytes']:,} B")
@@ -2,8 +2,10 @@ import streamlit as st
 import os
 import base64
 import json
-import time
-from mistralai import Mistral
+from mistral_client import create_mistral_client
+from ocr_executor import collect_page_results, create_ocr_executor, encode_image_document, encode_pdf_document, iter_page_results, join_pages
+from image_preprocess import ImagePreprocessor
+from pdf_splitter import submit_pdf_units
 
 st.set_page_config(layout="wide", page_title="Mistral OCR App", page_icon="🖥️")
 st.title("Mistral OCR App")
@@ -36,6 +38,18 @@ if source_type == "URL":
 else:
     uploaded_files = st.file_uploader("Upload one or more files", type=["pdf", "jpg", "jpeg", "png"], accept_multiple_files=True)
 
+# OCR throughput settings
+st.sidebar.header("⚙️ OCR Settings")
+max_workers = st.sidebar.number_input("Concurrent requests", min_value=1, max_value=32, value=4)
+requests_per_second = st.sidebar.number_input("Requests per second", min_value=0.1, max_value=50.0, value=1.0, step=0.5)
+optimize_images = st.sidebar.checkbox("Optimize images before upload", value=True,
+                                      help="Downscale, grayscale and recompress images to cut upload size")
+image_max_side = st.sidebar.number_input("Max image side (px)", min_value=500, max_value=8000, value=2000, step=100)
+image_quality = st.sidebar.slider("JPEG quality", min_value=30, max_value=95, value=80)
+pdf_pages_per_chunk = st.sidebar.number_input("PDF pages per request", min_value=1, max_value=500, value=8,
+                                              help="Large PDFs are split into page ranges that are OCRed in parallel")
+pdf_chunk_mb = st.sidebar.number_input("Max PDF chunk size (MB, 0 = no limit)", min_value=0.0, max_value=50.0, value=0.0, step=0.5)
+
 # 4. Process Button & OCR Handling
 if st.button("Process"):
     if source_type == "URL" and not input_url.strip():
@@ -43,23 +57,27 @@ if st.button("Process"):
     elif source_type == "Local Upload" and not uploaded_files:
         st.error("Please upload at least one file.")
     else:
-        client = Mistral(api_key=api_key)
+        client = create_mistral_client(api_key)
         st.session_state["ocr_result"] = []
         st.session_state["preview_src"] = []
         st.session_state["image_bytes"] = []
         
         sources = input_url.split("\n") if source_type == "URL" else uploaded_files
+        documents = []
+        local_pdfs = []
+        preprocessor = ImagePreprocessor(max_side=image_max_side, quality=image_quality) if optimize_images else None
         
         for idx, source in enumerate(sources):
+            pdf_bytes = None
             if file_type == "PDF":
                 if source_type == "URL":
                     document = {"type": "document_url", "document_url": source.strip()}
                     preview_src = source.strip()
                 else:
                     file_bytes = source.read()
-                    encoded_pdf = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
-                    preview_src = f"data:application/pdf;base64,{encoded_pdf}"
+                    document = encode_pdf_document(file_bytes)
+                    pdf_bytes = file_bytes
+                    preview_src = document["document_url"]
             else:
                 if source_type == "URL":
                     document = {"type": "image_url", "image_url": source.strip()}
@@ -67,23 +85,54 @@ if st.button("Process"):
                 else:
                     file_bytes = source.read()
                     mime_type = source.type
-                    encoded_image = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "image_url", "image_url": f"data:{mime_type};base64,{encoded_image}"}
-                    preview_src = f"data:{mime_type};base64,{encoded_image}"
                     st.session_state["image_bytes"].append(file_bytes)
+                    preview_src = f"data:{mime_type};base64,{base64.b64encode(file_bytes).decode('utf-8')}"
+                    if preprocessor is not None:
+                        file_bytes, mime_type, _ = preprocessor.process(file_bytes, mime_type)
+                    document = encode_image_document(file_bytes, mime_type)
             
-            with st.spinner(f"Processing {source if source_type == 'URL' else source.name}..."):
-                try:
-                    ocr_response = client.ocr.process(model="mistral-ocr-latest", document=document, include_image_base64=True)
-                    time.sleep(1)  # wait 1 second between request to prevent rate limit exceeding
-                    
-                    pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                    result_text = "\n\n".join(page.markdown for page in pages) or "No result found."
-                except Exception as e:
-                    result_text = f"Error extracting result: {e}"
+            documents.append(document)
+            local_pdfs.append(pdf_bytes)
+            st.session_state["preview_src"].append(preview_src)
+        
+        if preprocessor is not None and preprocessor.images:
+            summary = preprocessor.summary()
+            st.caption(f"🗜️ Image optimization saved {summary['bytes_saved'] / 1024:.0f} KB ({summary['percent_saved']:.1f}%) across {summary['images']} image(s)")
+        
+        with st.spinner(f"Processing {len(documents)} file(s)..."):
+            # Requests run concurrently; the executor's token bucket keeps us under the rate limit
+            with create_ocr_executor(client, max_workers=max_workers, requests_per_second=requests_per_second) as executor:
+                max_chunk_bytes = int(pdf_chunk_mb * 1024 * 1024) or None
+                # Local PDFs are split into page ranges and OCRed in parallel
+                units = []
+                for doc_index, (document, pdf_bytes) in enumerate(zip(documents, local_pdfs)):
+                    if pdf_bytes:
+                        units.extend(submit_pdf_units(executor, pdf_bytes, doc_index, pdf_pages_per_chunk, max_chunk_bytes))
+                    else:
+                        units.append((doc_index, 0, executor.submit(document)))
+                
+                # Render each page as soon as it arrives instead of waiting for the whole batch
+                live_area = st.empty()
+                live = live_area.container()
+                live_docs = [live.expander(f"OCR progress {idx+1}", expanded=True) for idx in range(len(documents))]
+                page_results = []
+                for page in iter_page_results(units, ordered=True):
+                    page_results.append(page)
+                    if page.error is not None:
+                        live_docs[page.document_index].error(page.error)
+                    else:
+                        live_docs[page.document_index].markdown(page.markdown)
+                live_area.empty()
                 
-                st.session_state["ocr_result"].append(result_text)
-                st.session_state["preview_src"].append(preview_src)
+                collected = collect_page_results(page_results)
+                for doc_index in range(len(documents)):
+                    document_pages = collected.get(doc_index, {"pages": [], "errors": []})
+                    if document_pages["errors"]:
+                        result_text = f"Error extracting result: {document_pages['errors'][0]}"
+                    else:
+                        result_text = join_pages(document_pages["pages"])
+                    
+                    st.session_state["ocr_result"].append(result_text)
 
 # 5. Display Preview and OCR Results if available
 if st.session_state["ocr_result"]:
@@ -3,7 +3,13 @@ import os
 import base64
 import json
 import time
-from mistralai import Mistral
+from mistral_client import create_mistral_client
+from ocr_executor import create_ocr_executor, encode_image_document, encode_pdf_document, join_pages
+from image_preprocess import ImagePreprocessor
+from pdf_splitter import submit_pdf
+from batch_completion import BatchCompletion
+from date_normalizer import normalize_dates
+from result_cache import create_llm_cache
 
 # Import the advanced extractor
 try:
@@ -37,17 +43,48 @@ if "preview_src" not in st.session_state:
     st.session_state["preview_src"] = []
 if "image_bytes" not in st.session_state:
     st.session_state["image_bytes"] = []
+if "batch_completion" not in st.session_state:
+    st.session_state["batch_completion"] = BatchCompletion()
 
 # Extraction method selection
 st.sidebar.header("🔧 Extraction Settings")
 use_advanced = st.sidebar.checkbox("Use Advanced Multi-Method Extraction", value=True, 
                                  help="Combines multiple AI techniques for better accuracy")
+use_cascade = st.sidebar.checkbox("Cascade: LLM only for missing required fields", value=False,
+                                  help="Runs regex/NLP first and sends Mistral a reduced prompt, or skips it "
+                                       "when every required field was found")
+use_batch_prompts = st.sidebar.checkbox("Batch LLM prompts across files", value=False,
+                                        help="Waits for OCR of every file, then sends several files per Mistral "
+                                             "request to share the instruction overhead")
+use_streaming = st.sidebar.checkbox("Stream LLM fields as they arrive", value=False,
+                                    help="Shows each Mistral field the moment it is generated and stops the "
+                                         "response once every requested field is in")
+use_llm_cache = st.sidebar.checkbox("Reuse cached LLM responses", value=True,
+                                    help="Identical extraction prompts are answered from a local SQLite cache")
+
+@st.cache_resource
+def get_llm_cache():
+    # One cache per server process, shared across reruns and sessions
+    return create_llm_cache()
+
+llm_cache = get_llm_cache() if use_llm_cache else None
 
 if use_advanced:
     st.sidebar.info("📊 Active Methods:\n- Mistral Structured Prompting\n- Enhanced Regex Patterns\n" + 
                    ("- LangChain with OpenAI\n" if openai_api_key else "") +
                    ("- SpaCy NLP Analysis\n" if False else ""))  # SpaCy temporarily disabled
 
+st.sidebar.header("⚙️ OCR Settings")
+max_workers = st.sidebar.number_input("Concurrent requests", min_value=1, max_value=32, value=4)
+requests_per_second = st.sidebar.number_input("Requests per second", min_value=0.1, max_value=50.0, value=1.0, step=0.5)
+optimize_images = st.sidebar.checkbox("Optimize images before upload", value=True,
+                                      help="Downscale, grayscale and recompress images to cut upload size")
+image_max_side = st.sidebar.number_input("Max image side (px)", min_value=500, max_value=8000, value=2000, step=100)
+image_quality = st.sidebar.slider("JPEG quality", min_value=30, max_value=95, value=80)
+pdf_pages_per_chunk = st.sidebar.number_input("PDF pages per request", min_value=1, max_value=500, value=8,
+                                              help="Large PDFs are split into page ranges that are OCRed in parallel")
+pdf_chunk_mb = st.sidebar.number_input("Max PDF chunk size (MB, 0 = no limit)", min_value=0.0, max_value=50.0, value=0.0, step=0.5)
+
 # File type and source selection
 col1, col2 = st.columns(2)
 with col1:
@@ -70,12 +107,13 @@ if st.button("🚀 Process with Advanced Extraction"):
     elif source_type == "Local Upload" and not uploaded_files:
         st.error("Please upload at least one file.")
     else:
-        client = Mistral(api_key=mistral_api_key)
+        client = create_mistral_client(mistral_api_key)
         
         # Initialize advanced extractor if available
         if use_advanced and ADVANCED_EXTRACTOR_AVAILABLE:
             try:
-                advanced_extractor = create_advanced_extractor(mistral_api_key, openai_api_key)
+                advanced_extractor = create_advanced_extractor(mistral_api_key, openai_api_key, cascade=use_cascade,
+                                                               response_cache=llm_cache, streaming=use_streaming)
                 st.success("✅ Advanced multi-method extractor initialized!")
             except Exception as e:
                 st.warning(f"⚠️ Advanced extractor initialization failed: {e}. Using basic extraction.")
@@ -88,17 +126,20 @@ if st.button("🚀 Process with Advanced Extraction"):
         st.session_state["structured_data"] = []
         st.session_state["preview_src"] = []
         st.session_state["image_bytes"] = []
+        batch_completion = BatchCompletion()
+        st.session_state["batch_completion"] = batch_completion
         
         sources = input_url.split("\n") if source_type == "URL" else uploaded_files
+        documents = []
+        local_pdfs = []
+        preprocessor = ImagePreprocessor(max_side=image_max_side, quality=image_quality) if optimize_images else None
         
         # Progress tracking
         progress_bar = st.progress(0)
         status_text = st.empty()
         
         for idx, source in enumerate(sources):
-            status_text.text(f"Processing file {idx + 1} of {len(sources)}...")
-            progress_bar.progress((idx) / len(sources))
-            
+            pdf_bytes = None
             # Prepare document for OCR
             if file_type == "PDF":
                 if source_type == "URL":
@@ -106,9 +147,9 @@ if st.button("🚀 Process with Advanced Extraction"):
                     preview_src = source.strip()
                 else:
                     file_bytes = source.read()
-                    encoded_pdf = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
-                    preview_src = f"data:application/pdf;base64,{encoded_pdf}"
+                    document = encode_pdf_document(file_bytes)
+                    pdf_bytes = file_bytes
+                    preview_src = document["document_url"]
             else:
                 if source_type == "URL":
                     document = {"type": "image_url", "image_url": source.strip()}
@@ -116,69 +157,101 @@ if st.button("🚀 Process with Advanced Extraction"):
                 else:
                     file_bytes = source.read()
                     mime_type = source.type
-                    encoded_image = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "image_url", "image_url": f"data:{mime_type};base64,{encoded_image}"}
-                    preview_src = f"data:{mime_type};base64,{encoded_image}"
                     st.session_state["image_bytes"].append(file_bytes)
+                    preview_src = f"data:{mime_type};base64,{base64.b64encode(file_bytes).decode('utf-8')}"
+                    if preprocessor is not None:
+                        file_bytes, mime_type, _ = preprocessor.process(file_bytes, mime_type)
+                    document = encode_image_document(file_bytes, mime_type)
             
-            try:
-                # OCR Processing
-                status_text.text(f"Extracting text from file {idx + 1}...")
-                ocr_response = client.ocr.process(model="mistral-ocr-latest", document=document, include_image_base64=True)
-                time.sleep(1)  # Rate limiting
-                
-                pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                raw_text = "\n\n".join(page.markdown for page in pages) or "No result found."
+            documents.append(document)
+            local_pdfs.append(pdf_bytes)
+            st.session_state["preview_src"].append(preview_src)
+        
+        if preprocessor is not None and preprocessor.images:
+            summary = preprocessor.summary()
+            st.caption(f"🗜️ Image optimization saved {summary['bytes_saved'] / 1024:.0f} KB ({summary['percent_saved']:.1f}%) across {summary['images']} image(s)")
+        
+        # OCR Processing (concurrent, rate limited by the shared executor)
+        status_text.text(f"Extracting text from {len(documents)} file(s)...")
+        with create_ocr_executor(client, max_workers=max_workers, requests_per_second=requests_per_second) as executor:
+            max_chunk_bytes = int(pdf_chunk_mb * 1024 * 1024) or None
+            # Local PDFs are split into page ranges and OCRed in parallel, then stitched back in page order
+            futures = [
+                submit_pdf(executor, pdf_bytes, pdf_pages_per_chunk, max_chunk_bytes) if pdf_bytes
+                else executor.submit(document)
+                for document, pdf_bytes in zip(documents, local_pdfs)
+            ]
+            
+            # Batched prompts need every file's text first; OCR failures are reported in the loop below
+            batched_results = {}
+            if advanced_extractor and use_batch_prompts and len(futures) > 1:
+                status_text.text(f"Running batched advanced extraction on {len(futures)} files...")
+                ocr_texts = {}
+                for idx, future in enumerate(futures):
+                    try:
+                        ocr_texts[idx] = join_pages(future.result())
+                    except Exception:
+                        pass
+                batched_results = dict(zip(ocr_texts, advanced_extractor.extract_batch_with_reports(
+                    list(ocr_texts.values()))))
+            
+            for idx, future in enumerate(futures):
+                status_text.text(f"Processing file {idx + 1} of {len(documents)}...")
+                progress_bar.progress((idx) / len(documents))
                 
-                # Advanced Field Extraction
-                if advanced_extractor:
-                    status_text.text(f"Running advanced extraction on file {idx + 1}...")
-                    prescription_fields = advanced_extractor.extract_all_fields(raw_text)
+                try:
+                    raw_text = join_pages(future.result())
                     
-                    # Calculate completion metrics
-                    total_fields = len(prescription_fields)
-                    completed_fields = len([v for v in prescription_fields.values() if v and str(v).strip()])
-                    required_fields = [
-                        'patient_name', 'patient_age', 'patient_sex', 'prescription_date',
-                        'doctor_name', 'doctor_title', 'medicine_name', 'medicine_dose',
-                        'medicine_duration', 'instructions'
-                    ]
-                    required_completed = len([f for f in required_fields if prescription_fields.get(f)])
-                    
-                    structured_result = {
-                        "prescription_data": prescription_fields,
-                        "completion_status": {
-                            "total_fields": total_fields,
-                            "completed_fields": completed_fields,
-                            "required_fields": len(required_fields),
-                            "required_completed": required_completed,
-                            "completion_percentage": (completed_fields / total_fields) * 100,
-                            "required_completion_percentage": (required_completed / len(required_fields)) * 100
-                        },
-                        "extraction_method": "Advanced Multi-Method",
-                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                else:
-                    # Basic extraction fallback
+                    # Advanced Field Extraction
+                    if advanced_extractor:
+                        if idx in batched_results:
+                            prescription_fields, extraction_report = batched_results[idx]
+                        else:
+                            status_text.text(f"Running advanced extraction on file {idx + 1}...")
+                            live_fields = st.empty()
+                            streamed = {}
+                            
+                            def show_field(name, value):
+                                streamed[name] = value
+                                live_fields.markdown(f"**File {idx + 1}, streaming from Mistral:**\n\n" + "\n".join(
+                                    f"- **{field}:** `{field_value}`" for field, field_value in streamed.items()))
+                            
+                            prescription_fields, extraction_report = advanced_extractor.extract_with_report(
+                                raw_text, on_field=show_field if use_streaming else None)
+                            live_fields.empty()
+                        
+                        # Completion metrics come from the batch's field coverage matrix
+                        batch_completion.append(prescription_fields)
+                        
+                        structured_result = {
+                            "prescription_data": prescription_fields,
+                            "completion_status": batch_completion.record_status(len(batch_completion) - 1),
+                            "dates": normalize_dates(prescription_fields),
+                            "extraction_method": ("Advanced Cascade" if use_cascade else "Advanced Multi-Method")
+                                                 + (" (batched)" if idx in batched_results else ""),
+                            "extraction_report": extraction_report,
+                            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                        }
+                    else:
+                        # Basic extraction fallback
+                        structured_result = {
+                            "prescription_data": {"raw_text": raw_text},
+                            "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
+                            "extraction_method": "Basic OCR Only",
+                            "error": "Advanced extraction not available"
+                        }
+                
+                except Exception as e:
+                    raw_text = f"Error extracting result: {e}"
                     structured_result = {
-                        "prescription_data": {"raw_text": raw_text},
+                        "prescription_data": {},
                         "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
-                        "extraction_method": "Basic OCR Only",
-                        "error": "Advanced extraction not available"
+                        "extraction_method": "Error",
+                        "error": str(e)
                     }
                 
-            except Exception as e:
-                raw_text = f"Error extracting result: {e}"
-                structured_result = {
-                    "prescription_data": {},
-                    "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
-                    "extraction_method": "Error",
-                    "error": str(e)
-                }
-            
-            st.session_state["ocr_result"].append(raw_text)
-            st.session_state["structured_data"].append(structured_result)
-            st.session_state["preview_src"].append(preview_src)
+                st.session_state["ocr_result"].append(raw_text)
+                st.session_state["structured_data"].append(structured_result)
         
         progress_bar.progress(1.0)
         status_text.text("✅ Processing complete!")
@@ -186,6 +259,19 @@ if st.button("🚀 Process with Advanced Extraction"):
         status_text.empty()
         progress_bar.empty()
 
+# Corpus-wide field coverage for multi-file runs
+if len(st.session_state["batch_completion"]) > 1:
+    summary = st.session_state["batch_completion"].summary()
+    st.markdown("---")
+    st.markdown(f"### 📊 Batch Field Coverage ({summary['records']} files)")
+    col_b1, col_b2, col_b3 = st.columns(3)
+    col_b1.metric("Mean Overall", f"{summary['mean_completion_percentage']:.1f}%")
+    col_b2.metric("Mean Required", f"{summary['mean_required_completion_percentage']:.1f}%")
+    col_b3.metric("All Required Found", f"{summary['all_required_completed']}/{summary['records']}")
+    with st.expander("Per-field hit rates"):
+        st.dataframe([{"field": field, "hit rate": f"{rate:.0%}"} for field, rate in summary["field_hit_rates"].items()],
+                     use_container_width=True)
+
 # Display Results
 if st.session_state["ocr_result"]:
     for idx, (result, structured_data) in enumerate(zip(st.session_state["ocr_result"], st.session_state["structured_data"])):
@@ -198,6 +284,17 @@ if st.session_state["ocr_result"]:
             st.markdown(f"### 📋 File {idx+1} Results")
             method = structured_data.get("extraction_method", "Unknown")
             st.caption(f"Method: {method}")
+            report = structured_data.get("extraction_report")
+            if report:
+                llm_usage = "LLM skipped" if report["llm_skipped"] else \
+                    f"{report['prompt_tokens']} prompt tokens, {report['llm_seconds']:.2f}s LLM"
+                if report.get("batch_size", 1) > 1:
+                    llm_usage += f", shared by {report['batch_size']} files"
+                if report.get("first_field_seconds") is not None:
+                    llm_usage += f", first field after {report['first_field_seconds']:.2f}s"
+                if report.get("cache_hits"):
+                    llm_usage += f", {report['cache_hits']} cached ({report['cache_saved_seconds']:.2f}s saved)"
+                st.caption(f"{llm_usage} · {report['seconds']:.2f}s total")
         
         with col_header2:
             if "completion_status" in structured_data:
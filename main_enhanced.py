@@ -3,8 +3,13 @@ import os
 import base64
 import json
 import time
-from mistralai import Mistral
+from mistral_client import create_mistral_client
 from prescription_field_extractor import PrescriptionFieldExtractor, process_prescription_image
+from ocr_executor import create_ocr_executor, encode_image_document, encode_pdf_document, join_pages
+from image_preprocess import ImagePreprocessor
+from pdf_splitter import submit_pdf
+from result_cache import create_ocr_cache
+from fuzzy_drug_index import create_fuzzy_drug_index
 
 st.set_page_config(layout="wide", page_title="Mistral OCR App - Enhanced", page_icon="🏥")
 st.title("🏥 Mistral OCR App - Enhanced Field Extraction")
@@ -40,6 +45,33 @@ if source_type == "URL":
 else:
     uploaded_files = st.file_uploader("Upload one or more files", type=["pdf", "jpg", "jpeg", "png"], accept_multiple_files=True)
 
+# OCR throughput settings
+st.sidebar.header("⚙️ OCR Settings")
+max_workers = st.sidebar.number_input("Concurrent requests", min_value=1, max_value=32, value=4)
+requests_per_second = st.sidebar.number_input("Requests per second", min_value=0.1, max_value=50.0, value=1.0, step=0.5)
+optimize_images = st.sidebar.checkbox("Optimize images before upload", value=True,
+                                      help="Downscale, grayscale and recompress images to cut upload size")
+image_max_side = st.sidebar.number_input("Max image side (px)", min_value=500, max_value=8000, value=2000, step=100)
+image_quality = st.sidebar.slider("JPEG quality", min_value=30, max_value=95, value=80)
+pdf_pages_per_chunk = st.sidebar.number_input("PDF pages per request", min_value=1, max_value=500, value=8,
+                                              help="Large PDFs are split into page ranges that are OCRed in parallel")
+pdf_chunk_mb = st.sidebar.number_input("Max PDF chunk size (MB, 0 = no limit)", min_value=0.0, max_value=50.0, value=0.0, step=0.5)
+use_ocr_cache = st.sidebar.checkbox("Reuse cached OCR results", value=True,
+                                    help="Skip the OCR call for files that were already processed")
+correct_medications = st.sidebar.checkbox("Correct garbled medication names", value=True,
+                                          help="Match OCR misspellings (e.g. 'Belledenna') to known drug names")
+
+@st.cache_resource
+def get_ocr_cache():
+    # One cache per server process, shared across reruns and sessions
+    return create_ocr_cache()
+
+ocr_cache = get_ocr_cache() if use_ocr_cache else None
+
+@st.cache_resource
+def get_fuzzy_drug_index():
+    return create_fuzzy_drug_index()
+
 # 4. Process Button & OCR Handling
 if st.button("🔍 Process & Extract Fields"):
     if source_type == "URL" and not input_url.strip():
@@ -47,8 +79,8 @@ if st.button("🔍 Process & Extract Fields"):
     elif source_type == "Local Upload" and not uploaded_files:
         st.error("Please upload at least one file.")
     else:
-        client = Mistral(api_key=api_key)
-        extractor = PrescriptionFieldExtractor()
+        client = create_mistral_client(api_key)
+        extractor = PrescriptionFieldExtractor(fuzzy_index=get_fuzzy_drug_index() if correct_medications else None)
         
         # Clear previous results
         st.session_state["ocr_result"] = []
@@ -57,61 +89,86 @@ if st.button("🔍 Process & Extract Fields"):
         st.session_state["image_bytes"] = []
         
         sources = input_url.split("\n") if source_type == "URL" else uploaded_files
+        documents = []
+        local_pdfs = []
+        contents = []
+        preprocessor = ImagePreprocessor(max_side=image_max_side, quality=image_quality) if optimize_images else None
         
         # Progress bar
         progress_bar = st.progress(0)
         status_text = st.empty()
         
         for idx, source in enumerate(sources):
-            status_text.text(f"Processing file {idx + 1} of {len(sources)}...")
-            progress_bar.progress((idx) / len(sources))
-            
+            pdf_bytes = None
             if file_type == "PDF":
                 if source_type == "URL":
                     document = {"type": "document_url", "document_url": source.strip()}
                     preview_src = source.strip()
+                    file_bytes = None
                 else:
                     file_bytes = source.read()
-                    encoded_pdf = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
-                    preview_src = f"data:application/pdf;base64,{encoded_pdf}"
+                    document = encode_pdf_document(file_bytes)
+                    pdf_bytes = file_bytes
+                    preview_src = document["document_url"]
             else:
                 if source_type == "URL":
                     document = {"type": "image_url", "image_url": source.strip()}
                     preview_src = source.strip()
+                    file_bytes = None
                 else:
                     file_bytes = source.read()
                     mime_type = source.type
-                    encoded_image = base64.b64encode(file_bytes).decode("utf-8")
-                    document = {"type": "image_url", "image_url": f"data:{mime_type};base64,{encoded_image}"}
-                    preview_src = f"data:{mime_type};base64,{encoded_image}"
                     st.session_state["image_bytes"].append(file_bytes)
+                    preview_src = f"data:{mime_type};base64,{base64.b64encode(file_bytes).decode('utf-8')}"
+                    if preprocessor is not None:
+                        file_bytes, mime_type, _ = preprocessor.process(file_bytes, mime_type)
+                    document = encode_image_document(file_bytes, mime_type)
             
-            try:
-                # OCR Processing
-                ocr_response = client.ocr.process(model="mistral-ocr-latest", document=document, include_image_base64=True)
-                time.sleep(1)  # Rate limiting
-                
-                pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
-                raw_text = "\n\n".join(page.markdown for page in pages) or "No result found."
+            documents.append(document)
+            local_pdfs.append(pdf_bytes)
+            contents.append(file_bytes)
+            st.session_state["preview_src"].append(preview_src)
+        
+        if preprocessor is not None and preprocessor.images:
+            summary = preprocessor.summary()
+            st.caption(f"🗜️ Image optimization saved {summary['bytes_saved'] / 1024:.0f} KB ({summary['percent_saved']:.1f}%) across {summary['images']} image(s)")
+        
+        # OCR Processing (concurrent, rate limited by the shared executor)
+        with create_ocr_executor(client, max_workers=max_workers, requests_per_second=requests_per_second,
+                                 cache=ocr_cache) as executor:
+            max_chunk_bytes = int(pdf_chunk_mb * 1024 * 1024) or None
+            futures = [
+                submit_pdf(executor, pdf_bytes, pdf_pages_per_chunk, max_chunk_bytes) if pdf_bytes
+                else executor.submit(document, content)
+                for document, content, pdf_bytes in zip(documents, contents, local_pdfs)
+            ]
+            
+            for idx, future in enumerate(futures):
+                status_text.text(f"Processing file {idx + 1} of {len(documents)}...")
+                progress_bar.progress((idx) / len(documents))
                 
-                # Enhanced Field Extraction
-                structured_result = process_prescription_image(raw_text)
+                try:
+                    raw_text = join_pages(future.result())
+                    
+                    # Enhanced Field Extraction
+                    structured_result = process_prescription_image(raw_text, extractor)
+                    
+                except Exception as e:
+                    raw_text = f"Error extracting result: {e}"
+                    structured_result = {
+                        "prescription_data": {},
+                        "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
+                        "error": str(e)
+                    }
                 
-            except Exception as e:
-                raw_text = f"Error extracting result: {e}"
-                structured_result = {
-                    "prescription_data": {},
-                    "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
-                    "error": str(e)
-                }
-            
-            st.session_state["ocr_result"].append(raw_text)
-            st.session_state["structured_data"].append(structured_result)
-            st.session_state["preview_src"].append(preview_src)
+                st.session_state["ocr_result"].append(raw_text)
+                st.session_state["structured_data"].append(structured_result)
         
         progress_bar.progress(1.0)
         status_text.text("✅ Processing complete!")
+        if ocr_cache is not None:
+            cache_stats = ocr_cache.stats()
+            st.sidebar.caption(f"OCR cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
         time.sleep(1)
         status_text.empty()
         progress_bar.empty()
@@ -199,6 +256,12 @@ if st.session_state["ocr_result"]:
                 with st.expander("💉 Immunization Information"):
                     st.markdown(f"**immunization:** `{prescription_fields.get('immunization', 'Not found')}`")
                     st.markdown(f"**immunization_date:** `{prescription_fields.get('immunization_date', 'Not found')}`")
+                
+                # Tables parsed from the OCR markdown (also part of the complete report)
+                if structured_data.get("tables"):
+                    with st.expander("🧾 Tables"):
+                        for table in structured_data["tables"]:
+                            st.table(([table["header"]] if table["header"] else []) + table["rows"])
             
             # Download Options
             st.subheader("📥 Download Results")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Markdown Table Parser
+Turns the pipe tables in Mistral OCR markdown into cell grids and a label -> value
+index, so form fields like "DATE | 23 JAN 99" are dictionary lookups, not regex scans
+"""
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+
+
+def normalize_label(cell: str) -> str:
+    """Lowercase, drop markdown emphasis and trailing punctuation: "**EXP DATE:**" -> "exp date" """
+    return " ".join(cell.replace("*", "").replace("_", " ").strip().rstrip(":.-").lower().split())
+
+
+def split_row(line: str) -> List[str]:
+    """Cells of one "| a | b |" row; escaped pipes (\\|) stay inside their cell"""
+    inner = line.strip()
+    inner = inner[1:] if inner.startswith("|") else inner
+    inner = inner[:-1] if inner.endswith("|") and not inner.endswith("\\|") else inner
+    if "\\|" not in inner:
+        return [cell.strip() for cell in inner.split("|")]
+    return [cell.replace("\\|", "|").strip() for cell in re.split(r"(?<!\\)\|", inner)]
+
+
+@dataclass
+class MarkdownTable:
+    """
+    One pipe table; `header` is the row above the |---| separator, if there was one.
+    `cell_pairs` come from label/value cells and headerless two-column rows, `column_pairs`
+    from header cells labelling every data row; `pairs` holds both.
+    """
+    header: Optional[List[str]]
+    rows: List[List[str]]
+    start_line: int = 0
+    pairs: Dict[str, List[str]] = field(default_factory=dict, repr=False)
+    cell_pairs: Dict[str, List[str]] = field(default_factory=dict, repr=False)
+    column_pairs: Dict[str, List[str]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self.cell_pairs, self.column_pairs = self._label_values()
+        self.pairs = {label: list(values) for label, values in self.cell_pairs.items()}
+        for label, values in self.column_pairs.items():
+            self.pairs.setdefault(label, []).extend(values)
+
+    @property
+    def grid(self) -> List[List[str]]:
+        return ([self.header] if self.header else []) + self.rows
+
+    def _label_values(self) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """
+        Rows whose even cells end in ":" are read as label/value pairs ("| LOT NO: | P39K106 |"),
+        as are the rows of headerless two-column tables ("| Patient | John R. Doe |"); otherwise
+        header cells label the columns of every data row, so a "| Medicine | Dose |" header
+        is never read as a pair. Returns (cell pairs, column pairs).
+        """
+        cell_pairs: Dict[str, List[str]] = {}
+        column_pairs: Dict[str, List[str]] = {}
+
+        def add(label: str, value: str, pairs: Dict[str, List[str]]):
+            label = normalize_label(label)
+            if label and value:
+                pairs.setdefault(label, []).append(value)
+
+        width = max((len(row) for row in self.grid), default=0)
+        column_rows = []
+        for row in self.grid:
+            labels = row[0::2]
+            if len(row) % 2 == 0 and all(cell.rstrip("*_ ").endswith(":") for cell in labels):
+                for label, value in zip(labels, row[1::2]):
+                    add(label, value, cell_pairs)
+            elif self.header is None and width == 2 and len(row) == 2 and not any(ch.isdigit() for ch in row[0]):
+                add(row[0], row[1], cell_pairs)
+            elif row is not self.header:
+                column_rows.append(row)
+        if self.header and not all(cell.rstrip("*_ ").endswith(":") for cell in self.header[0::2]):
+            for row in column_rows:
+                for label, value in zip(self.header, row):
+                    add(label, value, column_pairs)
+        return cell_pairs, column_pairs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"header": self.header, "rows": self.rows, "start_line": self.start_line,
+                "fields": {label: values[0] if len(values) == 1 else values for label, values in self.pairs.items()}}
+
+    def to_csv(self) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.grid)
+        return buffer.getvalue()
+
+
+def parse_markdown_tables(markdown: str) -> List[MarkdownTable]:
+    """Every pipe table in the text, in one pass over its lines"""
+    tables: List[MarkdownTable] = []
+    block: List[List[str]] = []
+    start_line = 0
+    separator_at = None
+    for number, line in enumerate((markdown or "").splitlines() + [""]):
+        stripped = line.lstrip()
+        if stripped.startswith("|"):
+            cells = split_row(stripped)
+            if not block:
+                start_line, separator_at = number, None
+            if separator_at is None and all(SEPARATOR_CELL.match(cell) for cell in cells if cell) and any(cells):
+                separator_at = len(block)
+            else:
+                block.append(cells)
+            continue
+        if block:
+            header = block[0] if separator_at == 1 else None
+            tables.append(MarkdownTable(header, block[1:] if header else block, start_line))
+            block = []
+    return tables
+
+
+class TableIndex:
+    """
+    Label -> values across all tables of a document; first table, first row wins.
+    `source` picks which pairs are indexed: "all", "cells" or "columns".
+    """
+
+    def __init__(self, tables: Iterable[MarkdownTable], source: str = "all"):
+        attribute = {"all": "pairs", "cells": "cell_pairs", "columns": "column_pairs"}[source]
+        self.values: Dict[str, List[str]] = {}
+        for table in tables:
+            for label, values in getattr(table, attribute).items():
+                self.values.setdefault(label, []).extend(values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, *labels: str) -> Optional[str]:
+        for label in labels:
+            values = self.values.get(label)
+            if values:
+                return values[0]
+        return None
+
+    def get_all(self, *labels: str) -> List[str]:
+        for label in labels:
+            if self.values.get(label):
+                return self.values[label]
+        return []
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Parse the tables of an OCR markdown file and time the parser")
+    parser.add_argument("--input", default="ocr_result.txt")
+    parser.add_argument("--rows", type=int, default=5000, help="Rows of the synthetic table for the throughput test")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        sample = f.read()
+    print(json.dumps([table.to_dict() for table in parse_markdown_tables(sample)], indent=2))
+
+    synthetic = "| Medicine | Dose | Frequency |\n| --- | --- | --- |\n" + "".join(
+        f"| Drug{i} | {i % 500} mg | {i % 4 + 1}x daily |\n" for i in range(args.rows))
+    flattened = " ".join(synthetic.split())
+
+    def best(function, rounds=5):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    parse_time = best(lambda: parse_markdown_tables(synthetic))
+    index = TableIndex(parse_markdown_tables(synthetic))
+    # A label the form does not have is the common case: the index answers at once, a regex scans everything
+    lookup_time = best(lambda: [index.get("weight") for _ in range(10000)]) / 10000
+    regex_time = best(lambda: re.search(r"Weight[:\-\s|]+(\d+(?:\.\d+)?)\s*(kg|lbs?)", flattened, re.IGNORECASE))
+    print(f"\n{args.rows} rows ({len(synthetic):,} chars): parse {parse_time * 1000:.2f} ms "
+          f"({len(synthetic) / parse_time / 1e6:.1f} MB/s), index lookup {lookup_time * 1e6:.2f} us, "
+          f"regex label search on flattened text {regex_time * 1e6:.1f} us")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Medication Lexicon Matcher
+Compiles a drug-name lexicon into an Aho-Corasick automaton that finds every
+known medication in one linear pass, then captures the dose next to each hit
+"""
+
+import csv
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Check if optional dependencies are available
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "medication_lexicon.txt")
+
+# Dose right after a name, allowing one stray word in between ("Amphogel gaad 120 ml")
+DOSE_PATTERN = re.compile(
+    r"[ \t]*(?:[A-Za-z]+[ \t]+)?(\d+(?:\.\d+)?\s*"
+    r"(?:mg|mcg|µg|g|ml|l|iu|units?|tablets?|tabs?|capsules?|caps?|drops?|puffs?|%))(?![A-Za-z])",
+    re.IGNORECASE
+)
+# An explicitly prescribed line, the only unknown name trusted beside lexicon hits ("Tr Belledenna 15 ml")
+PRESCRIBED_PATTERN = re.compile(
+    r"(?<![A-Za-z])(?:Tr|Rx)\.?\s+([A-Za-z]+)\s+(\d+(?:\.\d+)?\s*(?:mg|mcg|ml|g|tablets?))(?![A-Za-z])",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class MedicationHit:
+    """One lexicon match; `name` is the lexicon spelling, `surface` the text as written"""
+    name: str
+    surface: str
+    start: int
+    end: int
+    dose: str = ""
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def lowercase_same_length(text: str) -> str:
+    """text.lower() with offsets preserved (a few characters lowercase to two)"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+class AhoCorasick:
+    """
+    Pure-Python Aho-Corasick automaton over lowercase keys. States are dict-based
+    goto tables with failure links; `output_link` jumps straight to the next
+    state along the failure chain that ends a key, so reporting costs O(matches).
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.key_at: List[Optional[int]] = [None]
+        self.keys: List[str] = []
+        for key in keys:
+            self._add(key)
+        self._build_links()
+
+    def _add(self, key: str):
+        state = 0
+        for ch in key:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.key_at.append(None)
+            state = next_state
+        if self.key_at[state] is None:
+            self.key_at[state] = len(self.keys)
+            self.keys.append(key)
+
+    def _build_links(self):
+        self.fail = [0] * len(self.goto)
+        self.output_link = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                link = self.goto[fallback].get(ch, 0) if state else 0
+                self.fail[child] = link if link != child else 0
+                self.output_link[child] = link if self.key_at[link] is not None else self.output_link[link]
+
+    def iter(self, text: str):
+        """Yield (end_index, key_index) for every key occurrence (end_index inclusive)"""
+        goto, fail, key_at, output_link = self.goto, self.fail, self.key_at, self.output_link
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if state:
+                node = state if key_at[state] is not None else output_link[state]
+                while node:
+                    yield index, key_at[node]
+                    node = output_link[node]
+
+
+class MedicationLexicon:
+    """
+    Case-insensitive whole-word medication matcher. Overlapping hits resolve
+    leftmost-longest ("Amoxicillin clavulanate" over "Amoxicillin"). Uses the
+    pyahocorasick C extension when installed, else the pure-Python automaton.
+    """
+
+    def __init__(self, names: Iterable[str], use_native: bool = True):
+        self.canonical: Dict[str, str] = {}
+        for name in names:
+            key = normalize_name(name)
+            if key:
+                self.canonical.setdefault(key, " ".join(name.split()))
+        self.keys = list(self.canonical)
+        self.native = use_native and AHOCORASICK_AVAILABLE
+        if self.native:
+            self.automaton = ahocorasick.Automaton()
+            for index, key in enumerate(self.keys):
+                self.automaton.add_word(key, index)
+            if self.keys:
+                self.automaton.make_automaton()
+        else:
+            self.automaton = AhoCorasick(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self.canonical
+
+    def _raw_hits(self, lowered: str) -> Iterable[Tuple[int, int]]:
+        if not self.keys:
+            return ()
+        return self.automaton.iter(lowered)
+
+    def find(self, text: str) -> List[MedicationHit]:
+        """Every whole-word, non-overlapping lexicon hit in text order, with its dose if one follows"""
+        lowered = lowercase_same_length(text)
+        candidates = []
+        for end_index, key_index in self._raw_hits(lowered):
+            key = self.keys[key_index]
+            start, end = end_index - len(key) + 1, end_index + 1
+            if (start == 0 or not lowered[start - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum()):
+                candidates.append((start, -end, key))
+        hits = []
+        covered = 0
+        for start, negative_end, key in sorted(candidates):
+            if start < covered:
+                continue
+            end = -negative_end
+            covered = end
+            dose = DOSE_PATTERN.match(text, end)
+            hits.append(MedicationHit(self.canonical[key], text[start:end], start, end,
+                                      " ".join(dose.group(1).split()) if dose else ""))
+        return hits
+
+
+def hit_spans(text: str, hits: Iterable[MedicationHit]) -> List[Tuple[int, int]]:
+    """(start, end) of each hit in `text`, its dose included"""
+    spans = []
+    for hit in hits:
+        dose = DOSE_PATTERN.match(text, hit.end) if hit.dose else None
+        spans.append((hit.start, dose.end() if dose else hit.end))
+    return spans
+
+
+def covered(spans: Iterable[Tuple[int, int]], start: int, end: int) -> bool:
+    """Whether [start, end) overlaps any of `spans`"""
+    return any(span_start < end and start < span_end for span_start, span_end in spans)
+
+
+def prescribed_beside(text: str, hits: List[MedicationHit]) -> List[MedicationHit]:
+    """
+    `hits` plus the "Tr/Rx <name> <dose>" lines none of them covers, in text order. Bare
+    "<word> <dose>" text is not added: "Take 2 tablets" next to a known drug is not a medicine.
+    """
+    spans = hit_spans(text, hits)
+    extra = [MedicationHit(match.group(1), match.group(1), match.start(1), match.end(1), " ".join(match.group(2).split()))
+             for match in PRESCRIBED_PATTERN.finditer(text) if not covered(spans, *match.span(2))]
+    return sorted(hits + extra, key=lambda hit: hit.start) if extra else hits
+
+
+def load_lexicon(path: str) -> List[str]:
+    """Names from a text file (one per line, # comments) or a CSV file (first column, header skipped)"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.reader(f)
+            next(rows, None)
+            return [row[0].strip() for row in rows if row and row[0].strip()]
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def create_medication_lexicon(path: Optional[str] = None) -> MedicationLexicon:
+    """Factory function; MEDICATION_LEXICON overrides the bundled medication_lexicon.txt"""
+    path = path or os.getenv("MEDICATION_LEXICON", DEFAULT_LEXICON_PATH)
+    try:
+        return MedicationLexicon(load_lexicon(path))
+    except OSError as e:
+        print(f"Medication lexicon not loaded ({e}); falling back to medicine patterns")
+        return MedicationLexicon([])
+
+
+@lru_cache(maxsize=1)
+def get_default_lexicon() -> MedicationLexicon:
+    """Process-wide lexicon, built on first use and shared by every extractor"""
+    return create_medication_lexicon()
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark lexicon load and match against regex alternatives")
+    parser.add_argument("--input", default="ocr_result.txt", help="OCR text to scale up")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated synthetic lexicon sizes")
+    parser.add_argument("--repeat", type=int, default=100, help="Repeat count of the input text")
+    parser.add_argument("--alternation-limit", type=int, default=10000,
+                        help="Largest lexicon to also time as one regex alternation")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        text = f.read() * args.repeat
+    bundled = load_lexicon(DEFAULT_LEXICON_PATH)
+    randomizer = random.Random(0)
+    syllables = ["ab", "ce", "di", "fo", "ga", "lo", "mi", "ne", "pra", "ro", "sta", "tin", "vo", "xa", "zol"]
+
+    def synthetic_names(count: int) -> List[str]:
+        names = set(bundled)
+        while len(names) < count:
+            names.add("".join(randomizer.choice(syllables) for _ in range(randomizer.randint(3, 5))).capitalize())
+        return list(names)
+
+    def timed(function):
+        started = time.perf_counter()
+        result = function()
+        return time.perf_counter() - started, result
+
+    generic = re.compile(r"([A-Za-z]+)\s+(\d+\s*(?:ml|mg|g|tablets?))", re.IGNORECASE)
+    generic_time, generic_hits = timed(lambda: list(generic.finditer(text)))
+    print(f"Text: {len(text):,} chars; generic medicine regex: {generic_time * 1000:.1f} ms, "
+          f"{len(generic_hits)} (mostly spurious) hits\n")
+
+    print(f"{'names':>8} {'engine':<12} {'load ms':>10} {'match ms':>10} {'MB/s':>8} {'hits':>7}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        names = synthetic_names(size)
+        engines = [("python", False)] + ([("native", True)] if AHOCORASICK_AVAILABLE else [])
+        for engine, native in engines:
+            load_time, lexicon = timed(lambda: MedicationLexicon(names, use_native=native))
+            match_time, hits = timed(lambda: lexicon.find(text))
+            print(f"{size:>8} {engine:<12} {load_time * 1000:>10.1f} {match_time * 1000:>10.1f} "
+                  f"{len(text) / match_time / 1e6:>8.2f} {len(hits):>7}")
+        if size <= args.alternation_limit:
+            alternation_source = r"\b(?:" + "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + r")\b"
+            load_time, alternation = timed(lambda: re.compile(alternation_source, re.IGNORECASE))
+            match_time, found = timed(lambda: list(alternation.finditer(text)))
+            print(f"{size:>8} {'re alt.':<12} {load_time * 1000:>10.1f} {match_time * 1000:>10.1f} "
+                  f"{len(text) / match_time / 1e6:>8.2f} {len(found):>7}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Mistral Batch-Job OCR
+Serialises a directory of documents into batch-job JSONL request lines,
+submits them as one /v1/ocr batch job and streams the result file back into
+the same structured output that process_prescription_image produces
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from batch_ocr import build_document, collect_inputs
+from ocr_executor import DEFAULT_OCR_MODEL, join_pages
+from prescription_field_extractor import process_prescription_image
+
+OCR_ENDPOINT = "/v1/ocr"
+TERMINAL_STATUSES = {"SUCCESS", "FAILED", "TIMEOUT_EXCEEDED", "CANCELLED"}
+
+
+def build_request_line(custom_id: str, document: Dict[str, Any], include_image_base64: bool = False) -> Dict[str, Any]:
+    """One batch request line for the OCR endpoint"""
+    return {
+        "custom_id": custom_id,
+        "body": {"document": document, "include_image_base64": include_image_base64}
+    }
+
+
+def iter_request_lines(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+        yield build_request_line(path, build_document(path, file_bytes))
+
+
+def write_requests_file(paths: Iterable[str], requests_path: str) -> int:
+    """Write one request line per document; returns the number of lines written"""
+    count = 0
+    with open(requests_path, "w", encoding="utf-8") as f:
+        for line in iter_request_lines(paths):
+            f.write(json.dumps(line) + "\n")
+            count += 1
+    return count
+
+
+def parse_result_line(line: Dict[str, Any]) -> Tuple[str, Optional[List[str]], Optional[str]]:
+    """Split a batch output line into (custom_id, page markdown, error)"""
+    custom_id = line.get("custom_id")
+    if line.get("error"):
+        return custom_id, None, str(line["error"])
+    response = line.get("response") or {}
+    if response.get("status_code", 200) >= 400:
+        return custom_id, None, f"HTTP {response.get('status_code')}: {response.get('body')}"
+    pages = (response.get("body") or {}).get("pages", [])
+    return custom_id, [page.get("markdown", "") for page in pages], None
+
+
+def iter_jsonl(lines: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class MistralBatchBackend:
+    """Batch jobs on the Mistral API (files upload + batch.jobs)"""
+
+    def __init__(self, client, model: str = DEFAULT_OCR_MODEL, poll_interval: float = 10.0):
+        self.client = client
+        self.model = model
+        self.poll_interval = poll_interval
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as f:
+            batch_file = self.client.files.upload(
+                file={"file_name": os.path.basename(requests_path), "content": f},
+                purpose="batch"
+            )
+        job = self.client.batch.jobs.create(
+            input_files=[batch_file.id],
+            model=self.model,
+            endpoint=OCR_ENDPOINT,
+            metadata={"source": "mistral_batch.py"}
+        )
+        return job.id
+
+    def wait(self, job_id: str, on_progress: Optional[Callable[[Any], None]] = None):
+        while True:
+            job = self.client.batch.jobs.get(job_id=job_id)
+            if on_progress:
+                on_progress(job)
+            if job.status in TERMINAL_STATUSES:
+                return job
+            time.sleep(self.poll_interval)
+
+    def iter_results(self, job) -> Iterator[Dict[str, Any]]:
+        """Stream result (and error) lines without loading the whole file"""
+        for file_id in (job.output_file, getattr(job, "error_file", None)):
+            if not file_id:
+                continue
+            response = self.client.files.download(file_id=file_id)
+            lines = response.iter_lines() if hasattr(response, "iter_lines") else io.BytesIO(response.read())
+            yield from iter_jsonl(lines)
+
+
+class LocalBatchBackend:
+    """
+    Local stand-in for the batch endpoint: runs each request line through `process_document`
+    (a callable taking an OCR document and returning page markdown) and emits output lines
+    in the same shape the API writes to its result file
+    """
+
+    def __init__(self, process_document: Callable[[Dict[str, Any]], List[str]]):
+        self.process_document = process_document
+        self._jobs: Dict[str, str] = {}
+
+    def submit(self, requests_path: str) -> str:
+        job_id = f"local-{len(self._jobs) + 1}"
+        self._jobs[job_id] = requests_path
+        return job_id
+
+    def wait(self, job_id: str, on_progress: Optional[Callable[[Any], None]] = None):
+        return {"id": job_id, "status": "SUCCESS"}
+
+    def iter_results(self, job) -> Iterator[Dict[str, Any]]:
+        with open(self._jobs[job["id"]], "r", encoding="utf-8") as f:
+            for index, request in enumerate(iter_jsonl(f)):
+                line = {"id": f"{job['id']}-{index}", "custom_id": request["custom_id"], "response": None, "error": None}
+                try:
+                    pages = self.process_document(request["body"]["document"])
+                    line["response"] = {
+                        "status_code": 200,
+                        "body": {"pages": [{"index": i, "markdown": markdown} for i, markdown in enumerate(pages)]}
+                    }
+                except Exception as e:
+                    line["error"] = {"message": str(e)}
+                yield line
+
+
+def iter_structured_results(result_lines: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Turn batch output lines into process_prescription_image results, one per document"""
+    for line in result_lines:
+        custom_id, pages, error = parse_result_line(line)
+        if error is not None:
+            yield {
+                "custom_id": custom_id,
+                "prescription_data": {},
+                "completion_status": {"completion_percentage": 0, "required_completion_percentage": 0},
+                "error": error
+            }
+            continue
+        raw_text = join_pages(pages, "No text found.")
+        structured_result = process_prescription_image(raw_text)
+        structured_result["custom_id"] = custom_id
+        structured_result["raw_text"] = raw_text
+        yield structured_result
+
+
+def run_batch_job(paths: List[str], backend, requests_path: str, output_path: str) -> Dict[str, int]:
+    """Serialise, submit, wait for and stream back one batch job; returns run counters"""
+    count = write_requests_file(paths, requests_path)
+    print(f"📝 Wrote {count} request lines to {requests_path}")
+
+    job_id = backend.submit(requests_path)
+    print(f"🚀 Submitted batch job {job_id}")
+
+    def report(job):
+        status = getattr(job, "status", None)
+        done = getattr(job, "completed_requests", None)
+        print(f"   status={status} completed={done}/{count}")
+
+    job = backend.wait(job_id, on_progress=report)
+    status = job["status"] if isinstance(job, dict) else job.status
+    if status != "SUCCESS":
+        print(f"⚠️ Batch job finished with status {status}; writing whatever results exist")
+
+    counts = {"total": count, "ok": 0, "error": 0}
+    with open(output_path, "w", encoding="utf-8") as f:
+        for result in iter_structured_results(backend.iter_results(job)):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            counts["error" if "error" in result else "ok"] += 1
+
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed -> {output_path}")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run OCR + field extraction over a directory as one Mistral batch job")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns")
+    parser.add_argument("--requests-file", default="batch_requests.jsonl", help="Where to write the batch request lines")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Structured results, one JSON line per document")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="Seconds between job status checks")
+    parser.add_argument("--local", action="store_true", help="Run the job through the interactive OCR API instead of the batch endpoint")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        print("Error: set MISTRAL_API_KEY to run batch OCR")
+        return 1
+
+    paths = collect_inputs(args.inputs)
+    if not paths:
+        print("No supported files found (jpg, jpeg, png, pdf).")
+        return 1
+
+    from mistral_client import create_mistral_client
+    client = create_mistral_client(api_key)
+
+    if args.local:
+        from ocr_executor import create_ocr_executor
+        backend = LocalBatchBackend(create_ocr_executor(client).process)
+    else:
+        backend = MistralBatchBackend(client, poll_interval=args.poll_interval)
+
+    counts = run_batch_job(paths, backend, args.requests_file, args.output)
+    return 0 if counts["error"] == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Mistral Client Factory
+Single place that builds Mistral clients so every entry point can be pointed
+at a different server (e.g. the local mock in mock_mistral_server.py)
+"""
+
+import os
+from typing import Optional
+
+
+def create_mistral_client(api_key: Optional[str], server_url: Optional[str] = None):
+    """
+    Create a Mistral client. `server_url` (or the MISTRAL_SERVER_URL environment variable)
+    overrides the API host, e.g. http://127.0.0.1:8765 for the local mock server.
+    """
+    from mistralai import Mistral
+
+    server_url = server_url or os.getenv("MISTRAL_SERVER_URL")
+    if server_url:
+        return Mistral(api_key=api_key or "mock", server_url=server_url)
+    return Mistral(api_key=api_key)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Local Mock Mistral Server
+Implements the /v1/ocr and /v1/chat/completions shapes the pipeline uses (chat also
+as a server-sent event stream), with configurable latency, error rates and 429 bursts,
+for load tests without quota
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_SAMPLE_TEXT_PATH = "ocr_result.txt"
+
+
+@dataclass
+class MockConfig:
+    """Failure and latency injection settings"""
+    base_latency: float = 0.05          # seconds added to every request
+    per_page_latency: float = 0.2       # seconds per OCR page
+    chat_latency: float = 0.5           # seconds per chat completion (spread over the chunks when streaming)
+    stream_chunk_chars: int = 16        # characters of content per streamed chunk
+    error_rate: float = 0.0             # probability of an HTTP 500
+    burst_every: int = 0                # every N requests, start a 429 burst (0 = never)
+    burst_length: int = 0               # number of consecutive 429 responses in a burst
+    max_pdf_pages: int = 50
+    sample_text: Optional[str] = None   # markdown returned for every page
+
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.requests = 0
+        self.burst_remaining = 0
+        self.counts = {"ocr": 0, "chat": 0, "429": 0, "500": 0}
+        self._lock = threading.Lock()
+        if config.sample_text is None:
+            try:
+                with open(DEFAULT_SAMPLE_TEXT_PATH, "r", encoding="utf-8") as f:
+                    config.sample_text = f.read()
+            except FileNotFoundError:
+                config.sample_text = "# MOCK PRESCRIPTION\n\nFOR (name) John R. Doe, HM3, USN DATE 23 JAN 99"
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def injected_failure(self) -> Optional[int]:
+        """Status code to fail this request with, if any"""
+        with self._lock:
+            self.requests += 1
+            if self.config.burst_every and self.requests % self.config.burst_every == 0:
+                self.burst_remaining = self.config.burst_length
+            if self.burst_remaining > 0:
+                self.burst_remaining -= 1
+                self.counts["429"] += 1
+                return 429
+            if self.config.error_rate and random.random() < self.config.error_rate:
+                self.counts["500"] += 1
+                return 500
+        return None
+
+
+def count_pdf_pages(data_url: str, max_pages: int) -> int:
+    """Rough page count of a base64 data: URL PDF (one page for anything else)"""
+    if not data_url.startswith("data:application/pdf;base64,"):
+        return 1
+    try:
+        pdf_bytes = base64.b64decode(data_url.split(",", 1)[1])
+    except Exception:
+        return 1
+    pages = len(re.findall(rb"/Type\s*/Page(?!s)", pdf_bytes))
+    return max(1, min(pages, max_pages))
+
+
+def build_ocr_response(body: Dict[str, Any], state: MockState) -> Tuple[Dict[str, Any], int]:
+    document = body.get("document") or {}
+    source = document.get("document_url") or document.get("image_url") or ""
+    page_count = count_pdf_pages(source, state.config.max_pdf_pages)
+    pages = [
+        {"index": index, "markdown": state.config.sample_text, "images": [],
+         "dimensions": {"dpi": 200, "height": 2200, "width": 1700}}
+        for index in range(page_count)
+    ]
+    response = {
+        "pages": pages,
+        "model": body.get("model", "mistral-ocr-latest"),
+        "usage_info": {"pages_processed": page_count, "doc_size_bytes": len(source)}
+    }
+    return response, page_count
+
+
+def build_chat_content(prompt: str) -> str:
+    """
+    Answer an extraction prompt with the regex extractor's view of the embedded OCR text;
+    batched prompts ("### Document <id>" sections) get a JSON array keyed by document_id
+    """
+    from prescription_field_extractor import PrescriptionFieldExtractor
+
+    sections = re.split(r"^\s*### Document (\S+)\s*$", prompt, flags=re.MULTILINE)
+    if len(sections) > 1:
+        extractor = PrescriptionFieldExtractor()
+        answers = []
+        for doc_id, text in zip(sections[1::2], sections[2::2]):
+            text = re.split(r"\s*Return only a valid JSON array", text)[0]
+            answers.append({"document_id": doc_id, **extractor.extract_all_fields(text)})
+        return json.dumps(answers)
+
+    match = re.search(r"OCR Text:\s*(.*?)\s*Return only valid JSON", prompt, re.DOTALL)
+    ocr_text = match.group(1) if match else prompt
+    return json.dumps(PrescriptionFieldExtractor().extract_all_fields(ocr_text))
+
+
+def build_chat_response(body: Dict[str, Any]) -> Dict[str, Any]:
+    messages = body.get("messages") or []
+    prompt = messages[-1].get("content", "") if messages else ""
+    content = build_chat_content(prompt)
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"mock-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mistral-large-latest"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens}
+    }
+
+
+def build_chat_chunks(body: Dict[str, Any], chunk_chars: int) -> List[Dict[str, Any]]:
+    """The chat response as completion chunks; the last one carries finish_reason and usage"""
+    response = build_chat_response(body)
+    content = response["choices"][0]["message"]["content"]
+    base = {key: response[key] for key in ("id", "created", "model")}
+    chunks = [{**base, "object": "chat.completion.chunk",
+               "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[start:start + chunk_chars]},
+                            "finish_reason": None}]}
+              for start in range(0, len(content), chunk_chars)]
+    chunks.append({**base, "object": "chat.completion.chunk",
+                   "choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}],
+                   "usage": response["usage"]})
+    return chunks
+
+
+class MockMistralHandler(BaseHTTPRequestHandler):
+    server_version = "MockMistral/1.0"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_events(self, chunks: List[Dict[str, Any]], seconds: float):
+        """Server-sent events, one chunk every seconds/len(chunks); stops quietly if the client hangs up"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(seconds / len(chunks))
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"message": "Invalid JSON body"})
+            return
+
+        config = self.state.config
+        time.sleep(config.base_latency)
+        failure = self.state.injected_failure()
+        if failure == 429:
+            self._send_json(429, {"message": "Requests rate limit exceeded"})
+            return
+        if failure == 500:
+            self._send_json(500, {"message": "Injected server error"})
+            return
+
+        path = self.path.rstrip("/")
+        if path.endswith("/v1/ocr"):
+            response, page_count = build_ocr_response(body, self.state)
+            time.sleep(config.per_page_latency * page_count)
+            self.state.count("ocr")
+            self._send_json(200, response)
+        elif path.endswith("/v1/chat/completions"):
+            self.state.count("chat")
+            if body.get("stream"):
+                self._send_events(build_chat_chunks(body, config.stream_chunk_chars), config.chat_latency)
+                return
+            time.sleep(config.chat_latency)
+            self._send_json(200, build_chat_response(body))
+        else:
+            self._send_json(404, {"message": f"Unknown endpoint {self.path}"})
+
+
+def start_mock_server(config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock server on a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    state = MockState(config or MockConfig())
+    handler = type("BoundMockMistralHandler", (MockMistralHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    thread = threading.Thread(target=server.serve_forever, name="mock-mistral", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+class MockHTTPError(Exception):
+    """HTTP error from the mock server; carries status_code like the SDK's errors"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"API error occurred: Status {status_code}. {message}")
+        self.status_code = status_code
+
+
+def _to_namespace(value: Any) -> Any:
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(item) for item in value]
+    return value
+
+
+class _Endpoint:
+    def __init__(self, client: "MockMistralClient", path: str):
+        self._client = client
+        self._path = path
+
+    def _post(self, payload: Dict[str, Any]):
+        return _to_namespace(self._client.post(self._path, payload))
+
+
+class _OCR(_Endpoint):
+    def process(self, model: str, document: Dict[str, Any], include_image_base64: bool = False, **kwargs):
+        return self._post({"model": model, "document": document, "include_image_base64": include_image_base64, **kwargs})
+
+
+class _Chat(_Endpoint):
+    def complete(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        return self._post({"model": model, "messages": messages, **kwargs})
+
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        """Events shaped like the SDK's (event.data.choices[0].delta.content); close() hangs up early"""
+        return self._client.stream(self._path, {"model": model, "messages": messages, **kwargs, "stream": True})
+
+
+class MockMistralClient:
+    """
+    Dependency-free client exposing client.ocr.process / client.chat.complete / client.chat.stream over HTTP,
+    for benchmarking against the mock server where the mistralai SDK is not installed
+    """
+
+    def __init__(self, server_url: str, timeout: float = 120.0):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = timeout
+        self.ocr = _OCR(self, "/v1/ocr")
+        self.chat = _Chat(self, "/v1/chat/completions")
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request = urllib.request.Request(
+            self.server_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": "Bearer mock"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise MockHTTPError(e.code, e.read().decode("utf-8", "replace")) from None
+
+    def stream(self, path: str, payload: Dict[str, Any]):
+        """Open a server-sent event stream; HTTP errors are raised here, before the first event"""
+        request = urllib.request.Request(
+            self.server_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream", "Authorization": "Bearer mock"}
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise MockHTTPError(e.code, e.read().decode("utf-8", "replace")) from None
+        return self._events(response)
+
+    @staticmethod
+    def _events(response):
+        with response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                yield SimpleNamespace(data=_to_namespace(json.loads(data)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the Mistral OCR/chat API for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--per-page-latency", type=float, default=0.2)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0, help="Start a 429 burst every N requests")
+    parser.add_argument("--burst-length", type=int, default=0, help="Consecutive 429s per burst")
+    args = parser.parse_args()
+
+    mock_config = MockConfig(base_latency=args.base_latency, per_page_latency=args.per_page_latency,
+                             chat_latency=args.chat_latency, error_rate=args.error_rate,
+                             burst_every=args.burst_every, burst_length=args.burst_length)
+    mock_server, url = start_mock_server(mock_config, args.host, args.port)
+    print(f"Mock Mistral server listening on {url}")
+    print(f"Point the apps at it with: MISTRAL_SERVER_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock_server.shutdown()
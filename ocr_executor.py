@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Concurrent OCR Executor
+Runs Mistral OCR requests on a worker pool behind a token-bucket rate limit
+"""
+
+import base64
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from resilience import AdaptiveConcurrencyLimiter, ResilientCaller
+
+DEFAULT_OCR_MODEL = "mistral-ocr-latest"
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how many requests start per second"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then consume them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def pages_to_markdown(ocr_response: Any) -> List[str]:
+    """Return the markdown of every page in an OCR response"""
+    pages = ocr_response.pages if hasattr(ocr_response, "pages") else (ocr_response if isinstance(ocr_response, list) else [])
+    return [page.markdown for page in pages]
+
+
+def join_pages(pages: List[str], empty_text: str = "No result found.") -> str:
+    """Join page markdown the same way every entry point always has"""
+    return "\n\n".join(pages) or empty_text
+
+
+@dataclass
+class PageResult:
+    """One OCR page as it becomes available; `error` is set (and markdown empty) when its request failed"""
+    document_index: int
+    page_number: int
+    markdown: str
+    error: Optional[str] = None
+
+
+# (document index, page number of the unit's first page, future resolving to page markdown)
+OCRUnit = Tuple[int, int, Future]
+
+
+def iter_page_results(units: List[OCRUnit], ordered: bool = True) -> Iterator[PageResult]:
+    """
+    Yield pages as their OCR requests finish. With ordered=True pages come out in
+    document/page order (each unit is awaited in turn); otherwise as soon as any unit completes.
+    """
+    future_units = {future: (document_index, first_page) for document_index, first_page, future in units}
+    futures = [future for _, _, future in units] if ordered else as_completed(future_units)
+    for future in futures:
+        document_index, first_page = future_units[future]
+        try:
+            pages = future.result()
+        except Exception as e:
+            yield PageResult(document_index, first_page, "", error=str(e))
+            continue
+        for offset, markdown in enumerate(pages):
+            yield PageResult(document_index, first_page + offset, markdown)
+
+
+def collect_page_results(page_results: Iterable[PageResult]) -> Dict[int, Dict[str, Any]]:
+    """Group streamed pages back into per-document page lists (in page order) and errors"""
+    documents: Dict[int, Dict[str, Any]] = {}
+    for result in page_results:
+        document = documents.setdefault(result.document_index, {"pages": {}, "errors": []})
+        if result.error is not None:
+            document["errors"].append(result.error)
+        else:
+            document["pages"][result.page_number] = result.markdown
+    for document in documents.values():
+        document["pages"] = [document["pages"][number] for number in sorted(document["pages"])]
+    return documents
+
+
+def encode_image_document(image_bytes: bytes, mime_type: str) -> Dict[str, str]:
+    """Build an image_url OCR document from raw image bytes"""
+    encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+    return {"type": "image_url", "image_url": f"data:{mime_type};base64,{encoded_image}"}
+
+
+def encode_pdf_document(pdf_bytes: bytes) -> Dict[str, str]:
+    """Build a document_url OCR document from raw PDF bytes"""
+    encoded_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
+    return {"type": "document_url", "document_url": f"data:application/pdf;base64,{encoded_pdf}"}
+
+
+class OCRExecutor:
+    """
+    Shared OCR executor: concurrent requests, a requests-per-second token bucket
+    and a cap on how many requests may be in flight at once
+    """
+
+    def __init__(self, client, max_workers: int = 4, requests_per_second: float = 1.0,
+                 burst: Optional[float] = None, max_in_flight: Optional[int] = None,
+                 model: str = DEFAULT_OCR_MODEL, include_image_base64: bool = True, cache=None,
+                 resilience=None):
+        self.client = client
+        self.model = model
+        self.include_image_base64 = include_image_base64
+        self.cache = cache
+        self.resilience = resilience
+        self.max_workers = max(1, int(max_workers))
+        self.max_in_flight = max(1, int(max_in_flight or self.max_workers))
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr")
+
+    @property
+    def ocr_options(self) -> Dict[str, Any]:
+        return {"include_image_base64": self.include_image_base64}
+
+    def process(self, document: Dict[str, Any], content: Optional[bytes] = None) -> List[str]:
+        """
+        Run one OCR request (blocking) and return its page markdown.
+        When a cache is attached and the raw document bytes are given, a cached result skips the API call.
+        """
+        use_cache = self.cache is not None and content is not None
+        if use_cache:
+            cached_pages = self.cache.get_pages(content, self.model, self.ocr_options)
+            if cached_pages is not None:
+                return cached_pages
+
+        with self._in_flight:
+            if self.resilience is not None:
+                # Retries, adaptive concurrency and the circuit breaker live in the shared ResilientCaller
+                ocr_response = self.resilience.call(self._call_ocr, document)
+            else:
+                ocr_response = self._call_ocr(document)
+        pages = pages_to_markdown(ocr_response)
+
+        if use_cache:
+            self.cache.put_pages(content, self.model, self.ocr_options, pages)
+        return pages
+
+    def _call_ocr(self, document: Dict[str, Any]):
+        # Every attempt, including retries, takes a token from the bucket
+        self.rate_limiter.acquire()
+        return self.client.ocr.process(
+            model=self.model,
+            document=document,
+            include_image_base64=self.include_image_base64
+        )
+
+    def submit(self, document: Dict[str, Any], content: Optional[bytes] = None) -> Future:
+        """Schedule one OCR request on the worker pool"""
+        return self._pool.submit(self.process, document, content)
+
+    def submit_all(self, documents: Iterable[Dict[str, Any]]) -> List[Future]:
+        """Schedule many OCR requests; futures are returned in input order"""
+        return [self.submit(document) for document in documents]
+
+    def iter_pages(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> Iterator[PageResult]:
+        """Submit every document and stream back its pages (see iter_page_results)"""
+        units = [(index, 0, future) for index, future in enumerate(self.submit_all(documents))]
+        return iter_page_results(units, ordered)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+def create_ocr_executor(client, max_workers: Optional[int] = None, requests_per_second: Optional[float] = None,
+                        max_in_flight: Optional[int] = None, **kwargs) -> OCRExecutor:
+    """
+    Factory function reading defaults from MISTRAL_OCR_WORKERS / MISTRAL_OCR_RPS / MISTRAL_OCR_MAX_IN_FLIGHT.
+    Unless a `resilience` caller is passed, OCR calls get retries with backoff, AIMD concurrency
+    (capped at max_in_flight) and a circuit breaker.
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv("MISTRAL_OCR_WORKERS", "4"))
+    if requests_per_second is None:
+        requests_per_second = float(os.getenv("MISTRAL_OCR_RPS", "1"))
+    if max_in_flight is None and os.getenv("MISTRAL_OCR_MAX_IN_FLIGHT"):
+        max_in_flight = int(os.getenv("MISTRAL_OCR_MAX_IN_FLIGHT"))
+    if "resilience" not in kwargs:
+        limit = max(1, int(max_in_flight or max_workers))
+        kwargs["resilience"] = ResilientCaller(limiter=AdaptiveConcurrencyLimiter(initial_limit=limit, max_limit=limit))
+    return OCRExecutor(client, max_workers=max_workers, requests_per_second=requests_per_second,
+                       max_in_flight=max_in_flight, **kwargs)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Regex Pattern Instrumentation
+Opt-in per-pattern evaluation, match, first-match-win and timing counters for the
+field extractors, dumpable as JSON or Prometheus text after a batch
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Match, Optional, Sequence, Tuple
+
+COUNTERS = ("evaluations", "hits", "matches", "wins", "skipped")
+PROMETHEUS_HELP = {
+    "evaluations": "Times the pattern was run",
+    "hits": "Evaluations that found at least one match",
+    "matches": "Matches found",
+    "wins": "Times the pattern supplied the value of its field",
+    "skipped": "Times the pattern was skipped because none of its trigger words occurred",
+}
+
+
+class PatternStats:
+    """Thread-safe counters keyed by (source, group, pattern)"""
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: Tuple[str, str, str]) -> Dict[str, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {**dict.fromkeys(COUNTERS, 0), "seconds": 0.0}
+        return entry
+
+    def record(self, source: str, group: str, pattern: str, matches: int, elapsed: float):
+        with self._lock:
+            entry = self._entry((source, group, pattern))
+            entry["evaluations"] += 1
+            entry["hits"] += matches > 0
+            entry["matches"] += matches
+            entry["seconds"] += elapsed
+
+    def record_win(self, source: str, group: str, pattern: str):
+        with self._lock:
+            self._entry((source, group, pattern))["wins"] += 1
+
+    def record_skip(self, source: str, group: str, pattern: str):
+        with self._lock:
+            self._entry((source, group, pattern))["skipped"] += 1
+
+    def reset(self):
+        with self._lock:
+            self.entries.clear()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One row per pattern, slowest first"""
+        with self._lock:
+            rows = [{"source": source, "group": group, "pattern": pattern, **entry}
+                    for (source, group, pattern), entry in self.entries.items()]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def dead_patterns(self) -> List[Dict[str, Any]]:
+        """Patterns that were run or skipped but never matched: candidates for pruning"""
+        return [row for row in self.snapshot() if row["hits"] == 0]
+
+    def to_json(self) -> str:
+        rows = self.snapshot()
+        return json.dumps({"patterns": rows, "dead_patterns": [row["pattern"] for row in rows if row["hits"] == 0]},
+                          indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "ocr_pattern") -> str:
+        rows = self.snapshot()
+        lines = []
+        for counter in COUNTERS:
+            lines += [f"# HELP {prefix}_{counter}_total {PROMETHEUS_HELP[counter]}",
+                      f"# TYPE {prefix}_{counter}_total counter"]
+            lines += [f"{prefix}_{counter}_total{_labels(row)} {row[counter]}" for row in rows]
+        lines += [f"# HELP {prefix}_seconds_total Time spent running the pattern",
+                  f"# TYPE {prefix}_seconds_total counter"]
+        lines += [f"{prefix}_seconds_total{_labels(row)} {row['seconds']:.9f}" for row in rows]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Prometheus text for .prom/.txt paths, JSON otherwise"""
+        text = self.to_prometheus() if path.lower().endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(row: Dict[str, Any]) -> str:
+    return '{source="%s",group="%s",pattern="%s"}' % (_escape(row["source"]), _escape(row["group"]),
+                                                    _escape(row["pattern"]))
+
+
+_active: Optional[PatternStats] = None
+
+
+def enable_pattern_stats(stats: Optional[PatternStats] = None) -> PatternStats:
+    """Start recording in every extractor; returns the collector to dump later"""
+    global _active
+    _active = stats or PatternStats()
+    return _active
+
+
+def disable_pattern_stats():
+    global _active
+    _active = None
+
+
+def active_pattern_stats() -> Optional[PatternStats]:
+    """The collector in use, or None when instrumentation is off (the default)"""
+    return _active
+
+
+# OCR_PATTERN_STATS=1 turns recording on for a whole process
+if os.getenv("OCR_PATTERN_STATS", "").lower() in ("1", "true", "yes"):
+    enable_pattern_stats()
+
+
+def first_match(source: str, group: str, patterns: Sequence[str], text: str,
+                flags: int = re.IGNORECASE) -> Optional[Match]:
+    """First pattern (in priority order) that matches `text`, recorded when instrumentation is on"""
+    stats = _active
+    for pattern in patterns:
+        if stats is None:
+            match = re.search(pattern, text, flags)
+        else:
+            started = time.perf_counter()
+            match = re.search(pattern, text, flags)
+            stats.record(source, group, pattern, 1 if match else 0, time.perf_counter() - started)
+            if match:
+                stats.record_win(source, group, pattern)
+        if match:
+            return match
+    return None
+
+
+def find_all(source: str, group: str, pattern: str, text: str, flags: int = re.IGNORECASE) -> List[Match]:
+    """re.finditer() as a list, recorded when instrumentation is on"""
+    stats = _active
+    if stats is None:
+        return list(re.finditer(pattern, text, flags))
+    started = time.perf_counter()
+    matches = list(re.finditer(pattern, text, flags))
+    stats.record(source, group, pattern, len(matches), time.perf_counter() - started)
+    return matches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the regex extractors over OCR text and report per-pattern statistics")
+    parser.add_argument("inputs", nargs="*", default=["ocr_result.txt"], help="OCR text/markdown files")
+    parser.add_argument("--repeat", type=int, default=20, help="Times to run each input")
+    parser.add_argument("--output", help="Write the report here (.prom/.txt for Prometheus, JSON otherwise)")
+    args = parser.parse_args()
+
+    # The extractors read the collector of the imported module, not of this __main__ copy
+    import pattern_stats
+    from advanced_prescription_extractor import AdvancedPrescriptionExtractor
+    from extract_prescription_fields import extract_prescription_fields
+    from prescription_field_extractor import PrescriptionFieldExtractor
+
+    texts = []
+    for path in args.inputs:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+
+    extractor = PrescriptionFieldExtractor()
+    # Only the regex method runs, so no API client is needed
+    advanced = AdvancedPrescriptionExtractor("", mistral_client=object())
+
+    def run_all() -> float:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in texts:
+                extractor.extract_all_fields(text)
+                extract_prescription_fields(text)
+                advanced._enhanced_regex_extraction(text)
+        return time.perf_counter() - started
+
+    run_all()  # warm the re module's pattern cache
+    plain_time = run_all()
+    stats = pattern_stats.enable_pattern_stats()
+    instrumented_time = run_all()
+
+    print(f"{'source':<30} {'group':<18} {'evals':>6} {'hits':>5} {'wins':>5} {'skip':>5} {'ms':>8}  pattern")
+    for row in stats.snapshot():
+        print(f"{row['source']:<30} {row['group']:<18} {row['evaluations']:>6} {row['hits']:>5} {row['wins']:>5} "
+              f"{row['skipped']:>5} {row['seconds'] * 1000:>8.2f}  {row['pattern'][:50]}")
+    print(f"\n{len(stats.dead_patterns())} of {len(stats.entries)} patterns never matched; "
+          f"instrumentation overhead {(instrumented_time / plain_time - 1) * 100:+.0f}%")
+    if args.output:
+        stats.dump(args.output)
+        print(f"Report saved to: {args.output}")
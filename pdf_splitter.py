@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Parallel PDF Page-Range Splitting
+Splits large PDFs into page-range chunks (by page count and/or byte budget),
+OCRs the chunks in parallel and stitches the pages back in order
+"""
+
+import io
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from ocr_executor import OCRUnit, PageResult, encode_pdf_document, iter_page_results
+
+# Check if optional dependencies are available
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    print("pypdf not available. Install with: pip install pypdf")
+
+DEFAULT_PAGES_PER_CHUNK = 8
+
+
+@dataclass
+class PdfChunk:
+    """A contiguous page range [start_page, end_page) re-encoded as its own PDF"""
+    start_page: int
+    end_page: int
+    data: bytes
+
+
+def _write_pages(reader, page_indices: List[int]) -> bytes:
+    writer = PdfWriter()
+    for index in page_indices:
+        writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def split_pdf(pdf_bytes: bytes, pages_per_chunk: Optional[int] = DEFAULT_PAGES_PER_CHUNK,
+              max_chunk_bytes: Optional[int] = None) -> List[PdfChunk]:
+    """
+    Split a PDF into page-range chunks. A chunk closes when it reaches `pages_per_chunk`
+    pages or when adding the next page would push it past `max_chunk_bytes`
+    (a page larger than the budget on its own still gets its own chunk).
+    Without pypdf, or for unreadable PDFs, the whole document is a single chunk.
+    """
+    if not PYPDF_AVAILABLE:
+        return [PdfChunk(0, 0, pdf_bytes)]
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        page_count = len(reader.pages)
+    except Exception as e:
+        print(f"PDF split error: {e}")
+        return [PdfChunk(0, 0, pdf_bytes)]
+
+    if page_count <= 1 or (not max_chunk_bytes and (not pages_per_chunk or pages_per_chunk >= page_count)):
+        return [PdfChunk(0, page_count, pdf_bytes)]
+
+    # Single-page sizes over-estimate shared resources (fonts, images), which keeps the budget conservative
+    page_sizes = [len(_write_pages(reader, [index])) for index in range(page_count)] if max_chunk_bytes else None
+
+    ranges = []
+    start, size = 0, 0
+    for index in range(page_count):
+        page_size = page_sizes[index] if page_sizes else 0
+        pages_in_chunk = index - start
+        over_pages = pages_per_chunk and pages_in_chunk >= pages_per_chunk
+        over_bytes = max_chunk_bytes and pages_in_chunk > 0 and size + page_size > max_chunk_bytes
+        if over_pages or over_bytes:
+            ranges.append((start, index))
+            start, size = index, 0
+        size += page_size
+    ranges.append((start, page_count))
+
+    return [PdfChunk(start, end, _write_pages(reader, list(range(start, end)))) for start, end in ranges]
+
+
+def submit_pdf_units(executor, pdf_bytes: bytes, document_index: int = 0,
+                     pages_per_chunk: Optional[int] = DEFAULT_PAGES_PER_CHUNK,
+                     max_chunk_bytes: Optional[int] = None) -> List[OCRUnit]:
+    """Submit every page-range chunk; returns (document index, first page, future) units for iter_page_results"""
+    chunks = split_pdf(pdf_bytes, pages_per_chunk, max_chunk_bytes)
+    return [(document_index, chunk.start_page, executor.submit(encode_pdf_document(chunk.data), chunk.data))
+            for chunk in chunks]
+
+
+def iter_pdf_pages(executor, pdf_bytes: bytes, ordered: bool = True,
+                   pages_per_chunk: Optional[int] = DEFAULT_PAGES_PER_CHUNK,
+                   max_chunk_bytes: Optional[int] = None) -> Iterator[PageResult]:
+    """Stream a PDF's pages as its chunks finish"""
+    units = submit_pdf_units(executor, pdf_bytes, 0, pages_per_chunk, max_chunk_bytes)
+    return iter_page_results(units, ordered)
+
+
+def submit_pdf(executor, pdf_bytes: bytes, pages_per_chunk: Optional[int] = DEFAULT_PAGES_PER_CHUNK,
+               max_chunk_bytes: Optional[int] = None) -> Future:
+    """
+    OCR a PDF as parallel page-range chunks on an OCRExecutor. The returned future resolves to
+    the page markdown of the whole document in page order; it never blocks a worker thread
+    waiting on its own chunks.
+    """
+    chunk_futures = [future for _, _, future in submit_pdf_units(executor, pdf_bytes, 0, pages_per_chunk, max_chunk_bytes)]
+
+    combined = Future()
+    remaining = [len(chunk_futures)]
+    lock = threading.Lock()
+
+    def on_chunk_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        errors = [future.exception() for future in chunk_futures if future.exception() is not None]
+        if errors:
+            combined.set_exception(errors[0])
+            return
+        pages = []
+        for future in chunk_futures:
+            pages.extend(future.result())
+        combined.set_result(pages)
+
+    for future in chunk_futures:
+        future.add_done_callback(on_chunk_done)
+    return combined
+
+
+def ocr_pdf(executor, pdf_bytes: bytes, pages_per_chunk: Optional[int] = DEFAULT_PAGES_PER_CHUNK,
+            max_chunk_bytes: Optional[int] = None) -> List[str]:
+    """Blocking variant of submit_pdf"""
+    return submit_pdf(executor, pdf_bytes, pages_per_chunk, max_chunk_bytes).result()
@@ -7,36 +7,162 @@ Based on CEO's schema requirements for prescription data extraction
 import json
 import re
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from date_normalizer import normalize_dates
+from field_scanner import FieldScanner, ScanResult, ScanRule
+from fuzzy_drug_index import FuzzyDrugIndex
+from markdown_segmenter import segment_markdown
+from markdown_tables import MarkdownTable, TableIndex, parse_markdown_tables
+from medication_lexicon import MedicationLexicon, get_default_lexicon, prescribed_beside
+from prescription_schema import FIELD_SCHEMA, blank_record, completion_status, validate_record
+from regex_guard import create_regex_guard
+
+# Field patterns in priority order; within a group the first rule that matches anywhere wins.
+# Leading (?<![A-Z]) / \b anchors keep single-match rules linear on long letter runs: a leftmost
+# match can only start at a word start anyway, so results are unchanged (see regex_guard.py).
+FIELD_RULES = {
+    "patient_name": [
+        ScanRule(r"FOR.*?\(.*?\)\s*([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)", ("for",), linear=True),  # FOR (...) John R. Doe
+        ScanRule(r"Patient.*?[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)", ("patient",), linear=True),
+        ScanRule(r"Name.*?[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)", ("name",), linear=True),
+        ScanRule(r"(?<![A-Z])([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+),\s+\w+,\s+\w+", (",",))  # John R. Doe, HM3, USN
+    ],
+    "prescription_date": [
+        ScanRule(r"DATE\s+(\d{1,2}\s+\w{3}\s+\d{2,4})", ("date",)),  # DATE 23 JAN 99
+        ScanRule(r"(?:PRESCRIPTION|RX).*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", ("prescription", "rx"), linear=True),
+        ScanRule(r"(\d{1,2}\s+\w{3,9}\s+\d{4})")  # 23 January 1999
+    ],
+    "patient_dob": [
+        ScanRule(r"DOB[:\-\s]+(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", ("dob",)),
+        ScanRule(r"Birth.*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", ("birth",), linear=True),
+        ScanRule(r"Born.*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", ("born",), linear=True)
+    ],
+    "patient_age": [
+        ScanRule(r"Age[:\-\s]+(\d{1,3})", ("age",)),
+        ScanRule(r"(\d{1,3})\s*y(?:ears?)?\.?\s*old", ("old",)),
+        ScanRule(r"(?:under|age)\s+(\d{1,3})", ("under", "age"))
+    ],
+    "patient_sex": [
+        ScanRule(r"(?:Sex|Gender)[:\-\s]+(Male|Female|M|F)", ("sex", "gender")),
+        ScanRule(r"\b(Male|Female|M|F)\b")
+    ],
+    "weight": [
+        ScanRule(r"Weight[:\-\s]+(\d+(?:\.\d+)?)\s*(kg|lbs?|pounds?)", ("weight",)),
+        ScanRule(r"(\d+(?:\.\d+)?)\s*(kg|lbs?|pounds?)", ("kg", "lb", "pound"))
+    ],
+    "doctor": [
+        ScanRule(r"(?<![A-Z])([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)\s+((?:LODR\.|MD|DR\.?|USNR|DDS|DO|NP|PA).*?)(?:\s|$)",
+                 ("lodr.", "md", "dr", "usnr", "dds", "do", "np", "pa")),
+        ScanRule(r"(?:Dr\.?|Doctor)\s+([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)", ("dr", "doctor")),
+        ScanRule(r"SIGNATURE.*?([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)", ("signature",), linear=True)
+    ],
+    "clinic_address": [
+        ScanRule(r"MEDICAL FACILITY\s+(.*?)(?=DATE|$)", ("medical facility",)),
+        ScanRule(r"(?:Clinic|Hospital|Facility)[:\-\s]+(.*?)(?:\n|$)", ("clinic", "hospital", "facility")),
+        ScanRule(r"U\.S\.S\.\s+(.*?)\s+\([^)]+\)", ("u.s.s.",), superlinear=True)
+    ],
+    "clinic_phone": [
+        ScanRule(r"(?:Phone|Tel|Call)[:\-\s]*(\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})", ("phone", "tel", "call")),
+        ScanRule(r"(\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})")
+    ],
+    # Every match of every medicine rule is used, not just the first
+    "medicine": [
+        ScanRule(r"(?:Tr|Rx)\s+(\w+)\s+(\d+\s*ml)", ("ml",)),  # Tr Belledenna 15 ml
+        ScanRule(r"(\w+)\s+(\w+)\s+(\d+\s*ml)", ("ml",), word_led=True),  # Amphogel gaad 120 ml
+        ScanRule(r"(\w+)\s+(\d+\s*(?:mg|ml|g|tablets?))", ("mg", "ml", "g", "tablet"), word_led=True)
+    ],
+    "medicine_frequency": [
+        ScanRule(r"(\d+\+\d+\+\d+)", ("+",)),  # 1+1+1
+        ScanRule(r"(\d+)\s*times?\s*(?:per\s*)?day", ("time",)),
+        ScanRule(r"every\s+(\d+)\s*hours?", ("every",))
+    ],
+    "medicine_duration": [
+        ScanRule(r"for\s+(\d+\s*(?:days?|weeks?|months?))", ("for",)),
+        ScanRule(r"(\d+\s*(?:days?|weeks?|months?))\s*course", ("course",))
+    ],
+    "instructions": [
+        ScanRule(r"(?:Seg|Signa)[:\-\s]*(.*?)(?:\n|$)", ("seg", "signa")),
+        ScanRule(r"Instructions[:\-\s]*(.*?)(?:\n|$)", ("instructions",)),
+        ScanRule(r"Take\s+(.*?)(?:\n|$)", ("take",))
+    ],
+    "allergy": [ScanRule(r"allerg", ("allerg",))],
+    "no_allergy": [ScanRule(r"no.*?allerg", ("allerg",), linear=True)],
+    "pregnancy": [ScanRule(r"pregnan", ("pregnan",))],
+    "not_pregnant": [ScanRule(r"not.*?pregnan", ("pregnan",), linear=True)],
+    "immunization": [
+        ScanRule(r"(?:Vaccine|Immunization|Vaccination)[:\-\s]+(\w+(?:\s+\w+)*)", ("vaccin", "immunization")),
+        ScanRule(r"\b(\w+)\s+vaccine", ("vaccine",))
+    ]
+}
+
+# Document regions (markdown_segmenter.py) each group is searched in before falling back to the whole text
+FIELD_ROUTES = {
+    "patient_name": ("patient",),
+    "prescription_date": ("header", "rx"),
+    "patient_dob": ("patient",),
+    "patient_age": ("patient",),
+    "patient_sex": ("patient",),
+    "weight": ("patient",),
+    "doctor": ("signature", "header"),
+    "clinic_address": ("header",),
+    "clinic_phone": ("header",),
+    "medicine": ("rx",),
+    "medicine_frequency": ("rx",),
+    "medicine_duration": ("rx",),
+    "instructions": ("rx",),
+    "allergy": ("patient", "rx"),
+    "no_allergy": ("patient", "rx"),
+    "pregnancy": ("patient", "rx"),
+    "not_pregnant": ("patient", "rx"),
+    "immunization": ("patient", "rx")
+}
+
+# Normalized table labels (markdown_tables.py) that answer a field directly, in priority order. A bare
+# "name" is left out: in a medication table it heads the drug column, not the patient.
+TABLE_FIELD_LABELS = {
+    "patient_name": ("patient", "patient name", "full name"),
+    "patient_address": ("patient address", "address of patient"),
+    "patient_dob": ("dob", "date of birth", "birth date"),
+    "patient_age": ("age",),
+    "patient_sex": ("sex", "gender"),
+    "weight": ("weight",),
+    "prescription_date": ("date", "prescription date", "rx date"),
+    "doctor_name": ("doctor", "physician", "prescriber", "prescribed by"),
+    "clinic_address": ("clinic", "clinic address", "medical facility", "facility", "hospital"),
+    "clinic_phone": ("phone", "tel", "telephone", "clinic phone"),
+    "medicine_name": ("medicine", "medication", "drug"),
+    "medicine_dose": ("dose", "dosage", "strength"),
+    "medicine_frequency": ("frequency",),
+    "medicine_duration": ("duration",),
+    "instructions": ("instructions", "directions", "sig"),
+    "immunization": ("vaccine", "immunization")
+}
+# Table columns that list one entry per medication row
+TABLE_LIST_FIELDS = ("medicine_name", "medicine_dose")
+# The only fields read from header-labelled columns; generic headers such as "date" or "phone"
+# over a medication list would otherwise be taken for document fields
+TABLE_COLUMN_FIELDS = ("medicine_name", "medicine_dose", "medicine_frequency", "medicine_duration", "instructions")
+
+# Budgeted so one pathological document cannot stall a batch worker
+DEFAULT_SCANNER = FieldScanner(FIELD_RULES, guard=create_regex_guard(), routes=FIELD_ROUTES,
+                               name="prescription_field_extractor")
 
 class PrescriptionFieldExtractor:
     """
     Extract structured prescription fields according to the company schema
     """
     
-    def __init__(self):
-        self.schema = {
-            "patient_name": {"type": "string", "max_length": 100, "required": True},
-            "patient_address": {"type": "string", "max_length": 255, "required": False},
-            "patient_dob": {"type": "date", "max_length": None, "required": True},
-            "patient_age": {"type": "integer", "max_length": None, "required": True},
-            "patient_sex": {"type": "string", "max_length": 10, "required": True},
-            "prescription_date": {"type": "date", "max_length": None, "required": True},
-            "doctor_name": {"type": "string", "max_length": 100, "required": True},
-            "doctor_title": {"type": "string", "max_length": 100, "required": True},
-            "clinic_address": {"type": "string", "max_length": 255, "required": False},
-            "clinic_phone": {"type": "string", "max_length": 20, "required": True},
-            "medicine_name": {"type": "string", "max_length": 100, "required": True},
-            "medicine_dose": {"type": "string", "max_length": 50, "required": True},
-            "medicine_frequency": {"type": "string", "max_length": 20, "required": False},
-            "medicine_duration": {"type": "string", "max_length": 50, "required": True},
-            "instructions": {"type": "text", "max_length": 500, "required": True},
-            "immunization": {"type": "string", "max_length": 100, "required": False},
-            "immunization_date": {"type": "date", "max_length": None, "required": False},
-            "is_allergic": {"type": "boolean", "max_length": None, "required": False},
-            "weight": {"type": "string", "max_length": None, "required": False},
-            "is_pregnant": {"type": "boolean", "max_length": None, "required": False}
-        }
+    def __init__(self, scanner: Optional[FieldScanner] = None, lexicon: Optional[MedicationLexicon] = None,
+                 fuzzy_index: Optional[FuzzyDrugIndex] = None):
+        # Compiled field rules; pass FieldScanner(FIELD_RULES, use_triggers=False, linearize=False) for plain searches
+        self.scanner = scanner or DEFAULT_SCANNER
+        # Known medication names; pass MedicationLexicon([]) to use only the generic medicine rules
+        self.lexicon = get_default_lexicon() if lexicon is None else lexicon
+        # Optional edit-distance correction of OCR-garbled names (create_fuzzy_drug_index())
+        self.fuzzy_index = fuzzy_index
+        # Shared field definitions (type, max length, required); see prescription_schema.py
+        self.schema = FIELD_SCHEMA
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
@@ -46,156 +172,87 @@ class PrescriptionFieldExtractor:
         cleaned = re.sub(r'\s+', ' ', text.strip())
         return cleaned
     
-    def extract_patient_name(self, text: str) -> str:
+    def extract_patient_name(self, text: str, scan: Optional[ScanResult] = None) -> str:
         """Extract patient name"""
-        patterns = [
-            r"FOR.*?\(.*?\)\s*([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)",  # FOR (...) John R. Doe
-            r"Patient.*?[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)",
-            r"Name.*?[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)",
-            r"([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+),\s+\w+,\s+\w+"  # John R. Doe, HM3, USN
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                name = self.clean_text(match.group(1))
-                # Remove military ranks/titles
-                name = re.sub(r',\s*(HM\d+|USN|USNR|MD|DR\.?).*?$', '', name, flags=re.IGNORECASE)
-                return name.strip()
+        scan = scan or self.scanner.scan(text)
+        match = scan.first("patient_name")
+        if match:
+            name = self.clean_text(match.group(1))
+            # Remove military ranks/titles
+            name = re.sub(r',\s*(HM\d+|USN|USNR|MD|DR\.?).*?$', '', name, flags=re.IGNORECASE)
+            return name.strip()
         return ""
     
-    def extract_dates(self, text: str) -> Dict[str, str]:
+    def extract_dates(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, str]:
         """Extract various dates from prescription"""
         dates = {"prescription_date": "", "patient_dob": "", "immunization_date": ""}
+        scan = scan or self.scanner.scan(text)
         
-        # Prescription date patterns
-        prescription_patterns = [
-            r"DATE\s+(\d{1,2}\s+\w{3}\s+\d{2,4})",  # DATE 23 JAN 99
-            r"(?:PRESCRIPTION|RX).*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})",
-            r"(\d{1,2}\s+\w{3,9}\s+\d{4})"  # 23 January 1999
-        ]
-        
-        for pattern in prescription_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                dates["prescription_date"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("prescription_date")
+        if match:
+            dates["prescription_date"] = self.clean_text(match.group(1))
         
-        # DOB patterns
-        dob_patterns = [
-            r"DOB[:\-\s]+(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})",
-            r"Birth.*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})",
-            r"Born.*?(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})"
-        ]
-        
-        for pattern in dob_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                dates["patient_dob"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("patient_dob")
+        if match:
+            dates["patient_dob"] = self.clean_text(match.group(1))
         
         return dates
     
-    def extract_patient_demographics(self, text: str) -> Dict[str, Any]:
+    def extract_patient_demographics(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, Any]:
         """Extract patient demographic information"""
         demographics = {"patient_age": "", "patient_sex": "", "weight": ""}
+        scan = scan or self.scanner.scan(text)
         
         # Age extraction
-        age_patterns = [
-            r"Age[:\-\s]+(\d{1,3})",
-            r"(\d{1,3})\s*y(?:ears?)?\.?\s*old",
-            r"(?:under|age)\s+(\d{1,3})"
-        ]
-        
-        for pattern in age_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                demographics["patient_age"] = int(match.group(1))
-                break
+        match = scan.first("patient_age")
+        if match:
+            demographics["patient_age"] = int(match.group(1))
         
         # Gender extraction
-        gender_patterns = [
-            r"(?:Sex|Gender)[:\-\s]+(Male|Female|M|F)",
-            r"\b(Male|Female|M|F)\b"
-        ]
-        
-        for pattern in gender_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                gender = match.group(1).upper()
-                if gender in ['M', 'MALE']:
-                    demographics["patient_sex"] = "Male"
-                elif gender in ['F', 'FEMALE']:
-                    demographics["patient_sex"] = "Female"
-                break
+        match = scan.first("patient_sex")
+        if match:
+            gender = match.group(1).upper()
+            if gender in ['M', 'MALE']:
+                demographics["patient_sex"] = "Male"
+            elif gender in ['F', 'FEMALE']:
+                demographics["patient_sex"] = "Female"
         
         # Weight extraction
-        weight_patterns = [
-            r"Weight[:\-\s]+(\d+(?:\.\d+)?)\s*(kg|lbs?|pounds?)",
-            r"(\d+(?:\.\d+)?)\s*(kg|lbs?|pounds?)"
-        ]
-        
-        for pattern in weight_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                demographics["weight"] = f"{match.group(1)} {match.group(2)}"
-                break
+        match = scan.first("weight")
+        if match:
+            demographics["weight"] = f"{match.group(1)} {match.group(2)}"
         
         return demographics
     
-    def extract_doctor_info(self, text: str) -> Dict[str, str]:
+    def extract_doctor_info(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, str]:
         """Extract doctor information"""
         doctor_info = {"doctor_name": "", "doctor_title": ""}
+        scan = scan or self.scanner.scan(text)
         
-        # Doctor name and title patterns
-        doctor_patterns = [
-            r"([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)\s+((?:LODR\.|MD|DR\.?|USNR|DDS|DO|NP|PA).*?)(?:\s|$)",
-            r"(?:Dr\.?|Doctor)\s+([A-Z][a-z]+(?:\s+[A-Z]\.?)?\s+[A-Z][a-z]+)",
-            r"SIGNATURE.*?([A-Z][a-z]+\s+[A-Z]\.\s+[A-Z][a-z]+)"
-        ]
-        
-        for pattern in doctor_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                doctor_info["doctor_name"] = self.clean_text(match.group(1))
-                if len(match.groups()) > 1:
-                    doctor_info["doctor_title"] = self.clean_text(match.group(2))
-                break
+        match = scan.first("doctor")
+        if match:
+            doctor_info["doctor_name"] = self.clean_text(match.group(1))
+            if len(match.groups()) > 1:
+                doctor_info["doctor_title"] = self.clean_text(match.group(2))
         
         return doctor_info
     
-    def extract_clinic_info(self, text: str) -> Dict[str, str]:
+    def extract_clinic_info(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, str]:
         """Extract clinic/facility information"""
         clinic_info = {"clinic_address": "", "clinic_phone": ""}
+        scan = scan or self.scanner.scan(text)
         
-        # Clinic address patterns
-        address_patterns = [
-            r"MEDICAL FACILITY\s+(.*?)(?=DATE|$)",
-            r"(?:Clinic|Hospital|Facility)[:\-\s]+(.*?)(?:\n|$)",
-            r"U\.S\.S\.\s+(.*?)\s+\([^)]+\)"
-        ]
-        
-        for pattern in address_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                clinic_info["clinic_address"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("clinic_address")
+        if match:
+            clinic_info["clinic_address"] = self.clean_text(match.group(1))
         
-        # Phone number patterns
-        phone_patterns = [
-            r"(?:Phone|Tel|Call)[:\-\s]*(\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})",
-            r"(\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})"
-        ]
-        
-        for pattern in phone_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                clinic_info["clinic_phone"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("clinic_phone")
+        if match:
+            clinic_info["clinic_phone"] = self.clean_text(match.group(1))
         
         return clinic_info
     
-    def extract_medication_info(self, text: str) -> Dict[str, str]:
+    def extract_medication_info(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, str]:
         """Extract medication information"""
         med_info = {
             "medicine_name": "",
@@ -204,69 +261,49 @@ class PrescriptionFieldExtractor:
             "medicine_duration": "",
             "instructions": ""
         }
-        
-        # Medicine name and dose patterns
-        medicine_patterns = [
-            r"(?:Tr|Rx)\s+(\w+)\s+(\d+\s*ml)",  # Tr Belledenna 15 ml
-            r"(\w+)\s+(\w+)\s+(\d+\s*ml)",  # Amphogel gaad 120 ml
-            r"(\w+)\s+(\d+\s*(?:mg|ml|g|tablets?))"
-        ]
-        
-        medicines = []
-        doses = []
-        
-        for pattern in medicine_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        scan = scan or self.scanner.scan(text)
+        
+        # Known medications from the lexicon, plus explicit "Tr/Rx <name> <dose>" lines beside them;
+        # the generic "<word> <dose>" rules only run when none is found
+        hits = []
+        for scope in scan.texts("medicine"):
+            hits = self.lexicon.find(scope)
+            if self.fuzzy_index is not None:
+                hits = self.fuzzy_index.correct_hits(scope, hits)
+            if hits:
+                break
+        if hits:
+            hits = prescribed_beside(scope, hits)
+            med_info["medicine_name"] = ", ".join(dict.fromkeys(hit.name for hit in hits))
+            med_info["medicine_dose"] = ", ".join(hit.dose for hit in hits if hit.dose)
+        else:
+            medicines = []
+            doses = []
+            
+            for match in scan.all("medicine"):
                 if len(match.groups()) >= 2:
                     medicines.append(match.group(1))
                     doses.append(match.group(2) if len(match.groups()) == 2 else match.group(3))
+            
+            if medicines:
+                med_info["medicine_name"] = ", ".join(set(medicines))  # Remove duplicates
+                med_info["medicine_dose"] = ", ".join(doses)
         
-        if medicines:
-            med_info["medicine_name"] = ", ".join(set(medicines))  # Remove duplicates
-            med_info["medicine_dose"] = ", ".join(doses)
-        
-        # Frequency patterns
-        frequency_patterns = [
-            r"(\d+\+\d+\+\d+)",  # 1+1+1
-            r"(\d+)\s*times?\s*(?:per\s*)?day",
-            r"every\s+(\d+)\s*hours?"
-        ]
-        
-        for pattern in frequency_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                med_info["medicine_frequency"] = match.group(1)
-                break
-        
-        # Duration patterns
-        duration_patterns = [
-            r"for\s+(\d+\s*(?:days?|weeks?|months?))",
-            r"(\d+\s*(?:days?|weeks?|months?))\s*course"
-        ]
+        match = scan.first("medicine_frequency")
+        if match:
+            med_info["medicine_frequency"] = match.group(1)
         
-        for pattern in duration_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                med_info["medicine_duration"] = match.group(1)
-                break
+        match = scan.first("medicine_duration")
+        if match:
+            med_info["medicine_duration"] = match.group(1)
         
-        # Instructions patterns
-        instruction_patterns = [
-            r"(?:Seg|Signa)[:\-\s]*(.*?)(?:\n|$)",
-            r"Instructions[:\-\s]*(.*?)(?:\n|$)",
-            r"Take\s+(.*?)(?:\n|$)"
-        ]
-        
-        for pattern in instruction_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                med_info["instructions"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("instructions")
+        if match:
+            med_info["instructions"] = self.clean_text(match.group(1))
         
         return med_info
     
-    def extract_special_conditions(self, text: str) -> Dict[str, Any]:
+    def extract_special_conditions(self, text: str, scan: Optional[ScanResult] = None) -> Dict[str, Any]:
         """Extract allergy, pregnancy, and immunization info"""
         conditions = {
             "is_allergic": None,
@@ -274,140 +311,118 @@ class PrescriptionFieldExtractor:
             "immunization": "",
             "immunization_date": ""
         }
+        scan = scan or self.scanner.scan(text)
         
         # Allergy patterns
-        if re.search(r"allerg", text, re.IGNORECASE):
+        if scan.first("allergy"):
             conditions["is_allergic"] = True
-        elif re.search(r"no.*?allerg", text, re.IGNORECASE):
+        elif scan.first("no_allergy"):
             conditions["is_allergic"] = False
         
         # Pregnancy patterns
-        if re.search(r"pregnan", text, re.IGNORECASE):
+        if scan.first("pregnancy"):
             conditions["is_pregnant"] = True
-        elif re.search(r"not.*?pregnan", text, re.IGNORECASE):
+        elif scan.first("not_pregnant"):
             conditions["is_pregnant"] = False
         
-        # Immunization patterns
-        vaccine_patterns = [
-            r"(?:Vaccine|Immunization|Vaccination)[:\-\s]+(\w+(?:\s+\w+)*)",
-            r"(\w+)\s+vaccine"
-        ]
-        
-        for pattern in vaccine_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                conditions["immunization"] = self.clean_text(match.group(1))
-                break
+        match = scan.first("immunization")
+        if match:
+            conditions["immunization"] = self.clean_text(match.group(1))
         
         return conditions
     
+    def extract_table_fields(self, tables: List[MarkdownTable], source: str = "cells") -> Dict[str, Any]:
+        """
+        Fields answered by the document's markdown tables: label/value cells and two-column rows
+        (source="cells"), or the medication fields of header-labelled columns (source="columns")
+        """
+        index = TableIndex(tables, source)
+        if not len(index):
+            return {}
+        table_fields = {}
+        for field_name, labels in TABLE_FIELD_LABELS.items():
+            if source == "columns" and field_name not in TABLE_COLUMN_FIELDS:
+                continue
+            if field_name in TABLE_LIST_FIELDS:
+                value = ", ".join(index.get_all(*labels))
+            else:
+                value = index.get(*labels) or ""
+            if value:
+                table_fields[field_name] = self.clean_text(value)
+        if "patient_age" in table_fields:
+            age = re.match(r"\d{1,3}", table_fields["patient_age"])
+            table_fields["patient_age"] = int(age.group(0)) if age else ""
+        if "patient_sex" in table_fields:
+            gender = table_fields["patient_sex"].upper()
+            table_fields["patient_sex"] = "Male" if gender in ("M", "MALE") else "Female" if gender in ("F", "FEMALE") else ""
+        return {field_name: value for field_name, value in table_fields.items() if value != ""}
+    
     def validate_and_format_fields(self, fields: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and format fields according to schema"""
-        validated_fields = {}
-        
-        for field_name, value in fields.items():
-            if field_name in self.schema:
-                field_schema = self.schema[field_name]
-                
-                # Handle empty values
-                if not value and value != 0 and value is not False:
-                    validated_fields[field_name] = "" if field_schema["type"] in ["string", "text", "date"] else None
-                    continue
-                
-                # Type validation and formatting
-                if field_schema["type"] == "string" or field_schema["type"] == "text":
-                    validated_value = str(value)
-                    if field_schema["max_length"] and len(validated_value) > field_schema["max_length"]:
-                        validated_value = validated_value[:field_schema["max_length"]]
-                    validated_fields[field_name] = validated_value
-                elif field_schema["type"] == "integer":
-                    try:
-                        validated_fields[field_name] = int(value) if value else None
-                    except (ValueError, TypeError):
-                        validated_fields[field_name] = None
-                elif field_schema["type"] == "boolean":
-                    validated_fields[field_name] = value if isinstance(value, bool) else None
-                elif field_schema["type"] == "date":
-                    validated_fields[field_name] = str(value) if value else ""
-                else:
-                    validated_fields[field_name] = value
-            else:
-                validated_fields[field_name] = value
-        
-        return validated_fields
+        return validate_record(fields)
     
-    def extract_all_fields(self, ocr_text: str) -> Dict[str, Any]:
-        """Extract all prescription fields from OCR text"""
+    def extract_all_fields(self, ocr_text: str, tables: Optional[List[MarkdownTable]] = None) -> Dict[str, Any]:
+        """Extract all prescription fields from OCR text; `tables` are its parsed markdown tables if already known"""
         # Initialize empty fields
-        prescription_data = {field: "" for field in self.schema.keys()}
+        prescription_data = blank_record()
         
         # Clean input text
         text = self.clean_text(ocr_text)
         
+        # Typed markdown regions (header, patient, Rx body, signature) each rule group is routed to
+        regions = None
+        if self.scanner.routes:
+            document = segment_markdown(ocr_text)
+            if document.structured:
+                regions = {kind: self.clean_text(region) for kind, region in document.regions().items()}
+        
+        # One scan shared by every extractor; rule groups are evaluated on first use
+        scan = self.scanner.scan(text, regions)
+        
         # Extract each category of information
-        prescription_data["patient_name"] = self.extract_patient_name(text)
+        prescription_data["patient_name"] = self.extract_patient_name(text, scan)
         
-        dates = self.extract_dates(text)
+        dates = self.extract_dates(text, scan)
         prescription_data.update(dates)
         
-        demographics = self.extract_patient_demographics(text)
+        demographics = self.extract_patient_demographics(text, scan)
         prescription_data.update(demographics)
         
-        doctor_info = self.extract_doctor_info(text)
+        doctor_info = self.extract_doctor_info(text, scan)
         prescription_data.update(doctor_info)
         
-        clinic_info = self.extract_clinic_info(text)
+        clinic_info = self.extract_clinic_info(text, scan)
         prescription_data.update(clinic_info)
         
-        medication_info = self.extract_medication_info(text)
+        medication_info = self.extract_medication_info(text, scan)
         prescription_data.update(medication_info)
         
-        special_conditions = self.extract_special_conditions(text)
+        special_conditions = self.extract_special_conditions(text, scan)
         prescription_data.update(special_conditions)
         
+        # Explicit label/value table cells beat pattern matches over the flattened text;
+        # medication columns only fill what the patterns left empty
+        tables = parse_markdown_tables(ocr_text) if tables is None else tables
+        prescription_data.update(self.extract_table_fields(tables))
+        for field_name, value in self.extract_table_fields(tables, source="columns").items():
+            if not prescription_data.get(field_name):
+                prescription_data[field_name] = value
+        
         # Validate and format according to schema
         return self.validate_and_format_fields(prescription_data)
     
     def get_field_completion_status(self, fields: Dict[str, Any]) -> Dict[str, Any]:
         """Get completion status for each field"""
-        status = {
-            "total_fields": len(self.schema),
-            "completed_fields": 0,
-            "required_fields": 0,
-            "required_completed": 0,
-            "field_status": {}
-        }
-        
-        for field_name, field_schema in self.schema.items():
-            is_required = field_schema["required"]
-            has_value = bool(fields.get(field_name))
-            
-            status["field_status"][field_name] = {
-                "required": is_required,
-                "completed": has_value,
-                "value": fields.get(field_name, "")
-            }
-            
-            if has_value:
-                status["completed_fields"] += 1
-            
-            if is_required:
-                status["required_fields"] += 1
-                if has_value:
-                    status["required_completed"] += 1
-        
-        status["completion_percentage"] = (status["completed_fields"] / status["total_fields"]) * 100
-        status["required_completion_percentage"] = (status["required_completed"] / status["required_fields"]) * 100 if status["required_fields"] > 0 else 0
-        
-        return status
+        return completion_status(fields)
 
 # Example usage function
-def process_prescription_image(ocr_text: str) -> Dict[str, Any]:
+def process_prescription_image(ocr_text: str, extractor: Optional[PrescriptionFieldExtractor] = None) -> Dict[str, Any]:
     """Process prescription image and return structured data"""
-    extractor = PrescriptionFieldExtractor()
+    extractor = extractor or PrescriptionFieldExtractor()
     
     # Extract fields
-    prescription_fields = extractor.extract_all_fields(ocr_text)
+    tables = parse_markdown_tables(ocr_text)
+    prescription_fields = extractor.extract_all_fields(ocr_text, tables)
     
     # Get completion status
     completion_status = extractor.get_field_completion_status(prescription_fields)
@@ -415,6 +430,8 @@ def process_prescription_image(ocr_text: str) -> Dict[str, Any]:
     return {
         "prescription_data": prescription_fields,
         "completion_status": completion_status,
+        "dates": normalize_dates(prescription_fields),
+        "tables": [table.to_dict() for table in tables],
         "timestamp": datetime.now().isoformat()
     }
 
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+ReDoS-Safe Regex Execution
+Per-pattern and per-document time budgets for the field scanner, plus a
+fuzz/perf harness that flags patterns whose run time grows super-linearly
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Check if optional dependencies are available
+try:
+    import regex
+    REGEX_AVAILABLE = True
+except ImportError:
+    REGEX_AVAILABLE = False
+    print("regex not available (pattern timeouts disabled). Install with: pip install regex")
+
+
+class RegexGuard:
+    """
+    Shared budget policy and statistics. Risky rules (marked `superlinear`, or
+    seen to overrun `pattern_budget` within their last `suspect_runs` evaluations)
+    run on the `regex` module and are cut off after `pattern_budget` seconds or the
+    document's remaining budget. Without `regex` a search cannot be interrupted, so
+    risky rules only see the first `suspect_window` characters instead (counted in
+    "windowed_searches"). Other rules stay on the faster `re` engine but are still
+    timed. Documents are capped at `max_text_chars`, and once a document has used
+    `document_budget` seconds its remaining rules are skipped.
+    """
+
+    def __init__(self, pattern_budget: float = 0.25, document_budget: float = 2.0,
+                 max_text_chars: Optional[int] = 200_000, suspect_window: int = 4_000, suspect_runs: int = 20):
+        self.pattern_budget = pattern_budget
+        self.document_budget = document_budget
+        self.max_text_chars = max_text_chars
+        self.suspect_window = suspect_window
+        self.suspect_runs = suspect_runs
+        # Worst time seen per pattern (reporting), and the evaluations each slow pattern stays risky for
+        self.slow_patterns: Dict[str, float] = {}
+        self.suspects: Dict[str, int] = {}
+        self.stats = {"documents": 0, "truncated": 0, "timeouts": 0, "slow_searches": 0,
+                      "budget_exhausted": 0, "skipped_rules": 0, "windowed_searches": 0}
+        self._compiled: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def prepare_text(self, text: str) -> str:
+        if self.max_text_chars and len(text) > self.max_text_chars:
+            self._count("truncated")
+            return text[:self.max_text_chars]
+        return text
+
+    def record_slow(self, pattern: str, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            self.stats["timeouts" if timed_out else "slow_searches"] += 1
+            first_time = pattern not in self.slow_patterns
+            self.slow_patterns[pattern] = max(elapsed, self.slow_patterns.get(pattern, 0.0))
+            self.suspects[pattern] = self.suspect_runs
+        if first_time:
+            print(f"Regex guard: pattern {'timed out' if timed_out else 'was slow'} ({elapsed:.3f}s): {pattern}")
+
+    def is_suspect(self, pattern: str) -> bool:
+        return self.suspects.get(pattern, 0) > 0
+
+    def record_normal(self, pattern: str):
+        """A suspect pattern ran within budget; after `suspect_runs` of these it is trusted again"""
+        with self._lock:
+            runs = self.suspects.get(pattern, 0) - 1
+            if runs > 0:
+                self.suspects[pattern] = runs
+            else:
+                self.suspects.pop(pattern, None)
+
+    def interruptible(self, compiled):
+        """`regex`-module twin of a compiled `re` pattern (supports timeout=)"""
+        key = (compiled.pattern, compiled.flags)
+        twin = self._compiled.get(key)
+        if twin is None:
+            # regex shares re's flag values; V0 keeps re-compatible semantics
+            twin = regex.compile(compiled.pattern, compiled.flags | regex.V0)
+            self._compiled[key] = twin
+        return twin
+
+    def start_document(self) -> "DocumentBudget":
+        self._count("documents")
+        return DocumentBudget(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["slow_patterns"] = dict(self.slow_patterns)
+            stats["suspect_patterns"] = dict(self.suspects)
+        stats["timeouts_enforced"] = REGEX_AVAILABLE
+        return stats
+
+
+class DocumentBudget:
+    """Deadline for one document's scan; every rule evaluation goes through it"""
+
+    def __init__(self, guard: RegexGuard):
+        self.guard = guard
+        self.deadline = time.monotonic() + guard.document_budget
+        self.exhausted = False
+        self._interruptible = False
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def _timeout(self) -> float:
+        return max(0.001, min(self.guard.pattern_budget, self.remaining()))
+
+    def _search(self, compiled, text: str, position: int):
+        if self._interruptible:
+            return self.guard.interruptible(compiled).search(text, position, timeout=self._timeout())
+        return compiled.search(text, position)
+
+    def _match(self, compiled, text: str, position: int):
+        if self._interruptible:
+            return self.guard.interruptible(compiled).match(text, position, timeout=self._timeout())
+        return compiled.match(text, position)
+
+    def run(self, rule, text: str, evaluate: Callable[[str, Callable], Any], empty: Any) -> Any:
+        """Evaluate `rule` on `text` within budget; returns `empty` when skipped or cut off"""
+        if self.remaining() <= 0:
+            if not self.exhausted:
+                self.exhausted = True
+                self.guard._count("budget_exhausted")
+            self.guard._count("skipped_rules")
+            return empty
+        suspect = self.guard.is_suspect(rule.pattern)
+        risky = rule.superlinear or suspect
+        self._interruptible = risky and REGEX_AVAILABLE
+        if risky and not REGEX_AVAILABLE and len(text) > self.guard.suspect_window:
+            self.guard._count("windowed_searches")
+            text = text[:self.guard.suspect_window]
+        started = time.monotonic()
+        try:
+            result = evaluate(text, self)
+        except TimeoutError:
+            self.guard.record_slow(rule.pattern, time.monotonic() - started, timed_out=True)
+            return empty
+        elapsed = time.monotonic() - started
+        if elapsed > self.guard.pattern_budget:
+            self.guard.record_slow(rule.pattern, elapsed)
+        elif suspect:
+            self.guard.record_normal(rule.pattern)
+        return result
+
+    def search(self, rule, text: str, single_line: bool):
+        return self.run(rule, text, lambda window, budget: rule.search(window, single_line, budget._search), None)
+
+    def finditer(self, rule, text: str) -> List[Any]:
+        return self.run(rule, text, lambda window, budget: rule.finditer(window, budget._search, budget._match), [])
+
+
+def create_regex_guard(pattern_budget: Optional[float] = None, document_budget: Optional[float] = None,
+                       max_text_chars: Optional[int] = None) -> RegexGuard:
+    """Factory function; OCR_REGEX_PATTERN_BUDGET, OCR_REGEX_DOCUMENT_BUDGET and OCR_REGEX_MAX_CHARS override the defaults"""
+    pattern_budget = pattern_budget or float(os.getenv("OCR_REGEX_PATTERN_BUDGET", "0.25"))
+    document_budget = document_budget or float(os.getenv("OCR_REGEX_DOCUMENT_BUDGET", "2.0"))
+    max_text_chars = max_text_chars or int(os.getenv("OCR_REGEX_MAX_CHARS", "200000"))
+    return RegexGuard(pattern_budget, document_budget, max_text_chars)
+
+
+# ---------------------------------------------------------------------------
+# Fuzz / perf harness
+# ---------------------------------------------------------------------------
+
+NOISE_TOKENS = ["(", ")", ":", "-", ".", ",", "1", "12", "ml", "A.", "John", "R.", "Doe", "x"]
+
+
+def adversarial_inputs(rule, size: int) -> Dict[str, str]:
+    """Inputs of roughly `size` chars that repeat a rule's opening literal without ever completing it"""
+    words = list(rule.triggers) or ["a"]
+    inputs = {
+        "triggers": " ".join(words[i % len(words)] for i in range(size // 4)),
+        "trigger+paren": " ".join(f"{words[i % len(words)]} (" for i in range(size // 8)),
+        "trigger+noise": " ".join(f"{words[i % len(words)]} {NOISE_TOKENS[i % len(NOISE_TOKENS)]}"
+                                  for i in range(size // 8)),
+        "digits": "1 " * (size // 2),
+        "letters": "a" * size,
+    }
+    return {name: text[:size] for name, text in inputs.items()}
+
+
+def growth_exponent(sizes: List[int], timings: List[float], noise_floor: float = 0.001) -> float:
+    """Slope of log(time) against log(size) between the smallest and largest measured size"""
+    import math
+    # Sub-millisecond runs are dominated by timer and interpreter noise
+    if len(sizes) < 2 or timings[0] <= 0 or timings[-1] < noise_floor:
+        return 0.0
+    return math.log(max(timings[-1], 1e-9) / timings[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def profile_rule(rule, sizes: List[int], single_line: bool = True, multi_match: bool = False,
+                 time_cap: float = 1.0) -> Dict[str, Any]:
+    """Worst-case growth exponent of one rule over the adversarial inputs, evaluated the way the scanner runs it"""
+    worst = {"exponent": 0.0, "input": None, "timings": {}}
+    for name in adversarial_inputs(rule, sizes[0]):
+        measured_sizes, timings = [], []
+        for size in sizes:
+            text = adversarial_inputs(rule, size)[name]
+            elapsed = float("inf")
+            for _ in range(3):
+                started = time.perf_counter()
+                if multi_match:
+                    rule.finditer(text)
+                else:
+                    rule.search(text, single_line)
+                elapsed = min(elapsed, time.perf_counter() - started)
+            measured_sizes.append(size)
+            timings.append(elapsed)
+            if elapsed > time_cap:
+                break
+        exponent = growth_exponent(measured_sizes, timings)
+        if exponent > worst["exponent"]:
+            worst = {"exponent": round(exponent, 2), "input": name,
+                     "timings": {size: round(timing * 1000, 3) for size, timing in zip(measured_sizes, timings)}}
+    return worst
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from prescription_field_extractor import FIELD_RULES
+
+    parser = argparse.ArgumentParser(description="Flag field patterns whose run time grows super-linearly")
+    parser.add_argument("--sizes", default="1000,2000,4000,8000", help="Comma-separated input sizes (chars)")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Growth exponent that counts as super-linear")
+    parser.add_argument("--raw", action="store_true", help="Profile the full patterns instead of the scanner's linear chains")
+    parser.add_argument("--multi-match-groups", default="medicine",
+                        help="Comma-separated rule groups the extractor reads with scan.all() (finditer)")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    input_sizes = [int(size) for size in args.sizes.split(",")]
+    multi_match_groups = set(args.multi_match_groups.split(","))
+    report = []
+    for group, rules in FIELD_RULES.items():
+        for rule in rules:
+            profile = profile_rule(rule, input_sizes, single_line=not args.raw, multi_match=group in multi_match_groups)
+            profile.update({"group": group, "pattern": rule.pattern,
+                            "super_linear": profile["exponent"] > args.threshold})
+            report.append(profile)
+
+    print("=" * 80)
+    print(f"REGEX GROWTH REPORT ({'full patterns' if args.raw else 'as scanned'}, sizes {input_sizes})")
+    print("=" * 80)
+    for entry in sorted(report, key=lambda item: item["exponent"], reverse=True):
+        flag = "⚠️ " if entry["super_linear"] else "  "
+        print(f"{flag}{entry['exponent']:>5}  {entry['group']:<20} {entry['input'] or '-':<14} {entry['pattern'][:60]}")
+    flagged = [entry for entry in report if entry["super_linear"]]
+    print(f"\n{len(flagged)} of {len(report)} patterns flagged as super-linear")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.json}")
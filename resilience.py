@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Resilient Mistral Calls
+Jittered exponential backoff, AIMD adaptive concurrency driven by 429s and
+latency, and a circuit breaker shared by every worker calling the API
+"""
+
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# httpx / httpcore transport failures (ConnectError, ReadTimeout, ...), which the Mistral SDK raises
+# as is; matched by base class name so neither library has to be importable here
+TRANSPORT_ERROR_NAMES = {"TransportError", "TimeoutException", "NetworkError"}
+# "Status 429", "status_code=429", "HTTP 429" in an error message without a status attribute
+STATUS_429_PATTERN = re.compile(r"\b(?:status(?:[ _]code)?|http(?:/[\d.]+)?)\W{0,3}429\b", re.IGNORECASE)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Best-effort HTTP status of an SDK / HTTP error"""
+    for attribute in ("status_code", "status"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+    message = str(error)
+    if STATUS_429_PATTERN.search(message) or "rate limit" in message.lower():
+        return 429
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, CircuitOpenError):
+        return False
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    # Connection resets, timeouts and similar transport errors carry no status code
+    if isinstance(error, (ConnectionError, TimeoutError, OSError)):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: +1 slot after `increase_every` fast successes,
+    halve on a 429 or when latency exceeds `latency_target` seconds
+    """
+
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 latency_target: Optional[float] = None, increase_every: int = 5, decrease_factor: float = 0.5):
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.increase_every = increase_every
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled or (self.latency_target and latency is not None and latency > self.latency_target):
+                self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_every and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; lets one probe through after `reset_timeout` seconds"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Mistral API circuit breaker is open; skipping call")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError("Mistral API circuit breaker is half-open; probe already in flight")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """End a half-open probe that said nothing about the API (a local error); the next call probes again"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """
+    Wraps API calls with retries (full-jitter exponential backoff), adaptive
+    concurrency and a circuit breaker. One instance should be shared by all
+    workers hitting the same API so they slow down together.
+    """
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None, sleep: Callable[[float], None] = time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "short_circuited": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call `function(*args, **kwargs)`, retrying retryable errors; re-raises the last error"""
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("short_circuited")
+                raise
+
+            self.limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+            try:
+                self._count("calls")
+                result = function(*args, **kwargs)
+            except Exception as e:
+                status_code = get_status_code(e)
+                throttled = status_code == 429
+                if throttled:
+                    self._count("throttled")
+                retryable = is_retryable(e)
+                if retryable and not throttled:
+                    self.breaker.record_failure()
+                elif status_code is not None:
+                    # The API answered (429 throttling, 400 for a bad document): the service itself is up;
+                    # throttling is handled by backoff and the concurrency limit, not the breaker
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release_probe()
+                if attempt >= self.max_retries or not retryable:
+                    self._count("failures")
+                    raise
+                attempt += 1
+                self._count("retries")
+                delay = self.backoff_delay(attempt)
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release(time.monotonic() - started, throttled)
+
+            self.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({"concurrency_limit": self.limiter.limit, "circuit_state": self.breaker.state})
+        return stats
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Persistent Result Cache
+Content-addressed SQLite store of compressed results with size-bounded LRU eviction
+and optional expiry, for OCR pages and LLM chat responses
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_DIR = ".cache"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobCache:
+    """SQLite-backed key/value cache storing zlib-compressed JSON values; entries older than ttl_seconds expire"""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, key: str, value: Any):
+        """Store `value` (JSON-serialisable) and evict least recently used entries over budget"""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds is not None:
+            expired = self._conn.execute("DELETE FROM entries WHERE created < ?",
+                                         (time.time() - self.ttl_seconds,)).rowcount
+            self.expirations += max(0, expired)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current entry count and stored size"""
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": entries,
+            "stored_bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OCRCache(BlobCache):
+    """OCR page markdown keyed by SHA-256 of the document bytes, the model and the OCR options"""
+
+    @staticmethod
+    def make_key(content: bytes, model: str, options: Optional[Dict[str, Any]] = None) -> str:
+        options_json = json.dumps(options or {}, sort_keys=True)
+        return sha256_bytes(f"{sha256_bytes(content)}|{model}|{options_json}".encode("utf-8"))
+
+    def get_pages(self, content: bytes, model: str, options: Optional[Dict[str, Any]] = None) -> Optional[List[str]]:
+        return self.get(self.make_key(content, model, options))
+
+    def put_pages(self, content: bytes, model: str, options: Optional[Dict[str, Any]], pages: List[str]):
+        self.put(self.make_key(content, model, options), pages)
+
+
+def create_ocr_cache(path: Optional[str] = None, max_bytes: Optional[int] = None) -> OCRCache:
+    """Factory function reading defaults from MISTRAL_OCR_CACHE / MISTRAL_OCR_CACHE_MB"""
+    if path is None:
+        path = os.getenv("MISTRAL_OCR_CACHE", os.path.join(DEFAULT_CACHE_DIR, "ocr_cache.sqlite"))
+    if max_bytes is None:
+        max_bytes = int(float(os.getenv("MISTRAL_OCR_CACHE_MB", "256")) * 1024 * 1024)
+    return OCRCache(path, max_bytes=max_bytes)
+
+
+class LLMResponseCache(BlobCache):
+    """
+    Chat/completion response text keyed by model, temperature and SHA-256 of the prompt
+    with whitespace runs collapsed, so re-indented prompt templates still hit. Each entry
+    keeps the latency of the call that produced it, which is what a hit saves.
+    """
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        return " ".join(prompt.split())
+
+    @classmethod
+    def make_key(cls, model: str, temperature: float, prompt: str) -> str:
+        prompt_hash = sha256_bytes(cls.normalize_prompt(prompt).encode("utf-8"))
+        return sha256_bytes(f"{model}|{float(temperature)!r}|{prompt_hash}".encode("utf-8"))
+
+    def get_response(self, model: str, temperature: float, prompt: str) -> Optional[Dict[str, Any]]:
+        """{"text", "seconds"} of an earlier identical call, or None"""
+        return self.get(self.make_key(model, temperature, prompt))
+
+    def put_response(self, model: str, temperature: float, prompt: str, text: str, seconds: float):
+        self.put(self.make_key(model, temperature, prompt), {"text": text, "seconds": seconds})
+
+
+def create_llm_cache(path: Optional[str] = None, max_bytes: Optional[int] = None,
+                     ttl_seconds: Optional[float] = None) -> LLMResponseCache:
+    """Factory function reading defaults from MISTRAL_LLM_CACHE / MISTRAL_LLM_CACHE_MB / MISTRAL_LLM_CACHE_TTL"""
+    if path is None:
+        path = os.getenv("MISTRAL_LLM_CACHE", os.path.join(DEFAULT_CACHE_DIR, "llm_cache.sqlite"))
+    if max_bytes is None:
+        max_bytes = int(float(os.getenv("MISTRAL_LLM_CACHE_MB", "64")) * 1024 * 1024)
+    if ttl_seconds is None:
+        # A week by default, so a model update behind the same name is eventually picked up
+        ttl_seconds = float(os.getenv("MISTRAL_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+    return LLMResponseCache(path, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON Field Parser
+Consumes a streamed JSON object chunk by chunk and hands out each top-level
+field as soon as its value closes, without waiting for (or re-scanning) the rest
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class StreamingFieldParser:
+    """
+    Character state machine over one top-level JSON object. Text before the opening
+    brace (a ```json fence, a sentence) and after the closing one is ignored. String,
+    object and array values are emitted on their closing character; numbers and
+    literals on the comma or brace that ends them.
+    """
+
+    def __init__(self):
+        self.fields: List[Tuple[str, Any]] = []
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_value = False
+        self._value_started = False
+        self._emitted = False
+        self._member: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """(field, value) pairs completed by this chunk, in order"""
+        completed: List[Tuple[str, Any]] = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                self._member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._in_value:
+                        self._emit(completed)
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._start_member()
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._value_started = self._value_started or self._in_value
+                self._member.append(ch)
+            elif ch in "{[":
+                self._depth += 1
+                self._value_started = True
+                self._member.append(ch)
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(completed)
+                    self.done = True
+                    continue
+                self._member.append(ch)
+                if self._depth == 1:
+                    self._emit(completed)
+            elif self._depth == 1 and ch == ":":
+                self._in_value = True
+                self._member.append(ch)
+            elif self._depth == 1 and ch == ",":
+                self._emit(completed)
+                self._start_member()
+            else:
+                if self._in_value and not ch.isspace():
+                    self._value_started = True
+                self._member.append(ch)
+        self.fields.extend(completed)
+        return completed
+
+    def _start_member(self):
+        self._member = []
+        self._in_value = self._value_started = self._emitted = False
+
+    def _emit(self, completed: List[Tuple[str, Any]]):
+        """Parse the current `"key": value` member once; malformed members are dropped"""
+        if self._emitted or not self._value_started:
+            return
+        self._emitted = True
+        try:
+            completed.extend(json.loads("{" + "".join(self._member) + "}").items())
+        except json.JSONDecodeError:
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Check the streaming parser against json.loads and time it")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    sample = ('Here is the JSON:\n```json\n{"patient_name": "John R. Doe", "patient_age": 22, "patient_sex": "M", '
+              '"instructions": "Take \\"one\\" tablet, twice daily {after meals}", "is_allergic": null, '
+              '"is_pregnant": false, "medicine_dose": ["15 ml", "30 ml"], "weight": {"value": 70, "unit": "kg"}, '
+              '"prescription_date": "23 JAN 99"}\n```')
+    expected = json.loads(sample[sample.index("{"):sample.rindex("}") + 1])
+
+    for chunk_size in (1, 3, 16, 64, len(sample)):
+        field_parser = StreamingFieldParser()
+        offsets = {}
+        for start in range(0, len(sample), chunk_size):
+            for name, _ in field_parser.feed(sample[start:start + chunk_size]):
+                offsets[name] = start + chunk_size
+        same = dict(field_parser.fields) == expected and list(offsets) == list(expected)
+        print(f"chunks of {chunk_size:>3}: same as json.loads {same}, first field after "
+              f"{min(offsets.values())} of {len(sample)} chars")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        field_parser = StreamingFieldParser()
+        for start in range(0, len(sample), 16):
+            field_parser.feed(sample[start:start + 16])
+    elapsed = time.perf_counter() - started
+    print(f"{args.repeat * len(sample) / elapsed / 1e6:.1f} MB/s in 16-character chunks "
+          f"({elapsed / args.repeat * 1e6:.0f} us per response)")